@@ -2,7 +2,6 @@ import json
 from rpy2 import robjects
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect_shell import ShellOperation
 from prefect.logging import get_run_logger
 
@@ -11,10 +10,11 @@ from flows.cohort_generator_plugin.types import CohortGeneratorOptionsType
 from shared_utils.types import UserType
 from shared_utils.dao.DBDao import DBDao
 from shared_utils.api.AnalyticsSvcAPI import AnalyticsSvcAPI
+from shared_utils.api.PrefectAPI import get_variable
 
 @task
 def setup_plugin():
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
     # force=TRUE for fresh install everytime flow is run
     if (r_libs_user_directory):
         ShellOperation(
@@ -85,7 +85,7 @@ def create_cohort(dbdao, admin_user, schema_name: str, cohort_definition_id: int
         user_type=admin_user
     )
    
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
     
     with robjects.conversion.localconverter(robjects.default_converter):
         robjects.r(f'''
@@ -2,7 +2,6 @@ import json
 from rpy2 import robjects
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect_shell import ShellOperation
 from prefect.logging import get_run_logger
 from prefect.serializers import JSONSerializer
@@ -11,10 +10,11 @@ from prefect.filesystems import RemoteFileSystem as RFS
 from flows.cohort_survival_plugin.types import CohortSurvivalOptionsType
 
 from shared_utils.dao.DBDao import DBDao
+from shared_utils.api.PrefectAPI import get_variable
 
 @task
 def setup_plugin():
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
     if r_libs_user_directory:
         ShellOperation(
             commands=[
@@ -58,7 +58,7 @@ def cohort_survival_plugin(options: CohortSurvivalOptionsType):
     )
     
 @task(
-    result_storage=RFS.load(Variable.get("flows_results_sb_name")),
+    result_storage=RFS.load(get_variable("flows_results_sb_name")),
     result_storage_key="{flow_run.id}_km.json",
     result_serializer=JSONSerializer(),
     persist_result=True,
@@ -69,7 +69,7 @@ def generate_cohort_survival_data(
     outcome_cohort_definition_id: int,
 ):
     filename = f"{dbdao.database_code}_{dbdao.schema_name}"
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
 
     # Get credentials for database code
     db_credentials = dbdao.tenant_configs
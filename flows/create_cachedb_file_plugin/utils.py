@@ -1,9 +1,9 @@
 import os
 
 from prefect import task
-from prefect.variables import Variable
 
 from shared_utils.types import SupportedDatabaseDialects
+from shared_utils.api.PrefectAPI import get_variable
 
 DUCKDB_EXTENSIONS_FILEPATH = "/app/duckdb_extensions"
 
@@ -13,9 +13,9 @@ def resolve_duckdb_file_path(duckdb_database_name: str, create_for_cdw_config_va
     '''
     if create_for_cdw_config_validation:
         # Returns a hardcoded file path when creating duckdb file for cdw_config validation
-        return f"{Variable.get('cdw_config_duckdb_data_folder')}/{duckdb_database_name}"
+        return f"{get_variable('cdw_config_duckdb_data_folder')}/{duckdb_database_name}"
     else:
-        return f"{Variable.get('duckdb_data_folder')}/{duckdb_database_name}"
+        return f"{get_variable('duckdb_data_folder')}/{duckdb_database_name}"
 
 @task(log_prints=True)
 def remove_existing_file_if_exists(duckdb_database_name: str, create_for_cdw_config_validation: bool, logger):
@@ -2,7 +2,6 @@ import json
 import sqlalchemy as sql
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect.logging import get_run_logger
 from prefect.states import Failed, Completed
 
@@ -10,6 +9,7 @@ from flows.create_fhir_datamodel_plugin.types import *
 from flows.create_fhir_datamodel_plugin.fhir_utils import *
 
 from shared_utils.dao.DBDao import DBDao
+from shared_utils.api.PrefectAPI import get_variable
 
 
 @flow(log_prints=True)
@@ -20,7 +20,7 @@ def create_fhir_datamodel_plugin(options: CreateFhirDataModelOptions):
     schema_name = options.schema_name
     vocab_schema = options.vocab_schema
     
-    schema_path = Variable.get("fhir_schema_file") + '/fhir.schema.json'
+    schema_path = get_variable("fhir_schema_file") + '/fhir.schema.json'
     with open(schema_path, "r") as file:
 
             # change data type in "decimal" definition to decimal
@@ -2,7 +2,6 @@ from rpy2 import robjects
 from functools import partial
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect.context import FlowRunContext
 from prefect.logging import get_run_logger
 from prefect.serializers import JSONSerializer
@@ -14,6 +13,7 @@ from flows.data_characterization_plugin.types import *
 from shared_utils.dao.DBDao import DBDao
 from shared_utils.create_dataset_tasks import *
 from shared_utils.types import UserType, SupportedDatabaseDialects, LiquibaseAction
+from shared_utils.api.PrefectAPI import get_variable
 
 
 @flow(log_prints=True, 
@@ -67,7 +67,7 @@ def data_characterization_plugin(options: DCOptionsType):
     )
 
     if dc_schema:
-        r_libs_user_directory = Variable.get("r_libs_user")
+        r_libs_user_directory = get_variable("r_libs_user")
         
         set_admin_connection_string = results_schema_dao.get_database_connector_connection_string(
             user_type=admin_user,
@@ -152,7 +152,7 @@ def create_data_characterization_schema(vocab_schema_name: str,
 
 
 @task(log_prints=True,
-      result_storage=RFS.load(Variable.get("flows_results_sb_name")),
+      result_storage=RFS.load(get_variable("flows_results_sb_name")),
       result_storage_key="{flow_run.id}_persist_data_characterization.json",
       result_serializer=JSONSerializer(),
       persist_result=True)
@@ -167,7 +167,7 @@ def execute_data_characterization(schema_name: str,
                                   flow_run_id: str):
     try:
         logger = get_run_logger()
-        threads = int(Variable.get("achilles_thread_count"))
+        threads = int(get_variable("achilles_thread_count"))
         logger.info(f'Running achilles on thread count: {threads}')
         with robjects.conversion.localconverter(robjects.default_converter):
             robjects.r(f'''
@@ -206,7 +206,7 @@ def execute_data_characterization(schema_name: str,
         
         
     
-@task(result_storage=RFS.load(Variable.get("flows_results_sb_name")),
+@task(result_storage=RFS.load(get_variable("flows_results_sb_name")),
       result_storage_key="{flow_run.id}_export_to_ares.json",
       result_serializer=JSONSerializer(),
       persist_result=True)
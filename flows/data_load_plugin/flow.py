@@ -1,10 +1,8 @@
 from __future__ import annotations
 
-import csv
 import ibis
 import numpy as np
 import pandas as pd
-from io import StringIO
 from typing import TYPE_CHECKING
 
 from prefect import flow, task
@@ -67,10 +65,10 @@ def etl_task(dbdao: DaoBase, file: FileType, escapechar: str, header: bool|None,
 
         transformed_df = format_vocab_synpuf_data(dbdao, data, file.table_name, logger) 
         
-        load_data(dbdao, transformed_df, header, file, chunksize, i, logger)
+        load_data(dbdao, transformed_df, header, file, i, logger)
         
 
-def load_data(dbdao: DaoBase, df: pd.DataFrame, header: bool|None, file: FileType, chunksize: int, chunkindex: int, logger):
+def load_data(dbdao: DaoBase, df: pd.DataFrame, header: bool|None, file: FileType, chunkindex: int, logger):
     try:
         if header == 0:
             csv_column_names = df.columns.tolist()
@@ -81,9 +79,9 @@ def load_data(dbdao: DaoBase, df: pd.DataFrame, header: bool|None, file: FileTyp
             # else:
             #     table_column_names = [column_name[0] for column_name in table_column_names]
             common_columns = list(set(csv_column_names) & set(table_column_names))
-            df[common_columns].to_sql(file.table_name, dbdao.engine, if_exists='append', index=False, schema=dbdao.schema_name, chunksize=chunksize, method=psql_insert_copy)
+            dbdao.bulk_insert(file.table_name, df[common_columns], mode='append')
         elif header is None:
-            df.to_sql(file.table_name, dbdao.engine, if_exists="append", index=False, schema=dbdao.schema_name, chunksize=chunksize, method=psql_insert_copy)
+            dbdao.bulk_insert(file.table_name, df, mode='append')
     except Exception as e:
         logger.error(f"'Data load failed for the table '{dbdao.schema_name}.{file.table_name}' at the chunk index: {chunkindex}  with error: {e}")
         raise e
@@ -157,25 +155,6 @@ def format_vocab_synpuf_data(dbdao, data: pd.DataFrame, table_name: str, logger)
             data = data.rename(columns=str.lower)
     return data
 
-def psql_insert_copy(table, conn, keys, data_iter):
-    dbapi_conn = conn.connection
-    with dbapi_conn.cursor() as cur:
-        s_buf = StringIO()
-        writer = csv.writer(s_buf)
-        writer.writerows(data_iter)
-        s_buf.seek(0)
-
-        columns = ', '.join('"{}"'.format(k) for k in keys)
-        if table.schema:
-            table_name = '{}.{}'.format(table.schema, table.name)
-        else:
-            table_name = table.name
-
-        sql = 'COPY {} ({}) FROM STDIN WITH CSV'.format(
-            table_name, columns)
-        cur.copy_expert(sql=sql, file=s_buf)
-        
-        
 columns_to_drop = {
     "location": ['COUNTRY_CONCEPT_ID', 'COUNTRY_SOURCE_VALUE', 'LATITUDE', 'LONGITUDE'],
     "care_site": ["LOCATION_ID"],
@@ -27,7 +27,7 @@ def get_db_dialect(options):
 
 def check_table_case(dao_obj: DBDao) -> bool:
     # works only for omop, omop5-4 data models
-    table_names = dao_obj.get_table_names()
+    table_names = dao_obj.get_schema_catalog().get_table_names()
     if 'person' in table_names:
         return True
     elif 'PERSON' in table_names:
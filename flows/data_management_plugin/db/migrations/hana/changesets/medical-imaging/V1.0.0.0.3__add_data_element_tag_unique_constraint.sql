@@ -0,0 +1,18 @@
+--liquibase formatted sql
+--changeset alp:V1.0.0.0.3_add_data_element_tag_unique_constraint
+
+
+-- Point metadata at the lowest DATA_ELEMENT_ID of its tag before removing duplicate tags
+UPDATE DICOM_FILE_METADATA M
+SET DATA_ELEMENT_ID = (SELECT MIN(D.DATA_ELEMENT_ID) FROM DICOM_DATA_ELEMENT D WHERE D.DATA_ELEMENT_TAG = M.METADATA_SOURCE_TAG)
+WHERE EXISTS (SELECT 1 FROM DICOM_DATA_ELEMENT D WHERE D.DATA_ELEMENT_TAG = M.METADATA_SOURCE_TAG);
+
+-- Keep a single row per tag, the one with the lowest DATA_ELEMENT_ID
+DELETE FROM DICOM_DATA_ELEMENT
+WHERE "$rowid$" NOT IN (
+    SELECT MIN(A."$rowid$") FROM DICOM_DATA_ELEMENT A
+    WHERE A.DATA_ELEMENT_ID = (SELECT MIN(B.DATA_ELEMENT_ID) FROM DICOM_DATA_ELEMENT B WHERE B.DATA_ELEMENT_TAG = A.DATA_ELEMENT_TAG)
+    GROUP BY A.DATA_ELEMENT_TAG
+);
+
+ALTER TABLE DICOM_DATA_ELEMENT ADD CONSTRAINT DICOM_DATA_ELEMENT_TAG_UNIQUE UNIQUE (DATA_ELEMENT_TAG);
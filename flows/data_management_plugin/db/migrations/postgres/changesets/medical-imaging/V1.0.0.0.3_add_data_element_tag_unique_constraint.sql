@@ -0,0 +1,15 @@
+--liquibase formatted sql
+--changeset alp:V1.0.0.0.3_add_data_element_tag_unique_constraint
+
+
+-- Point metadata at the lowest data_element_id of its tag before removing duplicate tags
+UPDATE dicom_file_metadata m
+SET data_element_id = (SELECT MIN(d.data_element_id) FROM dicom_data_element d WHERE d.data_element_tag = m.metadata_source_tag)
+WHERE EXISTS (SELECT 1 FROM dicom_data_element d WHERE d.data_element_tag = m.metadata_source_tag);
+
+DELETE FROM dicom_data_element a
+USING dicom_data_element b
+WHERE a.data_element_tag = b.data_element_tag
+AND (a.data_element_id > b.data_element_id OR (a.data_element_id = b.data_element_id AND a.ctid > b.ctid));
+
+ALTER TABLE dicom_data_element ADD CONSTRAINT dicom_data_element_tag_unique UNIQUE (data_element_tag);
@@ -8,9 +8,13 @@ from flows.data_management_plugin.const import get_db_dialect
 from flows.data_management_plugin.types import DataModelType, FlowActionType
 
 from shared_utils.create_dataset_tasks import get_plugin_classpath
+from shared_utils.dao.engineregistry import dispose_engines_hook
+from shared_utils.dao.instrumentation import publish_query_stats_hook
 
 
-@flow(log_prints=True, timeout_seconds=3600)
+@flow(log_prints=True, timeout_seconds=3600,
+      on_completion=[publish_query_stats_hook, dispose_engines_hook],
+      on_failure=[publish_query_stats_hook, dispose_engines_hook])
 def data_management_plugin(options: DataModelType):
     logger = get_run_logger()
 
@@ -98,6 +102,8 @@ def get_version_info_flow(options: GetVersionInfoType, logger):
             plugin_classpath=get_plugin_classpath(options.flow_name),
             dataset_list=options.datasets,
             use_cache_db=options.use_cache_db,
+            estimate_entity_counts=options.estimate_entity_counts,
+            concurrency_per_database=options.version_info_concurrency_per_database
         )
     except Exception as e:
         logger.error(e)
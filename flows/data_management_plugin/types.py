@@ -31,6 +31,10 @@ class DataModelType(BaseModel):
     rollback_tag: Optional[str] = None
     update_count: Optional[int] = None
     datasets: Optional[List] = None
+    # OMOP entity tables whose version info counts are estimated from database statistics
+    estimate_entity_counts: Optional[List[str]] = None
+    # Datasets of one database whose version info is refreshed at the same time
+    version_info_concurrency_per_database: Optional[int] = 4
 
     @property
     def use_cache_db(self) -> str:
@@ -1,22 +1,27 @@
 import json
+import time
+from collections import deque
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from prefect import task
+from prefect.futures import as_completed
 from prefect.logging import get_run_logger
+from prefect.artifacts import create_table_artifact
 
 from flows.data_management_plugin.const import OMOP_DATA_MODELS, check_table_case, convert_case
 from flows.data_management_plugin.types import (PortalDatasetType, 
                                                 ExtractDatasetSchemaType)
 
-from shared_utils.dao.DBDao import DBDao
+from shared_utils.dao.DBDao import DBDao, ibis_session_scope
 from shared_utils.liquibase import Liquibase
 from shared_utils.api.PortalServerAPI import PortalServerAPI
 from shared_utils.api.PrefectAPI import get_auth_token_from_input
 from shared_utils.types import (UserType, 
                                 LiquibaseAction,
+                                ChangelogSummaryType,
                                 EntityCountDistributionType)
 from shared_utils.update_dataset_metadata import (extract_version,
-                                                  OMOP_NON_PERSON_ENTITIES,
+                                                  get_entity_count_distribution as get_dataset_entity_count_distribution,
                                                   update_entity_value,
                                                   update_entity_distinct_count,
                                                   update_entity_count_distribution,
@@ -27,7 +32,9 @@ from shared_utils.update_dataset_metadata import (extract_version,
 def get_version_info_tasks(changelog_filepath_list: Dict,
                           plugin_classpath: str,
                           dataset_list: List[PortalDatasetType],
-                          use_cache_db: bool):
+                          use_cache_db: bool,
+                          estimate_entity_counts: List[str] = None,
+                          concurrency_per_database: int = 4):
     logger = get_run_logger()
     if (dataset_list is None) or (len(dataset_list) == 0):
         logger.info("No datasets fetched from portal")
@@ -40,9 +47,86 @@ def get_version_info_tasks(changelog_filepath_list: Dict,
 
         dataset_schema_list = extract_db_schema(dataset_list)
 
+        # changelog summaries of all datasets, one query per database
+        changelog_summaries = get_changelog_summaries(dataset_schema_list["datasets_with_schema"], use_cache_db)
+
+        # datasets are refreshed concurrently, up to concurrency_per_database at a time per database.
+        # A dataset is only submitted once its database has a free slot, so no task runner thread sits waiting.
+        queued_at = time.time()
+        pending_datasets: Dict[str, deque] = {}
         for dataset in dataset_schema_list["datasets_with_schema"]:
-            get_and_update_attributes(
-                dataset, changelog_filepath_list, plugin_classpath, use_cache_db)
+            pending_datasets.setdefault(dataset.get("databaseCode"), deque()).append(dataset)
+
+        running = {}
+        def submit_next(database_code: str):
+            dataset = pending_datasets[database_code].popleft()
+            changelog_summary = changelog_summaries.get((database_code, dataset.get("schemaName")))
+            future = refresh_dataset_version_info.submit(
+                dataset, changelog_filepath_list, plugin_classpath, use_cache_db, estimate_entity_counts,
+                changelog_summary, queued_at)
+            running[future] = database_code
+
+        slots_per_database = max(concurrency_per_database or 1, 1)
+        for database_code, datasets in pending_datasets.items():
+            for _ in range(min(slots_per_database, len(datasets))):
+                submit_next(database_code)
+
+        dataset_timings = []
+        while running:
+            future = next(as_completed(list(running)))
+            database_code = running.pop(future)
+            dataset_timings.append(future.result())
+            if pending_datasets[database_code]:
+                submit_next(database_code)
+
+        failed_count = len([timing for timing in dataset_timings if timing["status"] == "failed"])
+        logger.info(f"Refreshed version info of {len(dataset_timings)} datasets, {failed_count} failed")
+        publish_dataset_timings(dataset_timings)
+
+
+@task(log_prints=True)
+def refresh_dataset_version_info(dataset: PortalDatasetType,
+                                 changelog_filepath_list: Dict,
+                                 plugin_classpath: str,
+                                 use_cache_db: bool,
+                                 estimate_entity_counts: List[str] = None,
+                                 changelog_summary: ChangelogSummaryType = None,
+                                 queued_at: float = None) -> Dict:
+    '''
+    Runs get_and_update_attributes and returns its timing, waiting time is counted from queued_at (epoch seconds).
+    Failures are logged and reported in the timing, so the other datasets carry on.
+    '''
+    database_code = dataset.get("databaseCode")
+    started_at = time.time()
+    queued_at = queued_at if queued_at else started_at
+    try:
+        get_and_update_attributes(
+            dataset, changelog_filepath_list, plugin_classpath, use_cache_db, estimate_entity_counts,
+            changelog_summary)
+    except Exception as e:
+        get_run_logger().error(f"Failed to update version info for dataset id '{dataset.get('id')}': {e}")
+        status = "failed"
+    else:
+        status = "completed"
+    finished_at = time.time()
+
+    return {"dataset_id": str(dataset.get("id")),
+            "database_code": database_code,
+            "schema_name": dataset.get("schemaName"),
+            "status": status,
+            "wait_seconds": round(started_at - queued_at, 3),
+            "seconds": round(finished_at - started_at, 3)}
+
+
+def publish_dataset_timings(dataset_timings: List[Dict]) -> None:
+    if not dataset_timings:
+        return
+    try:
+        create_table_artifact(key="version-info-timings",
+                              table=sorted(dataset_timings, key=lambda timing: timing["seconds"], reverse=True),
+                              description="Version info refresh time by dataset, slowest first")
+    except Exception as e:
+        get_run_logger().warning(f"Failed to publish version info timings: {e}")
 
 
 @task(log_prints=True)
@@ -65,11 +149,32 @@ def extract_db_schema(dataset_list: List[PortalDatasetType]) -> ExtractDatasetSc
             "datasets_without_schema": datasets_without_schema}
 
 
+@task(log_prints=True)
+def get_changelog_summaries(datasets: List[PortalDatasetType],
+                            use_cache_db: bool) -> Dict[Tuple[str, str], ChangelogSummaryType]:
+    schemas_by_database: Dict[str, List[str]] = {}
+    for dataset in datasets:
+        schemas_by_database.setdefault(dataset.get("databaseCode"), []).append(dataset.get("schemaName"))
+
+    changelog_summaries = {}
+    for database_code, schema_names in schemas_by_database.items():
+        try:
+            dbdao = DBDao(use_cache_db=use_cache_db, database_code=database_code, schema_name=schema_names[0])
+            for schema_name, changelog_summary in dbdao.get_changelog_summaries(schema_names).items():
+                changelog_summaries[(database_code, schema_name)] = changelog_summary
+        except Exception as e:
+            # datasets without a summary read their changelog on their own
+            get_run_logger().warning(f"Failed to read changelog summaries of database '{database_code}': {e}")
+    return changelog_summaries
+
+
 @task(log_prints=True)
 def get_and_update_attributes(dataset: PortalDatasetType,
                               changelog_filepath_list: Dict,
                               plugin_classpath: str,
-                              use_cache_db: bool
+                              use_cache_db: bool,
+                              estimate_entity_counts: List[str] = None,
+                              changelog_summary: ChangelogSummaryType = None
                               ):
     logger = get_run_logger()
 
@@ -87,121 +192,121 @@ def get_and_update_attributes(dataset: PortalDatasetType,
         logger.error(f"Failed to connect to database")
         raise e
     else:
-        portal_server_api = PortalServerAPI()
-        
-        # handle case where schema does not exist in db
-        schema_exists = dataset_dao.check_schema_exists()
-        if schema_exists == False:
-            error_msg = f"Schema '{schema_name}' does not exist in db {database_code} for dataset id '{dataset_id}'"
-            logger.error(error_msg)
-            portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", error_msg)
-            portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", error_msg)
-        else:
-            # update data model creation date with cdm_release_date or error msg
-            update_entity_value(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                dbdao=dataset_dao,
-                table_name="cdm_source",
-                column_name="cdm_release_date",
-                entity_name="created_date",
-                logger=logger
-            )
-            
-            try:
-                # update with data model last updated date
-                updated_date = get_updated_date(dataset_dao)
-                portal_server_api.update_dataset_attributes_table(dataset_id, "updated_date", updated_date)
-            except Exception as e:
-                logger.error(
-                    f"Failed to update attribute 'updated_date' for dataset id '{dataset_id}' with value '{updated_date}' : {e}")
-            else:
-                logger.info(
-                    f"Updated attribute 'updated_date' for dataset id '{dataset_id}' with value '{updated_date}'")
-
-
-            update_metadata_last_fetched_date(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                logger=logger
-            )
-
-            try:
-                # update with current version count or error msg
-                current_schema_version = get_current_version(dataset_dao)
-                portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", current_schema_version)
-            except Exception as e:
-                logger.error(
-                    f"Failed to update attribute 'current_schema_version' for dataset id '{dataset_id}' with value '{current_schema_version}' : {e}")
+        # attribute updates are collected and sent together when the block exits
+        with ibis_session_scope(dataset_dao), PortalServerAPI().attribute_batch(logger) as portal_server_api:
+            # handle case where schema does not exist in db
+            schema_exists = dataset_dao.check_schema_exists()
+            if schema_exists == False:
+                error_msg = f"Schema '{schema_name}' does not exist in db {database_code} for dataset id '{dataset_id}'"
+                logger.error(error_msg)
+                portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", error_msg)
+                portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", error_msg)
             else:
-                logger.info(
-                    f"Updated attribute 'current_schema_version' for dataset id '{dataset_id}' with value '{current_schema_version}'")
-
-            if data_model in OMOP_DATA_MODELS:
-                
-                # used for hana datasets and pg datasets created before default
-                is_lower_case = check_table_case(dataset_dao)
-
-                # update patient count or error msg
-                update_entity_distinct_count(
+                # update data model creation date with cdm_release_date or error msg
+                update_entity_value(
                     portal_server_api=portal_server_api,
                     dataset_id=dataset_id,
                     dbdao=dataset_dao,
-                    table_name=convert_case("person", is_lower_case),
-                    column_name=convert_case("person_id", is_lower_case),
-                    entity_name="patient_count",
+                    table_name="cdm_source",
+                    column_name="cdm_release_date",
+                    entity_name="created_date",
                     logger=logger
-                    )
-
+                )
+            
                 try:
-                    # update with entity distribution json string
-                    entity_count_distribution = get_entity_count_distribution(
-                        dataset_dao, is_lower_case)
-                    portal_server_api.update_dataset_attributes_table(dataset_id, "entity_count_distribution", json.dumps(entity_count_distribution))
+                    # update with data model last updated date
+                    updated_date = get_updated_date(dataset_dao, changelog_summary)
+                    portal_server_api.update_dataset_attributes_table(dataset_id, "updated_date", updated_date)
                 except Exception as e:
                     logger.error(
-                        f"Failed to update attribute 'entity_count_distribution' for dataset id '{dataset_id}' with value '{entity_count_distribution}' : {e}")
+                        f"Failed to update attribute 'updated_date' for dataset id '{dataset_id}' with value '{updated_date}' : {e}")
                 else:
                     logger.info(
-                        f"Updated attribute 'entity_count_distribution' for dataset id '{dataset_id}'  with value '{entity_count_distribution}'")
+                        f"Updated attribute 'updated_date' for dataset id '{dataset_id}' with value '{updated_date}'")
+
 
-                # update total_entity_count or error msg
-                update_total_entity_count(
+                update_metadata_last_fetched_date(
                     portal_server_api=portal_server_api,
                     dataset_id=dataset_id,
-                    entity_count_distribution=entity_count_distribution,
                     logger=logger
                 )
 
-                # update cdm version or error msg
-                update_entity_value(
-                    portal_server_api=portal_server_api,
-                    dataset_id=dataset_id,
-                    dbdao=dataset_dao,
-                    table_name=convert_case("cdm_source", is_lower_case),
-                    column_name=convert_case("cdm_version", is_lower_case),
-                    entity_name="version",
-                    logger=logger
+                try:
+                    # update with current version count or error msg
+                    current_schema_version = get_current_version(dataset_dao, changelog_summary)
+                    portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", current_schema_version)
+                except Exception as e:
+                    logger.error(
+                        f"Failed to update attribute 'current_schema_version' for dataset id '{dataset_id}' with value '{current_schema_version}' : {e}")
+                else:
+                    logger.info(
+                        f"Updated attribute 'current_schema_version' for dataset id '{dataset_id}' with value '{current_schema_version}'")
+
+                if data_model in OMOP_DATA_MODELS:
+                
+                    # used for hana datasets and pg datasets created before default
+                    is_lower_case = check_table_case(dataset_dao)
+
+                    # update patient count or error msg
+                    update_entity_distinct_count(
+                        portal_server_api=portal_server_api,
+                        dataset_id=dataset_id,
+                        dbdao=dataset_dao,
+                        table_name=convert_case("person", is_lower_case),
+                        column_name=convert_case("person_id", is_lower_case),
+                        entity_name="patient_count",
+                        logger=logger
+                        )
+
+                    try:
+                        # update with entity distribution json string
+                        entity_count_distribution = get_entity_count_distribution(
+                            dataset_dao, is_lower_case, estimate_entity_counts)
+                        portal_server_api.update_dataset_attributes_table(dataset_id, "entity_count_distribution", json.dumps(entity_count_distribution))
+                    except Exception as e:
+                        logger.error(
+                            f"Failed to update attribute 'entity_count_distribution' for dataset id '{dataset_id}' with value '{entity_count_distribution}' : {e}")
+                    else:
+                        logger.info(
+                            f"Updated attribute 'entity_count_distribution' for dataset id '{dataset_id}'  with value '{entity_count_distribution}'")
+
+                    # update total_entity_count or error msg
+                    update_total_entity_count(
+                        portal_server_api=portal_server_api,
+                        dataset_id=dataset_id,
+                        entity_count_distribution=entity_count_distribution,
+                        logger=logger
                     )
-            try:
-                # update with latest version or error msg
-                db_dialect = dataset_dao.dialect
-                tenant_configs = dataset_dao.tenant_configs
-
-                latest_available_schema_version = get_latest_available_version(dialect=db_dialect,
-                                                                               data_model=data_model,
-                                                                               changelog_file=changelog_file,
-                                                                               schema_name=schema_name,
-                                                                               vocab_schema=vocab_schema,
-                                                                               tenant_configs=tenant_configs,
-                                                                               plugin_classpath=plugin_classpath)
-                portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", latest_available_schema_version)
-            except Exception as e:
-                logger.error(
-                    f"Failed to update attribute 'latest_schema_version' for dataset id '{dataset_id}' with value '{latest_available_schema_version}' : {e}")
-            else:
-                logger.info(
-                    f"Updated attribute 'latest_schema_version' for dataset id '{dataset_id}'  with value '{latest_available_schema_version}'")
+
+                    # update cdm version or error msg
+                    update_entity_value(
+                        portal_server_api=portal_server_api,
+                        dataset_id=dataset_id,
+                        dbdao=dataset_dao,
+                        table_name=convert_case("cdm_source", is_lower_case),
+                        column_name=convert_case("cdm_version", is_lower_case),
+                        entity_name="version",
+                        logger=logger
+                        )
+                try:
+                    # update with latest version or error msg
+                    db_dialect = dataset_dao.dialect
+                    tenant_configs = dataset_dao.tenant_configs
+
+                    latest_available_schema_version = get_latest_available_version(dialect=db_dialect,
+                                                                                   data_model=data_model,
+                                                                                   changelog_file=changelog_file,
+                                                                                   schema_name=schema_name,
+                                                                                   vocab_schema=vocab_schema,
+                                                                                   tenant_configs=tenant_configs,
+                                                                                   plugin_classpath=plugin_classpath)
+                    portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", latest_available_schema_version)
+                except Exception as e:
+                    logger.error(
+                        f"Failed to update attribute 'latest_schema_version' for dataset id '{dataset_id}' with value '{latest_available_schema_version}' : {e}")
+                else:
+                    logger.info(
+                        f"Updated attribute 'latest_schema_version' for dataset id '{dataset_id}'  with value '{latest_available_schema_version}'")
 
 
 def get_latest_available_version(**kwargs) -> str:
@@ -217,9 +322,11 @@ def get_latest_available_version(**kwargs) -> str:
     return latest_available_schema_version
 
 
-def get_current_version(dao_obj: DBDao) -> str:
+def get_current_version(dao_obj: DBDao, changelog_summary: ChangelogSummaryType = None) -> str:
     try:
-        latest_executed_changeset = dao_obj.get_last_executed_changeset()
+        if changelog_summary is None:
+            changelog_summary = dao_obj.get_changelog_summary()
+        latest_executed_changeset = changelog_summary.last_executed_changeset
         current_version = extract_version(latest_executed_changeset)
     except Exception as e:
         error_msg = f"Error retrieving current version"
@@ -228,9 +335,11 @@ def get_current_version(dao_obj: DBDao) -> str:
     return current_version
 
 
-def get_updated_date(dao_obj: DBDao) -> str:
+def get_updated_date(dao_obj: DBDao, changelog_summary: ChangelogSummaryType = None) -> str:
     try:
-        updated_date = str(dao_obj.get_datamodel_updated_date()).split(" ")[0]
+        if changelog_summary is None:
+            changelog_summary = dao_obj.get_changelog_summary()
+        updated_date = str(changelog_summary.updated_date).split(" ")[0]
     except Exception as e:
         error_msg = f"Error retrieving updated date"
         get_run_logger().error(f"{error_msg}: {e}")
@@ -238,22 +347,6 @@ def get_updated_date(dao_obj: DBDao) -> str:
     return updated_date
 
 
-def get_entity_count_distribution(dao_obj: DBDao, is_lower_case: bool) -> EntityCountDistributionType:
-    entity_count_distribution = {}
-    # retrieve count for each entity table
-    for table, unique_id_column in OMOP_NON_PERSON_ENTITIES.items():
-        try:
-            if is_lower_case:
-                entity_count = dao_obj.get_distinct_count(
-                    table, unique_id_column)
-            else:
-                entity_count = dao_obj.get_distinct_count(
-                    table.upper(), unique_id_column.upper())
-        except Exception as e:
-            get_run_logger().error(
-                f"Error retrieving entity count for {table}: {e}")
-            entity_count = "error"
-        entity_count_key = table.replace("_", " ").title() + " Count"
-        if entity_count != "error":
-            entity_count_distribution[entity_count_key] = str(entity_count)
-    return entity_count_distribution
\ No newline at end of file
+def get_entity_count_distribution(dao_obj: DBDao, is_lower_case: bool,
+                                  estimate_entity_counts: List[str] = None) -> EntityCountDistributionType:
+    return get_dataset_entity_count_distribution(dao_obj, get_run_logger(), is_lower_case, estimate_entity_counts)
\ No newline at end of file
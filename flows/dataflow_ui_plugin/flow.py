@@ -4,7 +4,6 @@ from collections import OrderedDict
 from prefect_dask import DaskTaskRunner
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect.logging import get_run_logger
 from prefect.serializers import JSONSerializer
 from prefect.filesystems import RemoteFileSystem as RFS
@@ -14,6 +13,8 @@ from flows.dataflow_ui_plugin.hooks import *
 from flows.dataflow_ui_plugin.flowutils import *
 from flows.dataflow_ui_plugin.nodes import generate_nodes_flow
 
+from shared_utils.api.PrefectAPI import get_variable
+
 
 @flow(log_prints=True)
 def dataflow_ui_plugin(json_graph, options):
@@ -175,7 +176,7 @@ def execute_nodes_flow(graph, sorted_nodes, test):
 
 
 @task(task_run_name="execute-nodes-taskrun-{nodename}",
-      result_storage=RFS.load(Variable.get("flows_results_sb_name")),
+      result_storage=RFS.load(get_variable("flows_results_sb_name")),
       result_storage_key="{flow_run.parent_flow_run_id}_{parameters[nodename]}.json",
       result_serializer=JSONSerializer(object_encoder="flows.dataflow_ui_plugin.nodes.serialize_result_to_json"), log_prints=True,
       persist_result=True)
@@ -195,14 +195,14 @@ class DbWriter(Node):
         input_element = _input
         
         admin_user = UserType.ADMIN_USER
-        dbutils = DBUtils(use_cache_db=self.use_cache_db, 
-                          database_code=self.database)
-        dbconn = dbutils.create_database_engine(user_type=admin_user)
+        dbdao = DBDao(use_cache_db=self.use_cache_db, 
+                      database_code=self.database,
+                      user_type=admin_user)
         try:
             for path in self.dataframe:
                 input_element = input_element[path].data
-            result = input_element.to_sql(
-                self.tablename, dbconn, if_exists='replace')
+            # reset_index keeps the index column written by to_sql
+            result = dbdao.bulk_insert(self.tablename, input_element.reset_index(), mode='replace')
             return Result(False,  result, self, task_run_context)
         except Exception as e:
             return Result(True, tb.format_exc(), self, task_run_context)
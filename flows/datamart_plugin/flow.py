@@ -1,21 +1,23 @@
 import pandas as pd
+import pyarrow as pa
 from time import time
+from typing import Iterable
 from datetime import datetime
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect.logging import get_run_logger
 
 from flows.datamart_plugin.types import *
 from flows.datamart_plugin.const import *
 from flows.datamart_plugin.utils import *
 
-from shared_utils.dao.DBDao import DBDao
+from shared_utils.dao.DBDao import DBDao, ibis_session_scope
 from shared_utils.dao.MinioDao import MinioDao
+from shared_utils.dao.resultcache import invalidate_results
 from shared_utils.update_dataset_metadata import *
 from shared_utils.types import SupportedDatabaseDialects
 from shared_utils.api.PortalServerAPI import PortalServerAPI
-from shared_utils.api.PrefectAPI import get_auth_token_from_input
+from shared_utils.api.PrefectAPI import get_auth_token_from_input, get_variable
 
 from shared_utils.create_dataset_tasks import create_schema_task, create_and_assign_roles_task
 from shared_utils.update_dataset_metadata import update_entity_value, update_entity_distinct_count
@@ -59,6 +61,9 @@ def create_datamart(options: CreateDatamartOptions):
     if not source_schema_exists:
         raise ValueError(f"Source schema '{source_schema}' does not exist in database '{database_code}'")
     
+    # The snapshot may reuse the name of an earlier one, don't serve its cached metadata
+    invalidate_results(target_schema, database_code)
+
     try:
         
         if datamart_action == DatamartFlowAction.CREATE_SNAPSHOT:
@@ -108,88 +113,91 @@ def copy_schema(datamart_action: str,
                 target_dbdao):
     logger = get_run_logger()
     date_filter, table_filter, patient_filter = parse_datamart_copy_config(snapshot_copy_config)
-    tables_to_copy = get_tables_to_copy(source_dbdao, table_filter, logger)
+    # one catalog snapshot serves the table and column lookups of all tables
+    source_catalog = source_dbdao.get_schema_catalog()
+    tables_to_copy = get_tables_to_copy(source_catalog, table_filter, logger)
     
     successful_tables: list[str] = []
     failed_tables: list[str] = []
     
 
 
-    for table in tables_to_copy:
-        # get the columns to copy for each table
-        columns_to_copy = get_columns_to_copy(source_dbdao, table, table_filter)
-
-        base_config_table = BASE_CONFIG_LIST.get(table, {})
-
-        if source_dbdao.__class__.__name__ == "IbisDao" and datamart_action == DatamartFlowAction.CREATE_PARQUET_SNAPSHOT:
-            filter_conditions = {}
-        else:
-            filter_conditions = []
+    with ibis_session_scope(source_dbdao):
+        for table in tables_to_copy:
+            # get the columns to copy for each table
+            columns_to_copy = get_columns_to_copy(source_catalog, table, table_filter)
 
-        # Filter by patients if patient_filter and person_id_column is provided
-        person_id_column = base_config_table.get("person_id_column", "")
-        if len(patient_filter) > 0 and person_id_column:
-            # Ibis implementation            
-            if source_dbdao.__class__.__name__ == "IbisDao" and datamart_action == DatamartFlowAction.CREATE_PARQUET_SNAPSHOT:
-                filter_conditions["patient_filter"] = {
-                    "person_id_column": person_id_column,
-                    "patients_to_filter": patient_filter
-                }
-            
-            else:
-                # SqlAlchemy implmentation
-                person_id_column_obj = source_dbdao.get_sqlalchemy_columns(table_name=table, column_names=[person_id_column])
-                filter_conditions.append(
-                    person_id_column_obj.get(person_id_column).in_(patient_filter)
-                )
+            base_config_table = BASE_CONFIG_LIST.get(table, {})
 
-        # Filter by timestamp if date_filter and timestamp_column is provided
-        timestamp_column = base_config_table.get("timestamp_column", "")
-        if date_filter and timestamp_column:
-            # Ibis implementation
             if source_dbdao.__class__.__name__ == "IbisDao" and datamart_action == DatamartFlowAction.CREATE_PARQUET_SNAPSHOT:
-                filter_conditions["date_filter"] = {
-                    "timestamp_column": timestamp_column,
-                    "dates_to_filter": date_filter
-                }
+                filter_conditions = {}
             else:
-                # SqlAlchemy implementation
-                timestamp_column_obj = source_dbdao.get_sqlalchemy_columns(table_name=table, column_names=[timestamp_column])
-                filter_conditions.append(
-                    date_filter >= timestamp_column_obj.get(timestamp_column)
-                )
-
-        match datamart_action:
-            case DatamartFlowAction.CREATE_SNAPSHOT:
-                try:
-                    # copy from source schema to target schema
-                    rows_copied = source_dbdao.copy_table(source_table_name=table, 
-                                                          target_table_name=table,
-                                                          target_schema_name=target_dbdao.schema_name,
-                                                          columns_to_copy=columns_to_copy,
-                                                          filter_conditions=filter_conditions)
-                except Exception as err:
-                    logger.error(f"""Datamart copying failed from {source_dbdao.schema_name} to {
-                        target_dbdao.schema_name} for table: {table} with Error:{err}""")
-                    failed_tables.append(table)                    
+                filter_conditions = []
+
+            # Filter by patients if patient_filter and person_id_column is provided
+            person_id_column = base_config_table.get("person_id_column", "")
+            if len(patient_filter) > 0 and person_id_column:
+                # Ibis implementation            
+                if source_dbdao.__class__.__name__ == "IbisDao" and datamart_action == DatamartFlowAction.CREATE_PARQUET_SNAPSHOT:
+                    filter_conditions["patient_filter"] = {
+                        "person_id_column": person_id_column,
+                        "patients_to_filter": patient_filter
+                    }
+            
                 else:
-                    logger.info(f"""Succesfully copied {rows_copied} rows from {
-                        source_dbdao.schema_name} to {target_dbdao.schema_name} for table: {table}""")
-                    successful_tables.append(table)
-            case DatamartFlowAction.CREATE_PARQUET_SNAPSHOT:
-                try:
-                    datamart_df = source_dbdao.copy_table_as_dataframe(source_table_name=table, 
-                                                                       columns_to_copy=columns_to_copy, 
-                                                                       filter_conditions=filter_conditions)
-                    upload_df_as_parquet(target_dbdao.schema_name, table, datamart_df, logger)
-                except Exception as err:
-                    logger.error(f"""Datamart parquet creation failed for {source_dbdao.schema_name} to {
-                        target_dbdao.schema_name} for table: {table} with Error:{err}""")
-                    failed_tables.append(table)
+                    # SqlAlchemy implmentation
+                    person_id_column_obj = source_dbdao.get_sqlalchemy_columns(table_name=table, column_names=[person_id_column])
+                    filter_conditions.append(
+                        person_id_column_obj.get(person_id_column).in_(patient_filter)
+                    )
+
+            # Filter by timestamp if date_filter and timestamp_column is provided
+            timestamp_column = base_config_table.get("timestamp_column", "")
+            if date_filter and timestamp_column:
+                # Ibis implementation
+                if source_dbdao.__class__.__name__ == "IbisDao" and datamart_action == DatamartFlowAction.CREATE_PARQUET_SNAPSHOT:
+                    filter_conditions["date_filter"] = {
+                        "timestamp_column": timestamp_column,
+                        "dates_to_filter": date_filter
+                    }
                 else:
-                    logger.info(f"""Succesfully created parquet file for {source_dbdao.schema_name} to {
-                        target_dbdao.schema_name} for table: {table}""")
-                    successful_tables.append(table)
+                    # SqlAlchemy implementation
+                    timestamp_column_obj = source_dbdao.get_sqlalchemy_columns(table_name=table, column_names=[timestamp_column])
+                    filter_conditions.append(
+                        date_filter >= timestamp_column_obj.get(timestamp_column)
+                    )
+
+            match datamart_action:
+                case DatamartFlowAction.CREATE_SNAPSHOT:
+                    try:
+                        # copy from source schema to target schema
+                        rows_copied = source_dbdao.copy_table(source_table_name=table, 
+                                                              target_table_name=table,
+                                                              target_schema_name=target_dbdao.schema_name,
+                                                              columns_to_copy=columns_to_copy,
+                                                              filter_conditions=filter_conditions)
+                    except Exception as err:
+                        logger.error(f"""Datamart copying failed from {source_dbdao.schema_name} to {
+                            target_dbdao.schema_name} for table: {table} with Error:{err}""")
+                        failed_tables.append(table)                    
+                    else:
+                        logger.info(f"""Succesfully copied {rows_copied} rows from {
+                            source_dbdao.schema_name} to {target_dbdao.schema_name} for table: {table}""")
+                        successful_tables.append(table)
+                case DatamartFlowAction.CREATE_PARQUET_SNAPSHOT:
+                    try:
+                        record_batches = source_dbdao.iter_record_batches(table_name=table, 
+                                                                          columns=columns_to_copy, 
+                                                                          filter_conditions=filter_conditions)
+                        upload_record_batches_as_parquet(target_dbdao.schema_name, table, record_batches, logger)
+                    except Exception as err:
+                        logger.error(f"""Datamart parquet creation failed for {source_dbdao.schema_name} to {
+                            target_dbdao.schema_name} for table: {table} with Error:{err}""")
+                        failed_tables.append(table)
+                    else:
+                        logger.info(f"""Succesfully created parquet file for {source_dbdao.schema_name} to {
+                            target_dbdao.schema_name} for table: {table}""")
+                        successful_tables.append(table)
 
                     
     logger.info(f"Successful Tables: {successful_tables}")
@@ -197,8 +205,8 @@ def copy_schema(datamart_action: str,
     return successful_tables, failed_tables
 
 
-def upload_df_as_parquet(target_schema: str, table_name: str, df: pd.DataFrame, logger):
-    alp_system_id = Variable.get("alp_system_id")
+def upload_record_batches_as_parquet(target_schema: str, table_name: str, record_batches: Iterable[pa.RecordBatch], logger):
+    alp_system_id = get_variable("alp_system_id")
     if not alp_system_id:
         raise ValueError("'alp_system_id' prefect variable is undefined")
 
@@ -207,7 +215,7 @@ def upload_df_as_parquet(target_schema: str, table_name: str, df: pd.DataFrame,
 
     minio_dao = MinioDao()
     try:  
-        minio_dao.put_dataframe_as_parquet(bucket_name, file_name, df)
+        minio_dao.put_record_batches_as_parquet(bucket_name, file_name, record_batches)
     except Exception as err:
         logger.error(
             f"""Datamart parquet uploading to object store failed at {bucket_name}/{file_name}""")
@@ -231,11 +239,11 @@ def update_dataset_metadata(options: CreateDatamartOptions):
 
         logger.info(f"Successfully fetched {len(dataset_list)} datasets from portal")
         for dataset in dataset_list:
-            get_and_update_attributes(use_cache_db, dataset)
+            get_and_update_attributes(use_cache_db, dataset, options.estimate_entity_counts)
 
 
 @task(log_prints=True)
-def get_and_update_attributes(use_cache_db: bool, dataset: dict):
+def get_and_update_attributes(use_cache_db: bool, dataset: dict, estimate_entity_counts: list[str] = None):
     logger = get_run_logger()
         
     try:
@@ -250,92 +258,94 @@ def get_and_update_attributes(use_cache_db: bool, dataset: dict):
                       database_code=database_code, 
                       schema_name=schema_name)
     
-        portal_server_api = PortalServerAPI()
+        # attribute updates are collected and sent together when the block exits
+        with ibis_session_scope(dbdao), PortalServerAPI().attribute_batch(logger) as portal_server_api:
         
-        # check if schema exists
-        schema_exists = dbdao.check_schema_exists()
-        if schema_exists is False:
-            error_msg = f"Schema '{schema_name}' does not exist in db {database_code} for dataset id '{dataset_id}'"
-            logger.error(error_msg)
-            portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", error_msg)
-            portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", error_msg)
-        else:
-            
-            # update data model creation date with cdm_release_date or error msg
-            update_entity_value(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                dbdao=dbdao,
-                table_name="cdm_source",
-                column_name="cdm_release_date",
-                entity_name="created_date",
-                logger=logger
-            )
+            # check if schema exists
+            schema_exists = dbdao.check_schema_exists()
+            if schema_exists is False:
+                error_msg = f"Schema '{schema_name}' does not exist in db {database_code} for dataset id '{dataset_id}'"
+                logger.error(error_msg)
+                portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", error_msg)
+                portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", error_msg)
+            else:
             
-            # update last updated date with cdm_release_date or error msg
-            update_entity_value(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                dbdao=dbdao,
-                table_name="cdm_source",
-                column_name="cdm_release_date",
-                entity_name="updated_date",
-                logger=logger
-                )
-
-            # update patient count or error msg
-            update_entity_distinct_count(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                dbdao=dbdao,
-                table_name="person",
-                column_name="person_id",
-                entity_name="patient_count",
-                logger=logger
+                # update data model creation date with cdm_release_date or error msg
+                update_entity_value(
+                    portal_server_api=portal_server_api,
+                    dataset_id=dataset_id,
+                    dbdao=dbdao,
+                    table_name="cdm_source",
+                    column_name="cdm_release_date",
+                    entity_name="created_date",
+                    logger=logger
                 )
             
+                # update last updated date with cdm_release_date or error msg
+                update_entity_value(
+                    portal_server_api=portal_server_api,
+                    dataset_id=dataset_id,
+                    dbdao=dbdao,
+                    table_name="cdm_source",
+                    column_name="cdm_release_date",
+                    entity_name="updated_date",
+                    logger=logger
+                    )
+
+                # update patient count or error msg
+                update_entity_distinct_count(
+                    portal_server_api=portal_server_api,
+                    dataset_id=dataset_id,
+                    dbdao=dbdao,
+                    table_name="person",
+                    column_name="person_id",
+                    entity_name="patient_count",
+                    logger=logger
+                    )
+            
             
-            # update entity_count_distribution or error msg
-            entity_count_distribution = update_entity_count_distribution(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                dbdao=dbdao,
-                logger=logger
-            )
-
-            # update total_entity_count or error msg
-            update_total_entity_count(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                entity_count_distribution=entity_count_distribution,
-                logger=logger
-            )
-
-            # update cdm version or error msg
-            cdm_version = update_entity_value(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                dbdao=dbdao,
-                table_name="cdm_source",
-                column_name="cdm_version",
-                entity_name="version",
-                logger=logger
+                # update entity_count_distribution or error msg
+                entity_count_distribution = update_entity_count_distribution(
+                    portal_server_api=portal_server_api,
+                    dataset_id=dataset_id,
+                    dbdao=dbdao,
+                    logger=logger,
+                    estimate_entity_counts=estimate_entity_counts
                 )
 
-            try:
-                # update schema version, latest_schema_version or error msg
-                schema_version = get_schema_version(dbdao, cdm_version, logger)
-                latest_schema_version = schema_version
-                portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", schema_version)
-                portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", latest_schema_version)
-            except Exception as e:
-                logger.error(f"Failed to update attribute 'schema_version', 'latest_schema_version' for dataset '{dataset_id}' with value '{schema_version}': {e}")
-            else:
-                logger.info(f"Updated attribute 'schema_version', 'latest_schema_version' for dataset '{dataset_id}' with value '{schema_version}'")
+                # update total_entity_count or error msg
+                update_total_entity_count(
+                    portal_server_api=portal_server_api,
+                    dataset_id=dataset_id,
+                    entity_count_distribution=entity_count_distribution,
+                    logger=logger
+                )
+
+                # update cdm version or error msg
+                cdm_version = update_entity_value(
+                    portal_server_api=portal_server_api,
+                    dataset_id=dataset_id,
+                    dbdao=dbdao,
+                    table_name="cdm_source",
+                    column_name="cdm_version",
+                    entity_name="version",
+                    logger=logger
+                    )
+
+                try:
+                    # update schema version, latest_schema_version or error msg
+                    schema_version = get_schema_version(dbdao, cdm_version, logger)
+                    latest_schema_version = schema_version
+                    portal_server_api.update_dataset_attributes_table(dataset_id, "schema_version", schema_version)
+                    portal_server_api.update_dataset_attributes_table(dataset_id, "latest_schema_version", latest_schema_version)
+                except Exception as e:
+                    logger.error(f"Failed to update attribute 'schema_version', 'latest_schema_version' for dataset '{dataset_id}' with value '{schema_version}': {e}")
+                else:
+                    logger.info(f"Updated attribute 'schema_version', 'latest_schema_version' for dataset '{dataset_id}' with value '{schema_version}'")
 
 
-            update_metadata_last_fetched_date(
-                portal_server_api=portal_server_api,
-                dataset_id=dataset_id,
-                logger=logger
-            )
\ No newline at end of file
+                update_metadata_last_fetched_date(
+                    portal_server_api=portal_server_api,
+                    dataset_id=dataset_id,
+                    logger=logger
+                )
\ No newline at end of file
@@ -34,6 +34,8 @@ class CreateDatamartOptions(BaseModel):
     database_code: Optional[str] = None
     snapshot_copy_config: Optional[DatamartCopyConfig] = None
     datasets: Optional[List] = None
+    # OMOP entity tables whose version info counts are estimated from database statistics
+    estimate_entity_counts: Optional[List[str]] = None
 
     @property
     def use_cache_db(self) -> str:
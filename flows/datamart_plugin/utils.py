@@ -4,12 +4,13 @@ import re
 from flows.datamart_plugin.const import *
 from flows.datamart_plugin.types import *
 
+from shared_utils.types import SchemaCatalogType
 from shared_utils.update_dataset_metadata import extract_version
 
 
-def get_tables_to_copy(source_dbdao, table_filter: list[DatamartCopyTableConfig], logger) -> list[str]:
+def get_tables_to_copy(source_catalog: SchemaCatalogType, table_filter: list[DatamartCopyTableConfig], logger) -> list[str]:
     # get all tables in source_schema
-    source_schema_tables = source_dbdao.get_table_names()
+    source_schema_tables = source_catalog.get_table_names()
     
     # retrieve tables to always include using TABLES_TO_INCLUDE_REGEX
     include_pattern = re.compile(TABLES_TO_INCLUDE_REGEX)
@@ -43,9 +44,9 @@ def get_tables_to_copy(source_dbdao, table_filter: list[DatamartCopyTableConfig]
     return tables_to_copy
 
 
-def get_columns_to_copy(source_dbdao, source_table: str, table_filter: list[DatamartCopyTableConfig]) -> list[str]:
+def get_columns_to_copy(source_catalog: SchemaCatalogType, source_table: str, table_filter: list[DatamartCopyTableConfig]) -> list[str]:
     # get all columns in source_table
-    source_table_columns = source_dbdao.get_columns(table=source_table)
+    source_table_columns = source_catalog.get_columns(table=source_table)
     
     # retrieve columns to always exclude using COLUMNS_TO_EXCLUDE_REGEX
     exclude_pattern = re.compile(COLUMNS_TO_EXCLUDE_REGEX)
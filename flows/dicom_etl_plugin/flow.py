@@ -1,5 +1,4 @@
 from prefect import task, flow
-from prefect.variables import Variable
 from prefect.logging import get_run_logger
 from prefect.serializers import JSONSerializer
 from prefect.filesystems import RemoteFileSystem as RFS
@@ -21,13 +20,18 @@ from flows.dicom_etl_plugin.types import *
 from flows.dicom_etl_plugin.utils import *
 
 from shared_utils.dao.DBDao import DBDao
+from shared_utils.dao.engineregistry import dispose_engines_hook
+from shared_utils.dao.instrumentation import publish_query_stats_hook
 from shared_utils.types import UserType
 from shared_utils.api.DicomServerAPI import DicomServerAPI
+from shared_utils.api.PrefectAPI import get_variable
 
 
 
 
-@flow(log_prints=True)
+@flow(log_prints=True,
+      on_completion=[publish_query_stats_hook, dispose_engines_hook],
+      on_failure=[publish_query_stats_hook, dispose_engines_hook])
 def dicom_etl_plugin(test: str, options: DICOMETLOptions):
     logger = get_run_logger()
 
@@ -123,35 +127,50 @@ def process_file_metadata(path: str, cdm_dbdao, mi_dbdao, vocab_dbdao, mapping_d
         anatomic_site = f.get("BodyPartExamined", None) # [0x0018, 0x0015]
         
         
-        # retrieve person_id using person_to_patient_mapping
-        person_id = get_person_id(mapping_dbdao, patient_id, missing_person_id_option, person_to_patient_mapping)
+        # Commit the records of a file once instead of per inserted row
+        with cdm_dbdao.session(), mi_dbdao.session():
+            # retrieve person_id using person_to_patient_mapping
+            person_id = get_person_id(mapping_dbdao, patient_id, missing_person_id_option, person_to_patient_mapping)
 
 
-        # insert record into procedure_occurrence table
-        procedure_occurrence_id = insert_procedure_occurence_table(cdm_dbdao, person_id, study_date, 
-                                                                    study_description)
+            # insert record into procedure_occurrence table
+            procedure_occurrence_id = insert_procedure_occurence_table(cdm_dbdao, person_id, study_date, 
+                                                                        study_description)
 
-        # ingest into image_occurrence table
-        image_occurrence_id = insert_image_occurrence_table(
-            vocab_dbdao,
-            mi_dbdao,
-            modality_code,
-            anatomic_site,
-            study_instance_uid,
-            series_instance_uid,
-            acquisition_date,
-            person_id,
-            procedure_occurrence_id
-        )
+            # ingest into image_occurrence table
+            image_occurrence_id = insert_image_occurrence_table(
+                vocab_dbdao,
+                mi_dbdao,
+                modality_code,
+                anatomic_site,
+                study_instance_uid,
+                series_instance_uid,
+                acquisition_date,
+                person_id,
+                procedure_occurrence_id
+            )
         
-        # ingest into dicom_file_metadata table
-        logger.info(f"Processing data elements for ingestion..")
-        for data_elem in f:
-            if data_elem.keyword == "PixelData":
-                logger.info(f"Excluding ingestion of Pixel Data from file '{path.name}'")
-            else:
-                process_data_element(mi_dbdao, logger, data_elem, image_occurrence_id,
-                                        sop_instance_uid, instance_number, path)
+            # resolve the data_element_id of every tag in the file at once
+            data_element_ids = resolve_data_element_ids(mi_dbdao, [
+                {
+                    "data_element_tag": convert_tag_to_tuple(data_elem.tag),
+                    "data_element_name": "",
+                    "data_element_keyword": data_elem.keyword,
+                    "value_representation": data_elem.VR,
+                    "is_private": data_elem.tag.is_private
+                }
+                for data_elem in f.iterall() if data_elem.keyword != "PixelData"
+            ])
+
+            # ingest into dicom_file_metadata table
+            logger.info(f"Processing data elements for ingestion..")
+            for data_elem in f:
+                if data_elem.keyword == "PixelData":
+                    logger.info(f"Excluding ingestion of Pixel Data from file '{path.name}'")
+                else:
+                    process_data_element(mi_dbdao, logger, data_elem, image_occurrence_id,
+                                            sop_instance_uid, instance_number, path,
+                                            data_element_ids=data_element_ids)
     return image_occurrence_id, sop_instance_uid
 
     
@@ -159,7 +178,8 @@ def process_file_metadata(path: str, cdm_dbdao, mi_dbdao, vocab_dbdao, mapping_d
 
 def process_data_element(dbdao, logger, data_elem: DataElement, image_occurrence_id: int, 
                          sop_instance_id: str, instance_number: int, path: str,
-                         sequence_id: str = None, dataset_id: str = None) -> bool:
+                         sequence_id: str = None, dataset_id: str = None,
+                         data_element_ids: dict[str, int] = None) -> bool:
     data_elem_json = data_elem.to_json_dict(bulk_data_element_handler=None, 
                                             bulk_data_threshold=1024) # 1024 is the default used by pydicom for datasets.to_json_dict()
     metadata_table = "dicom_file_metadata"
@@ -182,7 +202,10 @@ def process_data_element(dbdao, logger, data_elem: DataElement, image_occurrence
     is_sequence = True if value_representation.upper() == "SQ" else False
     sequence_length = int(value_multiplicity) if is_sequence else None
     data_element_source_value = None if is_sequence else data_elem_json.get("Value", None)
-    data_element_id = get_data_element_id(dbdao, tag_as_str_tuple, "", keyword, value_representation, is_private)
+    if data_element_ids and tag_as_str_tuple in data_element_ids:
+        data_element_id = data_element_ids[tag_as_str_tuple]
+    else:
+        data_element_id = get_data_element_id(dbdao, tag_as_str_tuple, "", keyword, value_representation, is_private)
 
     record = {
         "metadata_id": metadata_id,
@@ -229,11 +252,12 @@ def process_data_element(dbdao, logger, data_elem: DataElement, image_occurrence
                                      sop_instance_id=sop_instance_id,
                                      instance_number=instance_number,
                                      path=path, sequence_id=metadata_id, 
-                                     dataset_id=dataset_id)
+                                     dataset_id=dataset_id,
+                                     data_element_ids=data_element_ids)
 
 @task(
     log_prints=True,
-    result_storage=RFS.load(Variable.get("flows_results_sb_name")),
+    result_storage=RFS.load(get_variable("flows_results_sb_name")),
     result_storage_key="dicom_etl_{flow_run.id}.json",
     result_serializer=JSONSerializer(),
     persist_result=True
@@ -241,7 +265,7 @@ def process_data_element(dbdao, logger, data_elem: DataElement, image_occurrence
 def upload_file_to_server(filepath: str, image_occurrence_id: int, 
                           sop_instance_id: str, api):     
     logger = get_run_logger()   
-    service_routes = Variable.get("service_routes")
+    service_routes = get_variable("service_routes")
     dicom_server_url = service_routes.get("dicomServer")
 
     filename = filepath.name
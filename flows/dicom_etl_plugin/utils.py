@@ -8,25 +8,33 @@ from pydicom.tag import BaseTag
 from flows.dicom_etl_plugin.types import *
 
 def get_image_occurrence_concept_ids(modality_code: str, anatomic_site: str, vocab_dbdao) -> Tuple[int, int]:
+    concept_column_names = ["concept_code", "concept_name", "concept_id", "vocabulary_id", "domain_id", "standard_concept"]
+
+    # lookups run once per file, so the statements are built once with bind parameters and cached in the dao
+    def build_get_concept_name_stmt():
+        concept_columns = vocab_dbdao.get_sqlalchemy_columns(table_name="concept", column_names=concept_column_names)
+        return sql.select(sql.distinct(concept_columns.get("concept_name"))) \
+                  .where(sql.func.upper(concept_columns.get("concept_code")) == sql.func.upper(sql.bindparam("concept_code"))) \
+                  .where(concept_columns.get("vocabulary_id") == "DICOM")
+
+    def build_get_standard_concept_id_stmt():
+        concept_columns = vocab_dbdao.get_sqlalchemy_columns(table_name="concept", column_names=concept_column_names)
+        return sql.select(concept_columns.get("concept_id")) \
+                  .where(sql.func.upper(concept_columns.get("concept_name")) == sql.func.upper(sql.bindparam("concept_name"))) \
+                  .where(concept_columns.get("domain_id") == sql.bindparam("domain_id")) \
+                  .where(concept_columns.get("standard_concept") == "S") \
+                  .where(concept_columns.get("vocabulary_id") == "SNOMED")
+
     # get standard concept id for modality
     try:
-        concept_column_names = ["concept_code", "concept_name", "concept_id", "vocabulary_id", "domain_id", "standard_concept"]
-        concept_columns = vocab_dbdao.get_sqlalchemy_columns(table_name="concept", column_names=concept_column_names)
-        
         # get concept name from modality code using DICOM vocabulary
-        get_concept_name_stmt = sql.select(sql.distinct(concept_columns.get("concept_name"))) \
-                                    .where(sql.func.upper(concept_columns.get("concept_code")) == sql.func.upper(modality_code)) \
-                                    .where(concept_columns.get("vocabulary_id") == "DICOM")
-        concept_name = vocab_dbdao.execute_sqlalchemy_statement(get_concept_name_stmt, vocab_dbdao.get_single_value)
+        concept_name = vocab_dbdao.execute_cached_statement("get_dicom_concept_name", build_get_concept_name_stmt,
+                                                            {"concept_code": modality_code}, vocab_dbdao.get_single_value)
         
         # get standard concept id from concept name
-        get_concept_id_stmt = sql.select(concept_columns.get("concept_id")) \
-                                .where(sql.func.upper(concept_columns.get("concept_name")) == sql.func.upper(concept_name)) \
-                                .where(concept_columns.get("domain_id") == "Procedure") \
-                                .where(concept_columns.get("standard_concept") == "S") \
-                                .where(concept_columns.get("vocabulary_id") == "SNOMED")
-
-        modality_concept_id = vocab_dbdao.execute_sqlalchemy_statement(get_concept_id_stmt, vocab_dbdao.get_single_value)
+        modality_concept_id = vocab_dbdao.execute_cached_statement("get_snomed_standard_concept_id", build_get_standard_concept_id_stmt,
+                                                                   {"concept_name": concept_name, "domain_id": "Procedure"},
+                                                                   vocab_dbdao.get_single_value)
     except Exception as e:
         # Case where modality_code is not in concept or is None
         print(f"Failed to get standard concept_id for modality '{modality_code}': {e}. Defaulting to 0.")
@@ -35,15 +43,9 @@ def get_image_occurrence_concept_ids(modality_code: str, anatomic_site: str, voc
     # get standard concept id for anatomic site
     try:
         body_part_region = "Entire " + anatomic_site.strip()
-        concept_column_names = ["concept_code", "concept_name", "concept_id", "vocabulary_id", "domain_id", "standard_concept"]
-        concept_columns = vocab_dbdao.get_sqlalchemy_columns(table_name="concept", column_names=concept_column_names)
-        
-        get_anatomic_site_concept_id_stmt = sql.select(concept_columns.get("concept_id")) \
-                            .where(sql.func.upper(concept_columns.get("concept_name")) == sql.func.upper(body_part_region)) \
-                            .where(concept_columns.get("domain_id") == "Spec Anatomic Site") \
-                            .where(concept_columns.get("standard_concept") == "S") \
-                            .where(concept_columns.get("vocabulary_id") == "SNOMED")
-        anatomic_site_concept_id = vocab_dbdao.execute_sqlalchemy_statement(get_anatomic_site_concept_id_stmt, vocab_dbdao.get_single_value)
+        anatomic_site_concept_id = vocab_dbdao.execute_cached_statement("get_snomed_standard_concept_id", build_get_standard_concept_id_stmt,
+                                                                        {"concept_name": body_part_region, "domain_id": "Spec Anatomic Site"},
+                                                                        vocab_dbdao.get_single_value)
     except Exception as e:
          # Case where body_part_region is not in concept or anatomic_site is None
         print(f"Failed to get standard concept_id for anatomic_site '{anatomic_site}': {e}. Defaulting to 0.")
@@ -157,13 +159,7 @@ def update_concept_table(dbdao, to_truncate: bool, logger):
         # handle NULLs for SQL 
         concept_df = concept_df.where(pd.notnull(concept_df), None)
 
-        concept_df.to_sql(
-            name=concept_table, 
-            con=dbdao.engine,
-            schema=dbdao.schema_name,
-            if_exists="append",
-            index=False
-        )
+        dbdao.bulk_insert(concept_table, concept_df, mode="append")
     except Exception as e:
         logger.error(f"Failed to insert DICOM Concepts into'{dbdao.schema_name}.{concept_table}' table!")
         raise e
@@ -208,13 +204,14 @@ def update_dicom_data_element_table(dbdao, to_truncate:bool, logger):
         df['etl_created_datetime'] = datetime.now()
         df['etl_modified_datetime'] = datetime.now()
         
-        df.to_sql(
-            name=data_element_table_name,
-            con=dbdao.engine,
-            schema=dbdao.schema_name,
-            if_exists="append",
-            index=False
-        )
+        # handle NULLs for SQL
+        df = df.astype(object).where(pd.notnull(df), None)
+
+        # Keep the ids of tags already in the table
+        update_columns = [column for column in df.columns 
+                          if column not in ("data_element_id", "data_element_tag", "etl_created_datetime")]
+        dbdao.upsert_many(data_element_table_name, df.to_dict("records"), 
+                          key_columns=["data_element_tag"], update_columns=update_columns)
     except Exception as e:
         logger.error(f"Failed to populate '{dbdao.schema_name}.{data_element_table_name}' table!")
         raise e
@@ -261,13 +258,15 @@ def get_person_id(dbdao, patient_id: str, missing_person_id_option, mapping) ->
     
     column_names = [mapped_person_id, mapped_patient_id]
     
-    columns = dbdao.get_sqlalchemy_columns(table_name=table_name, column_names=column_names)
-    
-    sql_statement = sql.select(columns.get(mapped_person_id)) \
-                        .where(sql.func.upper(columns.get(mapped_patient_id)) == sql.func.upper(patient_id))
+    def build_statement():
+        columns = dbdao.get_sqlalchemy_columns(table_name=table_name, column_names=column_names)
+        return sql.select(columns.get(mapped_person_id)) \
+                  .where(sql.func.upper(columns.get(mapped_patient_id)) == sql.func.upper(sql.bindparam("patient_id")))
 
     try:
-        person_id = dbdao.execute_sqlalchemy_statement(sql_statement, callback=dbdao.get_single_value)
+        person_id = dbdao.execute_cached_statement(("get_person_id", table_name, mapped_person_id, mapped_patient_id),
+                                                   build_statement, {"patient_id": patient_id},
+                                                   callback=dbdao.get_single_value)
     except Exception as e:
         print(f"Failed to get matching person_id for patient_id '{patient_id}': {e}")
         
@@ -329,45 +328,51 @@ def insert_image_occurrence_table(vocab_dbdao, mi_dbdao,
     return new_image_occurrence__id
     
     
-def insert_data_element_table(dbdao, tag: str, name: str, keyword: str, 
-                              value_representation: str, is_private: bool) -> int:
-
-    table_name = "dicom_data_element"
-    new_data_element_id = dbdao.get_next_record_id(table_name, "data_element_id")
-    
-    new_data_element_record = {
-        "data_element_id": new_data_element_id,
+def get_data_element_id(dbdao, tag: str, name: str, 
+                        keyword: str, value_representation: str, 
+                        is_private: bool) -> int:
+    data_element = {
         "data_element_tag": tag,
         "data_element_name": name,
         "data_element_keyword": keyword,
         "value_representation": value_representation,
-        "is_private": is_private,
-        "etl_created_datetime": datetime.now(),
-        "etl_modified_datetime": datetime.now()
+        "is_private": is_private
     }
-    dbdao.insert_values_into_table(table_name, new_data_element_record)
+    return resolve_data_element_ids(dbdao, [data_element])[tag]
 
-    return new_data_element_id
 
-
-def get_data_element_id(dbdao, tag: str, name: str, 
-                        keyword: str, value_representation: str, 
-                        is_private: bool) -> int:
-    
+def resolve_data_element_ids(dbdao, data_elements: list[dict]) -> Dict[str, int]:
+    '''
+    Returns the data_element_id of each data_element_tag, inserting tags missing from dicom_data_element
+    '''
     table_name = "dicom_data_element"
     column_names = ["data_element_id", "data_element_tag"]
-    sqlalchemy_columns = dbdao.get_sqlalchemy_columns(table_name=table_name, column_names=column_names)
-        
-    # Get data_element_id through matching data_element_tag
-    sql_statement = sql.select(sqlalchemy_columns.get("data_element_id")) \
-                        .where(sqlalchemy_columns.get("data_element_tag") == tag)
-                        
-    try:
-        res = dbdao.execute_sqlalchemy_statement(sql_statement, callback=dbdao.get_single_value)
-    except Exception as e:
-        #print(f"Failed to get matching data_element_id for tag '{tag}': {e}")
-        new_data_element_id = insert_data_element_table(dbdao, tag, name, keyword, value_representation, is_private)
-        #print(f"'{tag}' inserted into '{table_name}' table with data_element_id '{new_data_element_id}'")
-        return new_data_element_id
-    else: 
-        return res
\ No newline at end of file
+
+    def build_statement():
+        sqlalchemy_columns = dbdao.get_sqlalchemy_columns(table_name=table_name, column_names=column_names)
+        return sql.select(sqlalchemy_columns.get("data_element_tag"), sqlalchemy_columns.get("data_element_id")) \
+                  .where(sqlalchemy_columns.get("data_element_tag").in_(sql.bindparam("tags", expanding=True)))
+
+    tags = list({data_element["data_element_tag"] for data_element in data_elements})
+    data_element_ids = dbdao.execute_cached_statement("get_data_element_ids", build_statement, {"tags": tags},
+                                                      callback=lambda result: dict(result.all()))
+
+    new_data_element_records = {}
+    for data_element in data_elements:
+        tag = data_element["data_element_tag"]
+        if tag in data_element_ids or tag in new_data_element_records:
+            continue
+        new_data_element_records[tag] = {
+            **data_element,
+            "data_element_id": dbdao.get_next_record_id(table_name, "data_element_id"),
+            "etl_created_datetime": datetime.now(),
+            "etl_modified_datetime": datetime.now()
+        }
+
+    if new_data_element_records:
+        # Tags inserted concurrently by another writer are kept and their ids returned
+        inserted_records = dbdao.upsert_many(table_name, list(new_data_element_records.values()),
+                                             key_columns=["data_element_tag"], update_columns=[],
+                                             returning=["data_element_tag", "data_element_id"])
+        data_element_ids.update({record["data_element_tag"]: record["data_element_id"] for record in inserted_records})
+    return data_element_ids
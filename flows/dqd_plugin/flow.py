@@ -3,7 +3,6 @@ import json
 from rpy2 import robjects
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect_shell import ShellOperation
 from prefect.context import FlowRunContext
 from prefect.logging import get_run_logger
@@ -14,12 +13,13 @@ from flows.dqd_plugin.types import DqdOptionsType, DQD_THREAD_COUNT
 
 from shared_utils.types import UserType
 from shared_utils.dao.DBDao import DBDao
+from shared_utils.api.PrefectAPI import get_variable
 
 
 @task
 def setup_plugin():
     # Install dqd R package from plugin
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
     if (r_libs_user_directory):
         ShellOperation(
             commands=[
@@ -79,7 +79,7 @@ def dqd_plugin(options: DqdOptionsType):
                 cohort_table_name,
                 use_cache_db)
     
-@task(result_storage=RFS.load(Variable.get("flows_results_sb_name")), 
+@task(result_storage=RFS.load(get_variable("flows_results_sb_name")), 
       result_storage_key="{flow_run.id}_dqd.json",
       result_serializer=JSONSerializer(),
       persist_result=True)
@@ -99,7 +99,7 @@ def execute_dqd(
     logger = get_run_logger()
 
     threads = DQD_THREAD_COUNT
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
     
     read_user = UserType.READ_USER
     
@@ -59,15 +59,7 @@ def calculate_loyalty_score(options:CalculateConfig):
         logger.info(f'Loyalty score calculation completed')
         logger.info(f'The loyalty cohort is stored {schema_name}.{loyalty_cohort_table}')
 
-    with dbdao.engine.connect() as conn:
-        data.to_sql(
-                name = loyalty_cohort_table,
-                con = conn,
-                schema = schema_name,
-                if_exists = 'replace',
-                chunksize = 32,
-                index = False
-        )
+    dbdao.bulk_insert(loyalty_cohort_table, data, mode='replace')
         
 def retrain_algo(options:RetrainConfig):
     logger = get_run_logger()
@@ -103,25 +95,10 @@ def retrain_algo(options:RetrainConfig):
         summary_table = pd.DataFrame({'Metric':['auc_roc_retrain'], 'value': [auc_roc]})
         summary_table_name = f'{retrain_coeff_table_name}_summary_table'
 
-    with dbdao.engine.connect() as conn:
-        coef_retrain.to_sql(
-                name = retrain_coeff_table_name,
-                con = conn,
-                schema = schema_name,
-                if_exists = 'replace',
-                chunksize = 32,
-                index = False
-        )
-        logger.info(f'Retrain coefficients are stored at {schema_name}.{retrain_coeff_table_name}')
-        summary_table.to_sql(
-                name = summary_table_name,
-                con = conn,
-                schema = schema_name,
-                if_exists = 'replace',
-                chunksize = 32,
-                index = False
-        )
-        logger.info(f'Retrain auc roc is stored at {schema_name}.{retrain_coeff_table_name}_summary_table')
+    dbdao.bulk_insert(retrain_coeff_table_name, coef_retrain, mode='replace')
+    logger.info(f'Retrain coefficients are stored at {schema_name}.{retrain_coeff_table_name}')
+    dbdao.bulk_insert(summary_table_name, summary_table, mode='replace')
+    logger.info(f'Retrain auc roc is stored at {schema_name}.{retrain_coeff_table_name}_summary_table')
 
 @task(log_prints=True)
 def data_prep(conn, index_st, index_ed, database_code, schema_name, use_cache_db):
@@ -82,11 +82,4 @@ def ner_extract_plugin(options: NerExtractOptions):
                 'term_exists',
                 'term_temporal',
                 'term_modifiers']
-    with dbdao.engine.connect() as conn:
-        rst_df[cols].to_sql(name = note_nlp_table,
-                    con = conn,
-                    schema = schema_name,
-                    if_exists = 'append',
-                    index = False,
-                    chunksize = 32,
-                   )
\ No newline at end of file
+    dbdao.bulk_insert(note_nlp_table, rst_df[cols], mode='append')
\ No newline at end of file
@@ -8,9 +8,9 @@ from sqlalchemy import BigInteger, String
 from shared_utils.types import UserType
 from shared_utils.dao.DBDao import DBDao
 from shared_utils.create_dataset_tasks import *
+from shared_utils.api.PrefectAPI import get_variable
 
 from prefect import task
-from prefect.variables import Variable
 from prefect_shell import ShellOperation
 from prefect.cache_policies import NONE
 
@@ -65,7 +65,7 @@ def create_datamodel_parent_task(cdm_version: str,
       task_run_name="create_cdm_tables-{dbdao.schema_name}")
 def create_cdm_tables(dbdao: DaoBase, cdm_version: str, logger) -> bool:
     # currently only supports pg dialect
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
 
     admin_user =  UserType.ADMIN_USER
     set_connection_string = dbdao.get_database_connector_connection_string(
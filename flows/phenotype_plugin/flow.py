@@ -1,7 +1,6 @@
 from rpy2 import robjects
 
 from prefect import flow, task
-from prefect.variables import Variable
 from prefect_shell import ShellOperation
 from prefect.logging import get_run_logger
 
@@ -9,12 +8,13 @@ from flows.phenotype_plugin.types import PhenotypeOptionsType
 
 from shared_utils.types import UserType
 from shared_utils.dao.DBDao import DBDao
+from shared_utils.api.PrefectAPI import get_variable
 import logging
 from rpy2.rinterface_lib.callbacks import logger as rpy2_logger
 
 @task
 def setup_plugin():
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
     # force=TRUE for fresh install everytime flow is run
     if (r_libs_user_directory):
         ShellOperation(
@@ -72,7 +72,7 @@ def phenotype_plugin(options: PhenotypeOptionsType):
         user_type=user
     )
    
-    r_libs_user_directory = Variable.get("r_libs_user")
+    r_libs_user_directory = get_variable("r_libs_user")
 
     with robjects.conversion.localconverter(robjects.default_converter):
         robjects.r(f'''
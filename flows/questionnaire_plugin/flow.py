@@ -51,21 +51,23 @@ def create_questionnaire_definition_task(db_connection, questionnaire_definition
         questionnaire_values_to_insert = _parse_questionnaire_definition(
             questionnaire_definition).dict()
 
-        logger.info(f"Inserting into '{questionnaire_table}' table..")
-        db_connection.insert_values_into_table(
-            questionnaire_table,
-            questionnaire_values_to_insert
-        )
+        # Questionnaire and its items are committed together
+        with db_connection.session():
+            logger.info(f"Inserting into '{questionnaire_table}' table..")
+            db_connection.insert_values_into_table(
+                questionnaire_table,
+                questionnaire_values_to_insert
+            )
 
-        questionnaire_id = questionnaire_definition.id
-        items = questionnaire_definition.item
+            questionnaire_id = questionnaire_definition.id
+            items = questionnaire_definition.item
 
-        logger.info(
-            f"Processing questionnaire items..")
-        create_questionnaire_item(items,
-                                  questionnaire_id,
-                                  db_connection,
-                                  questionnaire_item_table)
+            logger.info(
+                f"Processing questionnaire items..")
+            create_questionnaire_item(items,
+                                      questionnaire_id,
+                                      db_connection,
+                                      questionnaire_item_table)
     except Exception as e:
         logger.error(e)
         raise e
@@ -7,14 +7,13 @@ from functools import partial
 from typing import List, Dict
 
 from prefect import task, flow
-from prefect.variables import Variable
-from prefect.blocks.system import Secret
 
 from flows.strategus_plugin.hooks import node_task_generation_hook
 from flows.strategus_plugin.flowutils import get_node_list, convert_py_to_R, serialize_to_json
 
 from shared_utils.types import UserType
 from shared_utils.dao.DBDao import DBDao
+from shared_utils.api.PrefectAPI import get_variable, load_secret
 
 class Node:
     def __init__(self, node):
@@ -330,7 +329,7 @@ class CohortGeneratorSpecNode(Node):
         with ro.default_converter.context():
             try: 
                 rSource = ro.r['source']
-                rSource(Variable.get("cohort_generator_module_settings_url"))
+                rSource(get_variable("cohort_generator_module_settings_url"))
                 rCreateCohortGeneratorModuleSpecifications = ro.globalenv['createCohortGeneratorModuleSpecifications']
                 rCohortGeneratorModuleSpecifications = rCreateCohortGeneratorModuleSpecifications(convert_py_to_R(self.incremental), convert_py_to_R(self.generate_stats))
                 return Result(False,  rCohortGeneratorModuleSpecifications, self, task_run_context)
@@ -359,7 +358,7 @@ class CohortDiagnosticsModuleSpecNode(Node):
         with ro.default_converter.context():
             try:
                 rSource = ro.r['source']
-                rSource(Variable.get("cohort_diagnostics_module_settings_url"))
+                rSource(get_variable("cohort_diagnostics_module_settings_url"))
                 rCreateCohortDiagnosticsModuleSpecifications = ro.globalenv["createCohortDiagnosticsModuleSpecifications"]
                 rCohortDiagnosticsSpec = rCreateCohortDiagnosticsModuleSpecifications(
                     runInclusionStatistics = convert_py_to_R(self.runInclusionStatistics),
@@ -853,7 +852,7 @@ class StrategusNode(Node):
 
                 databaseConnectorJarFolder = '/app/inst/drivers'
                 os.environ['DATABASECONNECTOR_JAR_FOLDER'] = databaseConnectorJarFolder
-                os.environ['STRATEGUS_KEYRING_PASSWORD'] = Secret.load("strategus-keyring-password").get()
+                os.environ['STRATEGUS_KEYRING_PASSWORD'] = load_secret("strategus-keyring-password").get()
                 
                 database_code = 'alpdev_pg'
                 db_credentials = DBDao(use_cache_db=self.use_cache_db, 
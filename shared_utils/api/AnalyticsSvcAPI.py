@@ -1,5 +1,4 @@
 import json
-import requests
 
 from shared_utils.api.BaseAPI import BaseAPI
 
@@ -20,7 +19,7 @@ class AnalyticsSvcAPI(BaseAPI):
             "description": description,
             "syntax": syntax
         }
-        result = requests.post(
+        result = self.session.post(
             url,
             headers=self.headers,
             json=data,
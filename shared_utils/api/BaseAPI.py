@@ -1,23 +1,65 @@
-from prefect.variables import Variable
-from prefect.blocks.system import Secret
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from shared_utils.types import AuthToken
-from shared_utils.api.PrefectAPI import get_auth_token_from_input
+from shared_utils.api.PrefectAPI import get_auth_token_from_input, get_variable, load_secret
+
+
+# Process-wide http session, so all service clients reuse pooled keep-alive connections
+_session: requests.Session | None = None
+_session_lock = Lock()
+
 
 class BaseAPI:
+    # Connection pool of the shared session, per host
+    pool_connections: int = 10
+    pool_maxsize: int = 20
+
+    # Bounded retries on connection errors and 5xx responses, with exponential backoff.
+    # Responses are only retried for idempotent methods, so e.g. POSTs are not sent twice.
+    max_retries: int = 3
+    retry_backoff_factor: float = 0.5 # seconds
+    retry_status_codes: tuple[int, ...] = (500, 502, 503, 504)
+
     def __init__(self):
-        self.python_verify_ssl = Variable.get("python_verify_ssl")
-        self.tls_internal_ca_cert = Secret.load("tls-internal-ca-cert")
+        self.python_verify_ssl = get_variable("python_verify_ssl")
+        self.tls_internal_ca_cert = load_secret("tls-internal-ca-cert")
         
         if self.python_verify_ssl == 'true' and self.tls_internal_ca_cert is None:
             raise ValueError("'tls-internal-ca-cert' prefect secret is undefined")
         
 
+    @property
+    def session(self) -> requests.Session:
+        global _session
+        with _session_lock:
+            if _session is None:
+                _session = self.create_session()
+            return _session
+
+    @classmethod
+    def create_session(cls) -> requests.Session:
+        retry = Retry(total=cls.max_retries,
+                      backoff_factor=cls.retry_backoff_factor,
+                      status_forcelist=cls.retry_status_codes,
+                      raise_on_status=False) # the clients raise their own errors on the final response
+        adapter = HTTPAdapter(pool_connections=cls.pool_connections,
+                              pool_maxsize=cls.pool_maxsize,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
     def get_service_route(self, service_name: str) -> str:
-        if Variable.get("service_routes") is None:
+        service_routes = get_variable("service_routes")
+        if service_routes is None:
             raise ValueError(f"'service_routes' prefect variable is undefined")
         else:
-            service_route_url = Variable.get("service_routes").get(service_name) + "/"
+            service_route_url = service_routes.get(service_name) + "/"
             
         return service_route_url
         
@@ -1,5 +1,3 @@
-import requests
-
 from shared_utils.api.BaseAPI import BaseAPI
 
 class DicomServerAPI(BaseAPI):
@@ -9,7 +7,7 @@ class DicomServerAPI(BaseAPI):
 
     def get_uploaded_file_name(self, instance_id: str) -> str:
         url = f"{self.url}instances/{instance_id}"
-        response = requests.get(
+        response = self.session.get(
             url,
             verify=self.get_verify_value()
         )
@@ -1,19 +1,35 @@
 import jwt
-import requests
-
-from prefect.variables import Variable
-from prefect.blocks.system import Secret
+import time
+from threading import Lock
 
 from shared_utils.api.BaseAPI import BaseAPI
+from shared_utils.api.PrefectAPI import get_variable, load_secret
+
+
+# Process-wide client credential tokens
+# (issuer url, client id) -> (expiry timestamp, access token)
+_tokens: dict[tuple[str, str], tuple[float, str]] = {}
+_tokens_lock = Lock()
+# Held while a token is requested, so concurrent callers wait for that token instead of all calling the IdP
+_token_refresh_lock = Lock()
+
+# issuer url -> (expiry timestamp, PyJWKClient caching the JWKS signing keys)
+_jwks_clients: dict[str, tuple[float, jwt.PyJWKClient]] = {}
+_jwks_clients_lock = Lock()
 
 
 class OpenIdAPI(BaseAPI):
+    # Seconds before expiry at which a cached token is refreshed
+    token_refresh_margin: int = 60
+    # Seconds the JWKS client and its keys are cached before the JWKS document is downloaded again
+    jwks_lifespan: int = 300
+
     def __init__(self):
         super().__init__()
         self.url = self.get_service_route("idIssuerUrl")
-        self.client_id = Secret.load("idp-alp-data-client-id")
-        self.client_secret = Secret.load("idp-alp-data-client-secret")
-        self.scope = Variable.get("idp_scope")
+        self.client_id = load_secret("idp-alp-data-client-id")
+        self.client_secret = load_secret("idp-alp-data-client-secret")
+        self.scope = get_variable("idp_scope")
         
     def getOptions(self):
         return {
@@ -21,18 +37,58 @@ class OpenIdAPI(BaseAPI):
         }
 
     def getSigningKey(self, token):
-        jwks_client = jwt.PyJWKClient(f"{self.url}/jwks")
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        signing_key = self.getJwksClient().get_signing_key_from_jwt(token)
         return signing_key.key
 
+    def getJwksClient(self) -> jwt.PyJWKClient:
+        # Expired here, PyJWKClient only takes a lifespan from pyjwt 2.6
+        with _jwks_clients_lock:
+            cached = _jwks_clients.get(self.url)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            jwks_client = jwt.PyJWKClient(f"{self.url}/jwks", cache_keys=True)
+            _jwks_clients[self.url] = (time.monotonic() + self.jwks_lifespan, jwks_client)
+            return jwks_client
+
     def getClientCredentialToken(self) -> str:
+        """
+        Returns the cached client credential token, requesting a new one shortly before it expires
+        """
+        token_key = (self.url, self.client_id.get())
+        token = self.__getCachedToken(token_key)
+        if token is not None:
+            return token
+
+        with _token_refresh_lock:
+            # Another caller may have refreshed the token while waiting for the lock
+            token = self.__getCachedToken(token_key)
+            if token is not None:
+                return token
+            token, expires_at = self.__requestClientCredentialToken()
+            with _tokens_lock:
+                _tokens[token_key] = (expires_at, token)
+            return token
+
+    @staticmethod
+    def clearTokenCache() -> None:
+        with _tokens_lock:
+            _tokens.clear()
+
+    def __getCachedToken(self, token_key: tuple[str, str]) -> str | None:
+        with _tokens_lock:
+            cached = _tokens.get(token_key)
+        if cached is not None and cached[0] - self.token_refresh_margin > time.time():
+            return cached[1]
+        return None
+
+    def __requestClientCredentialToken(self) -> tuple[str, float]:
         params = {
             'grant_type': "client_credentials",
             'client_id': self.client_id.get(),
             'client_secret': self.client_secret.get(),
         }
 
-        result = requests.post(
+        result = self.session.post(
             f"{self.url}token",
             headers=self.getOptions(),
             verify=self.get_verify_value(),
@@ -43,7 +99,14 @@ class OpenIdAPI(BaseAPI):
             raise Exception(
                 f"OpenIdAPI Failed to get client credential token, {result.content}")
         else:
-            return result.json()['access_token']
+            result_json = result.json()
+            token = result_json['access_token']
+            if 'expires_in' in result_json:
+                expires_at = time.time() + float(result_json['expires_in'])
+            else:
+                # Only the expiry claim is needed, the token is verified by its consumers
+                expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp", 0)
+            return token, expires_at
 
     def isTokenExpiredOrEmpty(self, token: str | None):
         if (not token):
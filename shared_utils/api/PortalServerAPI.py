@@ -1,9 +1,12 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 
 from shared_utils.api.BaseAPI import BaseAPI
 
 
 class PortalServerAPI(BaseAPI):
+    # Attribute updates of a batch sent at the same time, the portal server only accepts single attribute PUTs
+    max_attribute_update_workers: int = 8
+
     def __init__(self):
         super().__init__()
         self.url = self.get_service_route("portalServer")
@@ -12,7 +15,7 @@ class PortalServerAPI(BaseAPI):
         self.headers = self.get_options()
 
     def get_datasets_from_portal(self):
-        result = requests.get(
+        result = self.session.get(
             self.datasets_url,
             headers=self.headers,
             verify=self.get_verify_value()
@@ -25,7 +28,7 @@ class PortalServerAPI(BaseAPI):
             return datasets_list
 
     def update_dataset_attributes_table(self, study_id: str, attribute_id: str, attribute_value: str):
-        result = requests.put(
+        result = self.session.put(
             self.dataset_attributes_url,
             headers=self.headers,
             verify=self.get_verify_value(),
@@ -37,3 +40,69 @@ class PortalServerAPI(BaseAPI):
                 f"[{result.status_code}] PortalServerAPI - Failed to update dataset attribute '{attribute_id}' for study '{study_id}'")
         else:
             return True
+
+    def update_dataset_attributes(self, attributes: list[tuple[str, str, str]]) -> dict[tuple[str, str], Exception]:
+        """
+        Updates (study_id, attribute_id, attribute_value) attributes of one or many datasets,
+        sending the requests concurrently. Only the last value of a repeated attribute is sent.
+        Returns the errors of failed updates keyed by (study_id, attribute_id)
+        """
+        latest_values = {(str(study_id), attribute_id): attribute_value
+                         for study_id, attribute_id, attribute_value in attributes}
+        if not latest_values:
+            return {}
+
+        def update(attribute_key: tuple[str, str]) -> Exception | None:
+            try:
+                self.update_dataset_attributes_table(*attribute_key, latest_values[attribute_key])
+            except Exception as e:
+                return e
+            return None
+
+        max_workers = min(self.max_attribute_update_workers, len(latest_values))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            errors = dict(zip(latest_values, executor.map(update, latest_values)))
+        return {attribute_key: error for attribute_key, error in errors.items() if error is not None}
+
+    def attribute_batch(self, logger=None) -> "DatasetAttributeBatch":
+        return DatasetAttributeBatch(self, logger)
+
+
+class DatasetAttributeBatch:
+    """
+    Collects dataset attribute updates and sends them together when flushed or when the context exits.
+    Has the same update_dataset_attributes_table method as PortalServerAPI, so it can be passed in its place.
+    """
+
+    def __init__(self, portal_server_api: PortalServerAPI, logger=None):
+        self.portal_server_api = portal_server_api
+        self.logger = logger
+        self.attributes: list[tuple[str, str, str]] = []
+
+    def __enter__(self) -> "DatasetAttributeBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # attributes collected before an error are still sent
+        self.flush()
+
+    def update_dataset_attributes_table(self, study_id: str, attribute_id: str, attribute_value: str):
+        self.attributes.append((study_id, attribute_id, attribute_value))
+        return True
+
+    def flush(self) -> dict[tuple[str, str], Exception]:
+        attributes, self.attributes = self.attributes, []
+        errors = self.portal_server_api.update_dataset_attributes(attributes)
+        for (study_id, attribute_id), error in errors.items():
+            self.__log(f"Failed to update attribute '{attribute_id}' for dataset id '{study_id}': {error}", error=True)
+        if attributes:
+            self.__log(f"Sent {len(attributes)} dataset attribute updates, {len(errors)} failed")
+        return errors
+
+    def __log(self, message: str, error: bool = False) -> None:
+        if self.logger is None:
+            print(message)
+        elif error:
+            self.logger.error(message)
+        else:
+            self.logger.info(message)
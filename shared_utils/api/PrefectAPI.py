@@ -1,10 +1,24 @@
+import time
 from datetime import timedelta
+from threading import Lock
 
 from prefect import task
 from prefect.cache_policies import TASK_SOURCE
+from prefect.variables import Variable
+from prefect.blocks.system import Secret
 
 from shared_utils.types import AuthToken
 
+
+# Seconds a prefect variable or secret block is served from the in-process cache
+settings_cache_ttl: int = 300
+
+# Process-wide cache of prefect variables and secret blocks
+# ("variable" | "secret", name) -> (expiry timestamp, value)
+_settings_cache: dict[tuple[str, str], tuple[float, object]] = {}
+_settings_cache_lock = Lock()
+
+
 # Token serialized as pickle and stored temporarily in .prefect/storage
 @task(log_prints=True, cache_policy=TASK_SOURCE, cache_expiration=timedelta(seconds=300))
 def get_auth_token_from_input() -> AuthToken:
@@ -14,3 +28,39 @@ def get_auth_token_from_input() -> AuthToken:
 
 def get_token_value(auth_token: AuthToken) -> str:
     return auth_token.token.get_secret_value().replace("Bearer ", "")
+
+
+def get_variable(name: str, default=None):
+    """
+    Prefect variable value, or default if the variable is undefined
+    """
+    value = _get_cached_setting("variable", name, Variable.get)
+    return value if value is not None else default
+
+
+def load_secret(name: str) -> Secret:
+    return _get_cached_setting("secret", name, Secret.load)
+
+
+def clear_settings_cache(name: str = None) -> None:
+    """
+    Drops the cached variable and secret of a name, or all cached values if name is not given
+    """
+    with _settings_cache_lock:
+        if name is None:
+            _settings_cache.clear()
+        else:
+            _settings_cache.pop(("variable", name), None)
+            _settings_cache.pop(("secret", name), None)
+
+
+def _get_cached_setting(kind: str, name: str, load):
+    with _settings_cache_lock:
+        cached = _settings_cache.get((kind, name))
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    value = load(name)
+    with _settings_cache_lock:
+        _settings_cache[(kind, name)] = (time.monotonic() + settings_cache_ttl, value)
+    return value
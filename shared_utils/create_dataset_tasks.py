@@ -65,39 +65,41 @@ def create_and_assign_roles_task(dbdao: DaoBase):
         case SupportedDatabaseDialects.POSTGRES:
             schema_read_role = f"{dbdao.schema_name}_read_role"
 
-    schema_read_role_exists = dbdao.check_role_exists(schema_read_role)
-    if schema_read_role_exists:
-        logger.info(f"'{schema_read_role}' role already exists")
-    else:
-        logger.info(f"'{schema_read_role}' does not exist")
-        dbdao.create_read_role(schema_read_role)
+    # Provision roles and grants on one connection, each statement committed on its own
+    with dbdao.session(commit_every=1):
+        schema_read_role_exists = dbdao.check_role_exists(schema_read_role)
+        if schema_read_role_exists:
+            logger.info(f"'{schema_read_role}' role already exists")
+        else:
+            logger.info(f"'{schema_read_role}' does not exist")
+            dbdao.create_read_role(schema_read_role)
         
-    # grant schema read role read privileges to schema read role
-    logger.info(f"Granting read privileges to '{schema_read_role}'")
-    dbdao.grant_read_privileges(schema_read_role)
-
-    # Check if read user exists
-    read_user_exists = dbdao.check_user_exists(dbdao.read_user)
-    if read_user_exists:
-        logger.info(f"'{dbdao.read_user}' user already exists")
-    else:
-        logger.info(f"'{dbdao.read_user}' user does not exist")
-        logger.info(f"Creating user '{dbdao.read_user}'..")
-        dbdao.create_user(dbdao.read_user)
-
-    # Check if read role exists
-    read_role_exists = dbdao.check_role_exists(dbdao.read_role)
-    if read_role_exists:
-        logger.info(f"'{dbdao.read_role}' role already exists")
-    else:
-        logger.info(f"'{dbdao.read_role}' role does not exist")
-        logger.info(
-            f"Creating '{dbdao.read_role}' role and assigning to '{dbdao.read_user}' user")
-        dbdao.create_and_assign_role(dbdao.read_user, dbdao.read_role)
-
-    # Grant read role read privileges
-    logger.info(f"Granting read privileges to '{dbdao.read_role}' role")
-    dbdao.grant_read_privileges(dbdao.read_role)
+        # grant schema read role read privileges to schema read role
+        logger.info(f"Granting read privileges to '{schema_read_role}'")
+        dbdao.grant_read_privileges(schema_read_role)
+
+        # Check if read user exists
+        read_user_exists = dbdao.check_user_exists(dbdao.read_user)
+        if read_user_exists:
+            logger.info(f"'{dbdao.read_user}' user already exists")
+        else:
+            logger.info(f"'{dbdao.read_user}' user does not exist")
+            logger.info(f"Creating user '{dbdao.read_user}'..")
+            dbdao.create_user(dbdao.read_user)
+
+        # Check if read role exists
+        read_role_exists = dbdao.check_role_exists(dbdao.read_role)
+        if read_role_exists:
+            logger.info(f"'{dbdao.read_role}' role already exists")
+        else:
+            logger.info(f"'{dbdao.read_role}' role does not exist")
+            logger.info(
+                f"Creating '{dbdao.read_role}' role and assigning to '{dbdao.read_user}' user")
+            dbdao.create_and_assign_role(dbdao.read_user, dbdao.read_role)
+
+        # Grant read role read privileges
+        logger.info(f"Granting read privileges to '{dbdao.read_role}' role")
+        dbdao.grant_read_privileges(dbdao.read_role)
 
 
 def drop_schema_hook(task, task_run, state, dbdao: DaoBase):
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from threading import Lock
+from contextlib import nullcontext
+
 from shared_utils.dao.ibisdao import IbisDao
 from shared_utils.dao.sqlalchemydao import SqlAlchemyDao
 from shared_utils.types import SupportedDatabaseDialects
@@ -9,15 +12,45 @@ if TYPE_CHECKING:
     from shared_utils.dao.daobase import DaoBase
 
 
+# Memoized dao class per (database_code, use_cache_db, connect_to_duckdb)
+_dao_classes: dict[tuple, type[DaoBase]] = {}
+_dao_classes_lock = Lock()
+
+
 # Factory to return the correct dao implementation        
 def DBDao(**kwargs) -> DaoBase:
-    testinstance = SqlAlchemyDao(**kwargs)
-    match testinstance.dialect:
+    dao_class = get_dao_class(kwargs["database_code"],
+                              kwargs.get("use_cache_db", False),
+                              kwargs.get("connect_to_duckdb", False))
+    return dao_class(**kwargs)
+
+
+def get_dao_class(database_code: str, use_cache_db: bool = False, connect_to_duckdb: bool = False) -> type[DaoBase]:
+    dao_class_key = (database_code, use_cache_db, connect_to_duckdb)
+    with _dao_classes_lock:
+        dao_class = _dao_classes.get(dao_class_key)
+    if dao_class is not None:
+        return dao_class
+
+    dialect = SqlAlchemyDao.resolve_dialect(database_code, use_cache_db, connect_to_duckdb)
+    match dialect:
         case SupportedDatabaseDialects.POSTGRES:
-            return IbisDao(**vars(testinstance))
+            dao_class = IbisDao
         case SupportedDatabaseDialects.HANA | SupportedDatabaseDialects.DUCKDB:
-            return SqlAlchemyDao(**vars(testinstance))
+            dao_class = SqlAlchemyDao
         case _:
             supported_dialects = [dialect.value for dialect in SupportedDatabaseDialects]
-            if testinstance.dialect not in supported_dialects:
-                raise ValueError(f"Database dialect '{testinstance.dialect}' not supported, only '{supported_dialects}'.")
\ No newline at end of file
+            raise ValueError(f"Database dialect '{dialect}' not supported, only '{supported_dialects}'.")
+
+    with _dao_classes_lock:
+        _dao_classes[dao_class_key] = dao_class
+    return dao_class
+
+
+def ibis_session_scope(dbdao: DaoBase):
+    """
+    Keeps one ibis connection open across calls for IbisDao, no-op for other daos
+    """
+    if isinstance(dbdao, IbisDao):
+        return dbdao.ibis_session()
+    return nullcontext()
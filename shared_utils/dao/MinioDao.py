@@ -1,21 +1,24 @@
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from io import BytesIO
+from typing import Iterable
+from tempfile import NamedTemporaryFile
 from minio import Minio
 
-from prefect.variables import Variable
-from prefect.blocks.system import Secret
+from shared_utils.api.PrefectAPI import get_variable, load_secret
 
 
 class MinioDao():
     def __init__(self):
-        minio_endpoint = Variable.get("minio_endpoint")
-        minio_port = Variable.get("minio_port")
-        minio_access_key = Variable.get("minio_access_key")
-        minio_region = Variable.get("minio_region")
-        minio_ssl = True if Variable.get("minio_ssl") == "true" else False
+        minio_endpoint = get_variable("minio_endpoint")
+        minio_port = get_variable("minio_port")
+        minio_access_key = get_variable("minio_access_key")
+        minio_region = get_variable("minio_region")
+        minio_ssl = True if get_variable("minio_ssl") == "true" else False
         
-        minio_secret_key = Secret.load("minio-secret-key")
+        minio_secret_key = load_secret("minio-secret-key")
 
         self.minio_region = minio_region
         self.client = Minio(
@@ -35,4 +38,24 @@ class MinioDao():
             self.client.make_bucket(bucket_name, self.minio_region)
 
         self.client.put_object(bucket_name, file_name,
-                            buffer, - 1, part_size=10*1024*1024)
\ No newline at end of file
+                            buffer, - 1, part_size=10*1024*1024)
+
+
+    def put_record_batches_as_parquet(self, bucket_name: str, file_name: str, batches: Iterable[pa.RecordBatch]):
+        # Write batches to a local parquet file so only one batch is held in memory
+        with NamedTemporaryFile(suffix=".parquet") as parquet_file:
+            writer = None
+            for batch in batches:
+                if writer is None:
+                    writer = pq.ParquetWriter(parquet_file.name, batch.schema)
+                writer.write_batch(batch)
+            if writer is None:
+                pq.write_table(pa.table({}), parquet_file.name)
+            else:
+                writer.close()
+
+            if not self.client.bucket_exists(bucket_name):
+                self.client.make_bucket(bucket_name, self.minio_region)
+
+            self.client.fput_object(bucket_name, file_name, parquet_file.name,
+                                    part_size=10*1024*1024)
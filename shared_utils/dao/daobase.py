@@ -1,17 +1,21 @@
 import re
-from typing import Optional, Tuple
+import time
+from threading import Lock
+from typing import Iterator, Optional, Tuple
 from datetime import datetime
 from abc import ABC, abstractmethod
+import pandas as pd
+import pyarrow as pa
 from pydantic import BaseModel
 from sqlalchemy import text
 
-from prefect.variables import Variable
-from prefect.blocks.system import Secret
 from shared_utils.types import UserType, AuthToken
-from shared_utils.api.PrefectAPI import get_auth_token_from_input, get_token_value
+from shared_utils.api.PrefectAPI import get_auth_token_from_input, get_token_value, get_variable, load_secret, clear_settings_cache
 
 from shared_utils.api.OpenIdAPI import OpenIdAPI
-from shared_utils.types import SupportedDatabaseDialects, UserType, DBCredentialsType, CacheDBCredentialsType, AuthMode
+from shared_utils.types import (SupportedDatabaseDialects, UserType, DBCredentialsType, CacheDBCredentialsType, AuthMode,
+                                TableStatRequestType, TableStatResultType, SchemaCatalogType,
+                                ChangelogSummaryType)
 
 class DialectDrivers(BaseModel):
     class jdbc:
@@ -39,8 +43,19 @@ class DialectDrivers(BaseModel):
         duckdb: str = "duckdb"
 
 
+# Process-wide caches shared by all dao instances
+# database_code -> (expiry timestamp, resolved credentials)
+_credentials_cache: dict[str, tuple[float, DBCredentialsType]] = {}
+_cache_lock = Lock()
+
+
 class DaoBase(ABC):
     path_to_driver = "/app/inst/drivers"
+
+    # Seconds before resolved database credentials are re-read from the secret block
+    credentials_ttl: int = 300
+    # Upper bound in seconds for serving vocabulary version reads from the worker's result cache
+    result_cache_ttl: int = 3600
     
     use_cache_db: bool = False
     database_code: str
@@ -56,11 +71,6 @@ class DaoBase(ABC):
                  vocab_schema_name: str = None,
                  connect_to_duckdb: bool = False):
         
-        secret_block = Secret.load("database-credentials").get()
-        if secret_block is None:
-           raise ValueError(
-               "'DATABASE_CREDENTIALS' secret block is undefined!")
-
         self.use_cache_db = use_cache_db
         self.database_code = database_code
         self.user_type = user_type
@@ -68,6 +78,9 @@ class DaoBase(ABC):
         self.vocab_schema_name = vocab_schema_name
         self.connect_to_duckdb = connect_to_duckdb
 
+        # Fail early on missing credentials, also warms the credentials cache
+        self.__extract_database_credentials()
+
     # --- Property methods ---
     
     @property
@@ -92,15 +105,24 @@ class DaoBase(ABC):
             if self.connect_to_duckdb == True:
                 database_credentials.dialect = SupportedDatabaseDialects.DUCKDB.value
             database_credentials.databaseName = self.__create_cachedb_db_name(database_credentials)
-            database_credentials.adminUser = database_credentials.readUser = "Bearer " + OpenIdAPI().getClientCredentialToken()
+            database_credentials.adminUser = database_credentials.readUser = "Bearer " + self.__get_cachedb_token()
             database_credentials.adminPassword = database_credentials.readPassword = "Qwerty"
-            database_credentials.host = Variable.get("cachedb_host")
-            database_credentials.port = Variable.get("cachedb_port")
+            database_credentials.host = get_variable("cachedb_host")
+            database_credentials.port = get_variable("cachedb_port")
             database_credentials_dict = database_credentials.model_dump()
             return CacheDBCredentialsType(**database_credentials_dict)
         return database_credentials
 
 
+    # --- Session methods ---
+    @abstractmethod
+    def session(self, commit_every: int = None):
+        """
+        Context manager running the dao calls inside it in one transaction
+        """
+        pass
+
+
     # --- Create methods ---
     @abstractmethod
     def create_schema(self):
@@ -132,13 +154,21 @@ class DaoBase(ABC):
     @abstractmethod
     def get_columns(self, table: str) -> list[str]:
         pass
+
+    @abstractmethod
+    def get_schema_catalog(self, schema_name: str = None, refresh: bool = False) -> SchemaCatalogType:
+        """
+        Returns an immutable snapshot of every table, column, type, primary key and index of the schema,
+        read in a single catalog query
+        """
+        pass
     
     @abstractmethod
-    def get_table_row_count(self, table: str) -> int:
+    def get_table_row_count(self, table: str, estimate: bool = False) -> int:
         pass
 
     @abstractmethod
-    def get_distinct_count(self, table_name: str, column_name: str) -> int:
+    def get_distinct_count(self, table_name: str, column_name: str, estimate: bool = False) -> int:
         pass
 
     @abstractmethod
@@ -146,7 +176,26 @@ class DaoBase(ABC):
         pass
 
     @abstractmethod
-    def get_next_record_id(self, table_name: str, id_column_name: int) -> int:
+    def get_table_stats(self, stat_requests: list[TableStatRequestType]) -> dict[str, TableStatResultType]:
+        """
+        Resolves many row counts, distinct counts and values of the schema in one round trip.
+        Failing entries are returned with an error instead of failing the batch.
+        """
+        pass
+
+    @abstractmethod
+    def iter_record_batches(self, table_name: str, columns: list[str], filter_conditions=None, batch_rows: int = None) -> Iterator[pa.RecordBatch]:
+        """
+        Streams the selected columns of a table as arrow record batches of at most batch_rows rows.
+        Projection and filter_conditions are applied by the database.
+        """
+        pass
+
+    @abstractmethod
+    def get_next_record_id(self, table_name: str, id_column_name: str) -> int:
+        """
+        Returns a new id for the table, drawn from a block of ids reserved in the database
+        """
         pass
 
     @abstractmethod
@@ -161,6 +210,20 @@ class DaoBase(ABC):
     def get_datamodel_updated_date(self) -> datetime:
         pass
 
+    @abstractmethod
+    def get_changelog_summary(self) -> ChangelogSummaryType:
+        """
+        Latest executed changeset, created and updated dates of the data model in one query on databasechangelog
+        """
+        pass
+
+    @abstractmethod
+    def get_changelog_summaries(self, schema_names: list[str]) -> dict[str, ChangelogSummaryType]:
+        """
+        Changelog summaries of many schemas of the database in one query, keyed by schema name
+        """
+        pass
+
 
 
     # --- Update methods ---
@@ -171,6 +234,15 @@ class DaoBase(ABC):
     @abstractmethod
     def insert_values_into_table(self, table_name: str, column_value_mapping: list[dict]):
         pass
+
+    @abstractmethod
+    def upsert_many(self, table_name: str, rows: list[dict], key_columns: list[str],
+                    update_columns: list[str] = None, returning: list[str] = None) -> list[dict] | int:
+        pass
+
+    @abstractmethod
+    def bulk_insert(self, table_name: str, data: pd.DataFrame | pa.Table, mode: str = "append", schema_name: str = None) -> int:
+        pass
     
     
 
@@ -356,15 +428,56 @@ class DaoBase(ABC):
 
     # --- Helper methods ---
     def __extract_database_credentials(self) -> DBCredentialsType:
-        database_credentials_list = Secret.load("database-credentials").get()
+        return self.__load_database_credentials(self.database_code)
+
+    @classmethod
+    def __load_database_credentials(cls, database_code: str) -> DBCredentialsType:
+        with _cache_lock:
+            cached = _credentials_cache.get(database_code)
+        if cached is not None and cached[0] > time.monotonic():
+            # copy as tenant_configs modifies the credentials for cachedb
+            return cached[1].model_copy(deep=True)
+
+        database_credentials_list = load_secret("database-credentials").get()
         if not database_credentials_list:
             raise ValueError(f"'DATABASE_CREDENTIALS' secret is empty")
-        _db = next(filter(lambda x: x["values"]["code"] == self.database_code and "alp-dataflow-gen" in x["tags"], database_credentials_list), None)
+        _db = next(filter(lambda x: x["values"]["code"] == database_code and "alp-dataflow-gen" in x["tags"], database_credentials_list), None)
         if not _db:
-            raise ValueError(f"Database code '{self.database_code}' not found in database credentials")
-        return self.__process_database_credentials(_db)    
+            raise ValueError(f"Database code '{database_code}' not found in database credentials")
+        database_credentials = cls.__process_database_credentials(_db)
+
+        with _cache_lock:
+            _credentials_cache[database_code] = (time.monotonic() + cls.credentials_ttl, database_credentials)
+        return database_credentials.model_copy(deep=True)
 
-    def __process_database_credentials(self, base_database_credentials: dict) -> DBCredentialsType:
+    @classmethod
+    def resolve_dialect(cls, database_code: str, use_cache_db: bool = False, connect_to_duckdb: bool = False) -> str:
+        """
+        Returns the dialect of a dao for database_code from the cached credentials,
+        without building the dao or fetching a cachedb token
+        """
+        dialect = cls.__load_database_credentials(database_code).dialect
+        if use_cache_db:
+            if connect_to_duckdb:
+                return SupportedDatabaseDialects.DUCKDB.value
+            if dialect == SupportedDatabaseDialects.POSTGRES:
+                # Same as tenant_configs, cachedb names postgres databases 'postgresql'
+                return "postgresql"
+        return dialect
+
+    def __get_cachedb_token(self) -> str:
+        # Cached in-process by OpenIdAPI until shortly before it expires
+        return OpenIdAPI().getClientCredentialToken()
+
+    @staticmethod
+    def clear_credentials_cache() -> None:
+        with _cache_lock:
+            _credentials_cache.clear()
+        clear_settings_cache("database-credentials")
+        OpenIdAPI.clearTokenCache()
+
+    @staticmethod
+    def __process_database_credentials(base_database_credentials: dict) -> DBCredentialsType:
         combined = {**base_database_credentials["values"], **base_database_credentials["values"]["credentials"]}
         database_credentials = DBCredentialsType(**combined)
         match database_credentials.dialect:
@@ -373,7 +486,7 @@ class DaoBase(ABC):
             case SupportedDatabaseDialects.POSTGRES:
                 database_credentials.readRole = "postgres_tenant_read_role"
             case _:
-                dialect_err = f"Dialect {self.values['dialect']} not supported. Unable to find corresponding dialect read role."
+                dialect_err = f"Dialect {database_credentials.dialect} not supported. Unable to find corresponding dialect read role."
                 raise ValueError(dialect_err)
         return database_credentials
 
@@ -0,0 +1,65 @@
+import atexit
+import hashlib
+from threading import Lock
+from typing import Hashable
+
+import sqlalchemy as sql
+from sqlalchemy.engine import Engine
+
+from shared_utils.dao.instrumentation import instrument_engine
+
+
+# Process-wide registry of pooled engines
+# key -> (hash of connection string and connect_args, engine)
+_engines: dict[Hashable, tuple[str, Engine]] = {}
+_engines_lock = Lock()
+
+
+def get_engine(key: Hashable, connection_string: str, **engine_kwargs) -> Engine:
+    """
+    Returns the pooled engine registered under key, creating it on first use.
+
+    If the connection string or connect_args for a key change (e.g. a refreshed cachedb bearer token,
+    a rotated password or a refreshed hana token), the old engine is disposed and replaced.
+    """
+    credentials_hash = _hash_credentials(connection_string, engine_kwargs.get("connect_args"))
+    with _engines_lock:
+        registered = _engines.get(key)
+        if registered is not None:
+            registered_credentials_hash, engine = registered
+            if registered_credentials_hash == credentials_hash:
+                return engine
+            engine.dispose()
+
+        engine = sql.create_engine(connection_string, **engine_kwargs)
+        instrument_engine(engine)
+        _engines[key] = (credentials_hash, engine)
+        return engine
+
+
+def _hash_credentials(connection_string: str, connect_args: dict = None) -> str:
+    # Hashed so the registry does not keep the passwords and tokens themselves
+    credentials = repr((connection_string, sorted((connect_args or {}).items())))
+    return hashlib.sha256(credentials.encode()).hexdigest()
+
+
+def dispose_engines() -> None:
+    """
+    Closes all pooled connections and clears the registry.
+    To be called at the end of a flow run.
+    """
+    with _engines_lock:
+        for _, engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def dispose_engines_hook(flow, flow_run, state) -> None:
+    """
+    Prefect on_completion / on_failure flow hook wrapping dispose_engines
+    """
+    dispose_engines()
+
+
+# Worker processes may exit without the flow calling dispose_engines
+atexit.register(dispose_engines)
@@ -1,12 +1,33 @@
 import ibis
+import time
 import pandas as pd
-from typing import Any
+import pyarrow as pa
+import sqlalchemy as sql
+from typing import Any, Iterator
 from datetime import datetime
+from functools import wraps
 from contextlib import contextmanager
 
 from shared_utils.dao.sqlalchemydao import SqlAlchemyDao
+from shared_utils.dao.idallocator import clear_id_allocators
+from shared_utils.dao.instrumentation import InstrumentedCursor, timed
+from shared_utils.dao.resultcache import read_through
 from shared_utils.types import UserType, SupportedDatabaseDialects
 
+
+def reads_session_connection(method):
+    """
+    Within session(), runs the SqlAlchemyDao implementation of an ibis call on the session connection instead,
+    so the call sees the uncommitted writes of the unit of work and does not wait on its locks
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._session_connection is not None:
+            return getattr(super(IbisDao, self), method.__name__)(*args, **kwargs)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
 class IbisDao(SqlAlchemyDao):
     """
     Using Ibis-Framework for implementation
@@ -21,6 +42,12 @@ class IbisDao(SqlAlchemyDao):
                  schema_name: str = None, vocab_schema_name: str = None, connect_to_duckdb = False, metadata = None):
 
         super().__init__(use_cache_db, database_code, user_type, schema_name, vocab_schema_name, connect_to_duckdb)
+        self._ibis_session_active = False
+        self._ibis_session_con = None
+        self._ibis_session_last_used = 0.0
+
+    # Seconds a session connection may stay idle before it is health-checked on reuse
+    ibis_session_health_check_interval: int = 30
 
     # --- Create methods ---
     def create_schema(self) -> None:
@@ -54,24 +81,65 @@ class IbisDao(SqlAlchemyDao):
     def copy_table_as_dataframe(self, source_table_name: str, columns_to_copy: list[str], 
                             filter_conditions: dict = None) -> pd.DataFrame:
         with self.ibis_connect() as con:
-            table_obj = con.table(database=self.schema_name,
-                                name=source_table_name)
-            query = table_obj.select(columns_to_copy)
-            
-            if "patient_filter" in filter_conditions:            
-                person_id_column = filter_conditions["patient_filter"]["person_id_column"]
-                patients_to_filter = filter_conditions["patient_filter"]["patients_to_filter"]
+            query = self.__create_filtered_query(con, source_table_name, columns_to_copy, filter_conditions)
+            if self._session_connection is None:
+                copied_df = query.execute()
+                return copied_df
+            compiled_query = str(ibis.to_sql(query, dialect="postgres"))
+        # Within session(), read on the session connection so uncommitted writes are seen
+        return pd.read_sql_query(sql.text(compiled_query), self._session_connection)
+
+    def iter_record_batches(self, table_name: str, columns: list[str], filter_conditions: dict = None, 
+                            batch_rows: int = None) -> Iterator[pa.RecordBatch]:
+        # ibis builds the projection and filters, rows are streamed on a server-side cursor
+        # as the ibis postgres backend fetches whole results through a client-side cursor
+        filter_conditions = filter_conditions if filter_conditions else {}
+        patients_to_filter = filter_conditions.get("patient_filter", {}).get("patients_to_filter", [])
+        with self._connection() as connection:
+            # Large patient filters are staged on the connection running the query
+            key_table = None
+            if len(patients_to_filter) > self.key_table_threshold:
+                key_table = self.create_key_table(connection, patients_to_filter)
+            try:
+                with self.ibis_connect() as con:
+                    query = self.__create_filtered_query(con, table_name, columns, filter_conditions,
+                                                         patient_key_table_name=key_table.name if key_table is not None else None)
+                    arrow_schema = query.schema().to_pyarrow()
+                    compiled_query = str(ibis.to_sql(query, dialect="postgres"))
+                yield from self.iter_statement_batches(sql.text(compiled_query), arrow_schema, batch_rows, connection=connection)
+            finally:
+                if key_table is not None:
+                    self.drop_key_table(connection, key_table)
+
+    def __create_filtered_query(self, con, table_name: str, columns: list[str], filter_conditions: dict = None,
+                                patient_key_table_name: str = None):
+        filter_conditions = filter_conditions if filter_conditions else {}
+        table_obj = con.table(database=self.schema_name,
+                              name=table_name)
+        query = table_obj.select(columns)
+        
+        if "patient_filter" in filter_conditions:            
+            person_id_column = filter_conditions["patient_filter"]["person_id_column"]
+            patients_to_filter = filter_conditions["patient_filter"]["patients_to_filter"]
+            if patient_key_table_name is not None:
+                # Key table already staged by the caller
+                key_table = ibis.table({"filter_key": table_obj[person_id_column].type()}, name=patient_key_table_name)
+                query = query.filter(table_obj[person_id_column].isin(key_table.filter_key))
+            elif len(patients_to_filter) > self.key_table_threshold:
+                # ibis stages memtables as temporary tables when the query is executed
+                key_table = ibis.memtable({"filter_key": patients_to_filter})
+                query = query.filter(table_obj[person_id_column].isin(key_table.filter_key))
+            else:
                 query = query.filter(table_obj[person_id_column].isin(patients_to_filter))
-            
-            if "date_filter" in filter_conditions:
-                timestamp_column = filter_conditions["date_filter"]["timestamp_column"]
-                dates_to_filter = filter_conditions["date_filter"]["dates_to_filter"]
-                query = query.filter(dates_to_filter >= table_obj[timestamp_column])
-            
-            copied_df = query.execute()
-            return copied_df
+        
+        if "date_filter" in filter_conditions:
+            timestamp_column = filter_conditions["date_filter"]["timestamp_column"]
+            dates_to_filter = filter_conditions["date_filter"]["dates_to_filter"]
+            query = query.filter(dates_to_filter >= table_obj[timestamp_column])
+        return query
         
     # --- Read methods ---
+    @reads_session_connection
     def check_schema_exists(self) -> bool:
         with self.ibis_connect() as con:
             schemas = con.list_databases()
@@ -101,6 +169,8 @@ class IbisDao(SqlAlchemyDao):
     #     return tables
     
     
+    @read_through("vocab_schema_name")
+    @reads_session_connection
     def get_cdm_version_concept_id(self, cdm_concept_code: str):
         with self.ibis_connect() as con:
             table_obj = con.table(name="concept", 
@@ -114,6 +184,8 @@ class IbisDao(SqlAlchemyDao):
             concept_id = expr.execute()
             return int(concept_id.iloc[0,0])
     
+    @read_through("vocab_schema_name")
+    @reads_session_connection
     def get_vocabulary_version(self):
         with self.ibis_connect() as con:
             table_obj = con.table(name="vocabulary", 
@@ -123,6 +195,7 @@ class IbisDao(SqlAlchemyDao):
             vocab_version = expr.execute()
             return vocab_version.iloc[0,0]
 
+    @reads_session_connection
     def get_columns(self, table: str) -> list[str]:
         with self.ibis_connect() as con:
             table_obj = con.table(database=self.schema_name,
@@ -130,7 +203,12 @@ class IbisDao(SqlAlchemyDao):
         return table_obj.columns
     
 
-    def get_table_row_count(self, table_name: str) -> int:
+    @reads_session_connection
+    def get_table_row_count(self, table_name: str, estimate: bool = False) -> int:
+        if estimate:
+            estimated_row_count = self.get_estimated_row_count(table_name)
+            if estimated_row_count is not None:
+                return estimated_row_count
         with self.ibis_connect() as con:
             table_obj = con.table(database=self.schema_name,
                                   name=table_name)
@@ -138,13 +216,22 @@ class IbisDao(SqlAlchemyDao):
         return int(row_count)
 
 
-    def get_distinct_count(self, table_name: str, column_name: str) -> int:
+    @reads_session_connection
+    def get_distinct_count(self, table_name: str, column_name: str, estimate: bool = False) -> int:
+        # values of a single column primary key are distinct
+        if self.is_primary_key(table_name, column_name):
+            return self.get_table_row_count(table_name, estimate)
+        if estimate:
+            estimated_distinct_count = self.get_estimated_distinct_count(table_name, column_name)
+            if estimated_distinct_count is not None:
+                return estimated_distinct_count
         with self.ibis_connect() as con:
             table_obj = con.table(database=self.schema_name,
                                   name=table_name)
             row_count = table_obj.group_by(column_name).count().count().execute()
         return int(row_count)
     
+    @reads_session_connection
     def get_value(self, table_name: str, column_name: str):
         """
         Fetch the first column of the first row, and close the result set.
@@ -156,42 +243,6 @@ class IbisDao(SqlAlchemyDao):
             return value.iloc[0,0]
 
 
-    def get_next_record_id(self, table_name: str, id_column_name: int) -> int:
-        with self.ibis_connect() as con:
-            table_obj = con.table(database=self.schema_name,
-                                  name=table_name)
-            last_record_id = getattr(table_obj, id_column_name).max().execute()
-            if last_record_id is None:
-                return 1
-            return last_record_id + 1
-
-    def get_last_executed_changeset(self) -> str:
-        with self.ibis_connect() as con:
-            table_obj = con.table(database=self.schema_name,
-                                  name="databasechangelog")
-            latest_record = table_obj.order_by([table_obj.dateexecuted.desc()]).limit(1)
-            latest_changeset = latest_record.select("filename").execute()
-            return latest_changeset.iloc[0,0]
-
-
-    
-    def get_datamodel_created_date(self) -> datetime:
-        with self.ibis_connect() as con:
-            table_obj = con.table(database=self.schema_name,
-                                  name="databasechangelog")
-            first_record = getattr(table_obj, "dateexecuted").min().execute()
-            return first_record.to_pydatetime()
-
-
-
-    def get_datamodel_updated_date(self) -> datetime:
-        with self.ibis_connect() as con:
-            table_obj = con.table(database=self.schema_name,
-                                  name="databasechangelog")
-            last_record = getattr(table_obj, "dateexecuted").max().execute()
-            return last_record.to_pydatetime()
-        
-
     # --- Update methods ---
     # Use sqlalchemy implementation
     # def insert_values_into_table(self, table_name: str, column_value_mapping: list[dict]):
@@ -225,7 +276,10 @@ class IbisDao(SqlAlchemyDao):
     def drop_schema(self, cascade: bool=True):
         with self.ibis_connect() as con:
             con.drop_database(name=self.schema_name, cascade=cascade)
+        self.invalidate_reflection_cache()
+        clear_id_allocators(self.database_code, self.schema_name)
 
+    @reads_session_connection
     def truncate_table(self, table_name: str):
         with self.ibis_connect() as con:
             try:
@@ -238,14 +292,89 @@ class IbisDao(SqlAlchemyDao):
                 raise e
             else:
                 print(f"Sucessfully truncated table '{self.schema_name}.{table_name}'")
+            finally:
+                self.invalidate_reflection_cache()
+        self.reset_id_allocators(table_name)
                 
 
     # --- Helper methods ---
     @contextmanager
     def ibis_connect(self):
+        # Reuse the session connection if called within ibis_session
+        if self._ibis_session_active:
+            yield self.__get_ibis_session_connection()
+            return
+
         # Temporary as Ibis does not have a context manager yet
         con = None
         try:
+            con = self.__create_ibis_connection()
+            yield con
+        finally:
+            if con:
+                con.disconnect()
+                # gc.collect()
+        
+        # To check open cursors in pg: SELECT * FROM pg_cursors WHERE name = 'Crsr_IDs
+
+    @contextmanager
+    def session(self, commit_every: int = None):
+        """
+        Unit of work for sqlalchemy calls, also keeping one ibis connection open for ibis calls.
+        ibis reads run on the session connection, see reads_session_connection.
+        Other ibis calls run outside the sqlalchemy transaction.
+        """
+        with self.ibis_session():
+            with super().session(commit_every=commit_every) as dao:
+                yield dao
+
+    @contextmanager
+    def ibis_session(self):
+        """
+        Keeps one ibis backend open and reuses it for every ibis_connect call inside the block.
+        The backend is connected on the first ibis_connect call, blocks without ibis calls open no connection.
+
+        ```
+        with dbdao.ibis_session():
+            dbdao.check_table_exists("person")
+            dbdao.get_table_row_count("person")
+        ```
+        """
+        if self._ibis_session_active:
+            # Nested sessions share the outer connection
+            yield
+            return
+
+        self._ibis_session_active = True
+        try:
+            yield
+        finally:
+            self._ibis_session_active = False
+            con, self._ibis_session_con = self._ibis_session_con, None
+            if con is not None:
+                try:
+                    con.disconnect()
+                except Exception as e:
+                    print(f"Failed to disconnect ibis session: {e}")
+
+    def __get_ibis_session_connection(self):
+        if self._ibis_session_con is None:
+            self._ibis_session_con = self.__create_ibis_connection()
+            self._ibis_session_last_used = time.monotonic()
+            return self._ibis_session_con
+        idle_time = time.monotonic() - self._ibis_session_last_used
+        if idle_time > self.ibis_session_health_check_interval and not self.__is_connection_alive(self._ibis_session_con):
+            print("Ibis session connection is no longer alive, reconnecting..")
+            try:
+                self._ibis_session_con.disconnect()
+            except Exception:
+                pass
+            self._ibis_session_con = self.__create_ibis_connection()
+        self._ibis_session_last_used = time.monotonic()
+        return self._ibis_session_con
+
+    def __create_ibis_connection(self):
+        with timed("connection_acquisition"):
             configs = self.tenant_configs
             if self.connect_to_duckdb:
                 connection_string = self.create_cachedb_connection_url(
@@ -262,15 +391,18 @@ class IbisDao(SqlAlchemyDao):
                     host=configs.host,
                     port=configs.port,
                     database_name=configs.databaseName
-                )            
-            con = ibis.connect(connection_string, schema=self.schema_name)
-            yield con
-        finally:
-            if con:
-                con.disconnect()
-                # gc.collect()
-        
-        # To check open cursors in pg: SELECT * FROM pg_cursors WHERE name = 'Crsr_IDs
+                )
+            # ibis runs its queries on psycopg2 cursors of its own, record them for the query stats
+            return ibis.connect(connection_string, schema=self.schema_name, cursor_factory=InstrumentedCursor)
+
+    @staticmethod
+    def __is_connection_alive(con) -> bool:
+        try:
+            # postgres backend returns a cursor for raw sql
+            con.raw_sql("SELECT 1").close()
+        except Exception:
+            return False
+        return True
 
         
 
@@ -279,6 +411,7 @@ class IbisDao(SqlAlchemyDao):
 
         
     # --- User methods ---
+    @reads_session_connection
     def check_user_exists(self, user: str) -> bool:
         match self.dialect:
             case SupportedDatabaseDialects.POSTGRES:
@@ -298,6 +431,7 @@ class IbisDao(SqlAlchemyDao):
             return True
 
 
+    @reads_session_connection
     def check_role_exists(self, role_name: str) -> bool:
         match self.dialect:
             case SupportedDatabaseDialects.POSTGRES:
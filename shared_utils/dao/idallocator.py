@@ -0,0 +1,71 @@
+from threading import Lock
+from typing import Callable, Hashable
+
+
+class IdAllocator:
+    """
+    Hands out record ids from blocks reserved in the database, so only one
+    round trip is needed per block instead of one max()+1 query per row.
+    """
+
+    def __init__(self, reserve_block: Callable[[int], tuple[int, int]], block_size: int):
+        # reserve_block(block_size) returns the reserved range as (first_id, last_id + 1)
+        self._reserve_block = reserve_block
+        self._block_size = block_size
+        self._next_id = 0
+        self._block_end = 0
+        self._lock = Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next_id >= self._block_end:
+                self._next_id, self._block_end = self._reserve_block(self._block_size)
+            next_id = self._next_id
+            self._next_id += 1
+            return next_id
+
+
+# Process-wide allocators so all dao instances draw from the same reserved blocks
+# (database_code, use_cache_db, connect_to_duckdb, schema, table, id column) -> IdAllocator
+_allocators: dict[Hashable, IdAllocator] = {}
+_allocators_lock = Lock()
+
+# Allocator keys whose id block sequence could not be created, e.g. without the CREATE privilege.
+# Their ids are reserved one at a time from max()+1 without retrying the sequence.
+_sequence_failures: set[Hashable] = set()
+
+
+def get_id_allocator(key: tuple, reserve_block: Callable[[int], tuple[int, int]], block_size: int) -> IdAllocator:
+    with _allocators_lock:
+        allocator = _allocators.get(key)
+        if allocator is None:
+            allocator = IdAllocator(reserve_block, block_size)
+            _allocators[key] = allocator
+        return allocator
+
+
+def mark_sequence_failure(key: tuple) -> None:
+    with _allocators_lock:
+        _sequence_failures.add(key)
+
+
+def has_sequence_failure(key: tuple) -> bool:
+    with _allocators_lock:
+        return key in _sequence_failures
+
+
+def clear_id_allocators(database_code: str, schema_name: str, table_name: str = None) -> list[tuple]:
+    """
+    Drops the allocators of a schema, or of one of its tables, e.g. after the schema was dropped
+    or the table truncated. Returns the keys of the dropped allocators.
+    """
+    def matches(key: tuple) -> bool:
+        return key[0] == database_code and key[3] == schema_name and (table_name is None or key[4] == table_name.casefold())
+
+    with _allocators_lock:
+        cleared_keys = [key for key in _allocators if matches(key)]
+        for key in cleared_keys:
+            del _allocators[key]
+        for key in [key for key in _sequence_failures if matches(key)]:
+            _sequence_failures.discard(key)
+    return cleared_keys
@@ -0,0 +1,160 @@
+import re
+import time
+import logging
+from threading import Lock
+from contextlib import contextmanager
+
+import sqlalchemy as sql
+from sqlalchemy.engine import Engine
+from psycopg2.extensions import cursor as Psycopg2Cursor
+from prefect.artifacts import create_table_artifact
+
+
+# Statements taking longer than this many seconds are written to the slow query log
+slow_query_threshold: float = 1.0
+
+slow_query_logger = logging.getLogger("shared_utils.dao.slow_query")
+
+# Process-wide query statistics, published and reset at the end of a flow run
+# statement fingerprint -> { "calls", "total_seconds", "max_seconds", "rows" }
+_query_stats: dict[str, dict] = {}
+# timing category (e.g. connection_acquisition, reflection) -> { "calls", "total_seconds", "max_seconds" }
+_timing_stats: dict[str, dict] = {}
+_stats_lock = Lock()
+
+_literal_pattern = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_placeholder_list_pattern = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)")
+_whitespace_pattern = re.compile(r"\s+")
+
+
+def fingerprint_statement(statement: str) -> str:
+    """
+    Statement with literals replaced by '?' and placeholder lists collapsed,
+    so executions with different values are counted together
+    """
+    fingerprint = _literal_pattern.sub("?", statement)
+    fingerprint = _placeholder_list_pattern.sub("(...)", fingerprint)
+    return _whitespace_pattern.sub(" ", fingerprint).strip()
+
+
+def record_query(statement: str, seconds: float, rows: int = None) -> None:
+    fingerprint = fingerprint_statement(statement)
+    with _stats_lock:
+        stats = _query_stats.setdefault(fingerprint, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "rows": 0})
+        stats["calls"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        if rows is not None and rows >= 0:
+            stats["rows"] += rows
+    if seconds >= slow_query_threshold:
+        slow_query_logger.warning(f"Slow query took {seconds:.3f}s: {fingerprint}")
+
+
+def record_timing(category: str, seconds: float) -> None:
+    with _stats_lock:
+        stats = _timing_stats.setdefault(category, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["calls"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+
+@contextmanager
+def timed(category: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(category, time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Records every statement executed through engine
+    """
+    sql.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    sql.event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    sql.event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany) -> None:
+    connection.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany) -> None:
+    start = connection.info["query_start_times"].pop()
+    record_query(statement, time.perf_counter() - start, cursor.rowcount)
+
+
+def _handle_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute, so its start time is dropped here
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_times"):
+        connection.info["query_start_times"].pop()
+
+
+class InstrumentedCursor(Psycopg2Cursor):
+    """
+    psycopg2 cursor recording its statements, for connections not made through sqlalchemy (e.g. ibis)
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(self.__get_statement(query), time.perf_counter() - start, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(self.__get_statement(query), time.perf_counter() - start, self.rowcount)
+
+    def __get_statement(self, query) -> str:
+        # query may be a psycopg2.sql composable, self.query holds the statement sent last
+        if isinstance(query, str):
+            return query
+        return self.query.decode() if self.query else str(query)
+
+
+def get_query_stats() -> list[dict]:
+    with _stats_lock:
+        query_rows = [{"statement": fingerprint, **stats} for fingerprint, stats in _query_stats.items()]
+        timing_rows = [{"statement": f"<{category}>", "rows": None, **stats} for category, stats in _timing_stats.items()]
+    return sorted(query_rows, key=lambda row: row["total_seconds"], reverse=True) + timing_rows
+
+
+def reset_query_stats() -> None:
+    with _stats_lock:
+        _query_stats.clear()
+        _timing_stats.clear()
+
+
+def publish_query_stats() -> None:
+    """
+    Publishes the query statistics collected so far as a table artifact of the current flow run and resets them
+    """
+    query_stats = get_query_stats()
+    reset_query_stats()
+    if not query_stats:
+        return
+    # timing rows have no row count
+    round_trips = sum(row["calls"] for row in query_stats if row["rows"] is not None)
+    for row in query_stats:
+        row["statement"] = row["statement"][:500]
+        row["total_seconds"] = round(row["total_seconds"], 3)
+        row["max_seconds"] = round(row["max_seconds"], 3)
+    create_table_artifact(key="dao-query-stats",
+                          table=query_stats,
+                          description=f"{round_trips} database round trips by statement, slowest first")
+
+
+def publish_query_stats_hook(flow, flow_run, state) -> None:
+    """
+    Prefect on_completion / on_failure flow hook wrapping publish_query_stats
+    """
+    try:
+        publish_query_stats()
+    except Exception as e:
+        print(f"Failed to publish query stats: {e}")
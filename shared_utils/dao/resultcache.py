@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import sqlite3
+import getpass
+import tempfile
+from functools import wraps
+from threading import Lock
+
+
+# Local sqlite file shared by the flow runs of a worker, in a directory only readable by the worker's user.
+# Results are stored as JSON, so a tampered file cannot run code in the flow process.
+result_cache_dir: str = os.path.join(tempfile.gettempdir(), f"dao_result_cache_{getpass.getuser()}")
+
+_connection: sqlite3.Connection | None = None
+_connection_lock = Lock()
+
+# Returned by get_cached_result on a miss, as None is a valid cached result
+MISSING = object()
+
+# Tables read by read_through methods, writes to other tables leave the cached results valid
+cached_tables = {"concept", "vocabulary"}
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        os.makedirs(result_cache_dir, mode=0o700, exist_ok=True)
+        cache_dir_stat = os.stat(result_cache_dir)
+        if cache_dir_stat.st_mode & 0o077 or (hasattr(os, "getuid") and cache_dir_stat.st_uid != os.getuid()):
+            raise ValueError(f"Result cache directory '{result_cache_dir}' must be private to the current user")
+        _connection = sqlite3.connect(os.path.join(result_cache_dir, "dao_result_cache.sqlite3"),
+                                      timeout=10, check_same_thread=False)
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                database_code TEXT NOT NULL,
+                schema_name TEXT NOT NULL,
+                query_key TEXT NOT NULL,
+                value TEXT,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (database_code, schema_name, query_key)
+            )""")
+        _connection.execute("DELETE FROM result_cache WHERE expires_at < ?", (time.time(),))
+        _connection.commit()
+    return _connection
+
+
+def get_cached_result(database_code: str, schema_name: str, query_key: str):
+    with _connection_lock:
+        row = _get_connection().execute(
+            "SELECT value, expires_at FROM result_cache WHERE database_code = ? AND schema_name = ? AND query_key = ?",
+            (database_code, schema_name, query_key)).fetchone()
+    if row is None or row[1] < time.time():
+        return MISSING
+    return json.loads(row[0])
+
+
+def put_cached_result(database_code: str, schema_name: str, query_key: str, value, ttl: int) -> None:
+    with _connection_lock:
+        connection = _get_connection()
+        connection.execute("INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?, ?)",
+                           (database_code, schema_name, query_key, json.dumps(value), time.time() + ttl))
+        connection.commit()
+
+
+def invalidate_results(schema_name: str, database_code: str = None) -> None:
+    """
+    Drops the cached results of a schema, in all databases if database_code is not given.
+    Schema names are matched case-insensitively, as callers differ in the casing of hana schemas.
+    """
+    try:
+        with _connection_lock:
+            connection = _get_connection()
+            if database_code is None:
+                connection.execute("DELETE FROM result_cache WHERE lower(schema_name) = lower(?)", (schema_name,))
+            else:
+                connection.execute("DELETE FROM result_cache WHERE database_code = ? AND lower(schema_name) = lower(?)",
+                                   (database_code, schema_name))
+            connection.commit()
+    except Exception as e:
+        print(f"Failed to invalidate cached results of schema '{schema_name}': {e}")
+
+
+def invalidate_table_results(schema_name: str, table_name: str, database_code: str = None) -> None:
+    """
+    Drops the cached results of a schema after a write to table_name, if a cached read depends on the table
+    """
+    if table_name.casefold() in cached_tables:
+        invalidate_results(schema_name, database_code)
+
+
+def read_through(schema_attribute: str = "schema_name"):
+    """
+    Caches the JSON serializable results of a dao read method for the dao's result_cache_ttl seconds,
+    keyed by (database_code, schema, method and arguments), and shared by the flow runs of a worker.
+    Writes through the dao to cached_tables and schema changes invalidate the results of the schema,
+    result_cache_ttl bounds how long writes by other workers go unnoticed.
+    schema_attribute names the dao attribute holding the schema the method reads from.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            schema_name = getattr(self, schema_attribute)
+            query_key = f"{method.__name__}{args!r}{sorted(kwargs.items())!r}"
+            try:
+                value = get_cached_result(self.database_code, schema_name, query_key)
+            except Exception as e:
+                # The cache is an optimization only, read from the database if it is unavailable
+                print(f"Failed to read cached result '{query_key}': {e}")
+                value = MISSING
+            if value is not MISSING:
+                return value
+
+            value = method(self, *args, **kwargs)
+            try:
+                put_cached_result(self.database_code, schema_name, query_key, value, self.result_cache_ttl)
+            except Exception as e:
+                print(f"Failed to cache result '{query_key}': {e}")
+            return value
+        return wrapper
+    return decorator
@@ -1,7 +1,14 @@
-from functools import wraps
-from typing import Any, Callable
-from datetime import datetime
+import time
+from io import StringIO
+from uuid import uuid4
+from functools import partial, wraps
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Hashable, Iterator
+from decimal import Decimal
+from datetime import date, datetime
 import pandas as pd
+import pyarrow as pa
 import re
 
 import sqlalchemy as sql
@@ -11,14 +18,114 @@ from sqlalchemy.types import Text, UnicodeText
 from sqlalchemy.sql.schema import Table, Column
 from sqlalchemy.engine.cursor import CursorResult
 from sqlalchemy.schema import CreateSchema, DropSchema
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
 
 from shared_utils.dao.daobase import DaoBase
-from shared_utils.types import SupportedDatabaseDialects, UserType
+from shared_utils.dao.engineregistry import get_engine
+from shared_utils.dao.instrumentation import timed
+from shared_utils.dao.resultcache import invalidate_results, invalidate_table_results
+from shared_utils.dao.idallocator import (IdAllocator, get_id_allocator, clear_id_allocators,
+                                          mark_sequence_failure, has_sequence_failure)
+from shared_utils.types import (SupportedDatabaseDialects, UserType, TableStatType,
+                                TableStatRequestType, TableStatResultType, SchemaCatalogType,
+                                CatalogTableType, CatalogColumnType, CatalogIndexType, ChangelogSummaryType)
+
+
+# Process-wide cache of reflected tables
+# (database_code, use_cache_db, connect_to_duckdb, schema) -> { table_name: (expiry timestamp, reflected table) }
+_reflection_cache: dict[tuple, dict[str, tuple[float, Table]]] = {}
+_reflection_lock = Lock()
+
+# Schema catalog snapshots, keyed and invalidated like the reflection cache
+# (database_code, use_cache_db, connect_to_duckdb, schema) -> (expiry timestamp, catalog)
+_catalog_cache: dict[tuple, tuple[float, SchemaCatalogType]] = {}
+
+# Statements of execute_cached_statement, keyed and invalidated like the reflection cache
+# (database_code, use_cache_db, connect_to_duckdb, schema, statement_key) -> statement
+_statement_cache: dict[tuple, Any] = {}
+
+# Columns, primary keys and indexes of a schema as one row set
+# (entry_type, table_name, table_type, entry_name, column_name, data_type, is_nullable, ordinal_position, is_unique)
+_information_schema_catalog_query = """
+    SELECT 'column' AS entry_type, CAST(c.table_name AS VARCHAR) AS table_name, CAST(t.table_type AS VARCHAR) AS table_type,
+    CAST(c.column_name AS VARCHAR) AS entry_name, CAST(NULL AS VARCHAR) AS column_name, CAST(c.data_type AS VARCHAR) AS data_type,
+    c.is_nullable = 'YES' AS is_nullable, CAST(c.ordinal_position AS INTEGER) AS ordinal_position, CAST(NULL AS BOOLEAN) AS is_unique
+    FROM information_schema.columns c
+    JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = :schema_name
+    UNION ALL
+    SELECT 'primary_key', CAST(k.table_name AS VARCHAR), NULL, CAST(k.constraint_name AS VARCHAR), CAST(k.column_name AS VARCHAR),
+    NULL, NULL, CAST(k.ordinal_position AS INTEGER), NULL
+    FROM information_schema.table_constraints tc
+    JOIN information_schema.key_column_usage k ON k.constraint_schema = tc.constraint_schema
+    AND k.constraint_name = tc.constraint_name AND k.table_name = tc.table_name
+    WHERE tc.table_schema = :schema_name AND tc.constraint_type = 'PRIMARY KEY'"""
+
+# Arrow types for the python types of reflected columns, used to keep a stable schema across record batches.
+# Decimal columns are mapped from their precision and scale in __to_arrow_type.
+_arrow_types = {
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp("us"),
+    date: pa.date32(),
+    bytes: pa.binary()
+}
+
+
+def invalidate_schema_caches(schema_name: str | None, database_code: str = None) -> None:
+    """
+    Drops the reflected tables, catalog snapshots, cached statements and cached results of a schema,
+    in all databases if database_code is not given, e.g. after external DDL such as a liquibase update.
+    Schema names are matched case-insensitively, as callers differ in the casing of hana schemas.
+    schema_name None is the connection's default schema of daos created without a schema.
+    """
+    def matches(cache_key: tuple) -> bool:
+        if database_code is not None and cache_key[0] != database_code:
+            return False
+        if schema_name is None or cache_key[3] is None:
+            return cache_key[3] is schema_name
+        return cache_key[3].casefold() == schema_name.casefold()
+
+    with _reflection_lock:
+        for cache in (_reflection_cache, _catalog_cache, _statement_cache):
+            for cache_key in [key for key in cache if matches(key)]:
+                del cache[cache_key]
+    if schema_name is not None:
+        # results are only cached for named schemas
+        invalidate_results(schema_name, database_code)
+
 
 class SqlAlchemyDao(DaoBase):
     """
     Using SQLAlchemy for implementation
     """
+
+    # Connection pool settings for engines handed out by the engine registry
+    pool_size: int = 5
+    pool_max_overflow: int = 10
+    pool_recycle: int = 1800 # seconds
+
+    # Rows sent per COPY / executemany round trip in bulk_insert
+    bulk_insert_batch_size: int = 50000
+
+    # Default rows per record batch in iter_record_batches
+    record_batch_rows: int = 10000
+
+    # Ids reserved per database round trip by get_next_record_id
+    id_block_size: int = 100
+
+    # Rows per statement in upsert_many
+    upsert_batch_size: int = 1000
+
+    # Seconds reflected tables and schema catalog snapshots are cached
+    reflection_cache_ttl: int = 3600
+
+    # Filter lists longer than this are staged in a temporary key table instead of an inline IN list
+    key_table_threshold: int = 1000
     
     def __init__(self, use_cache_db: bool, database_code: str,
                  user_type: UserType = UserType.ADMIN_USER,
@@ -26,13 +133,14 @@ class SqlAlchemyDao(DaoBase):
                  connect_to_duckdb = False, metadata = None):
 
         super().__init__(use_cache_db, database_code, user_type, schema_name, vocab_schema_name, connect_to_duckdb)
-        self.metadata = sql.MetaData(self.schema_name)
+        self._session_connection = None
+        self._session_commit_every = None
+        self._session_operations = 0
 
 
     # --- Property methods ---
     @property
     def engine(self):
-        # Todo: Switch to session in future task
         configs = self.tenant_configs
         match configs.dialect:
             case SupportedDatabaseDialects.HANA:
@@ -41,6 +149,10 @@ class SqlAlchemyDao(DaoBase):
             case _:
                 database_name = configs.databaseName
 
+        # One pooled engine per key is shared across dao instances in this process
+        engine_key = (self.database_code, configs.dialect, self.user_type,
+                      self.use_cache_db, self.connect_to_duckdb, database_name)
+
         # For connecting to cachedb
         if self.connect_to_duckdb:
             connection_string = self.create_cachedb_connection_url(
@@ -49,7 +161,7 @@ class SqlAlchemyDao(DaoBase):
                 port=configs.port,
                 database_name=database_name
             )
-            return sql.create_engine(connection_string)
+            return get_engine(engine_key, connection_string, **self.pool_options)
 
         connection_string, connect_args = self.create_sqlalchemy_connection_url(
             dialect=configs.dialect,
@@ -60,31 +172,45 @@ class SqlAlchemyDao(DaoBase):
             port=configs.port,
             database_name=database_name
         )
-        return sql.create_engine(connection_string, connect_args=connect_args)
+        if configs.dialect == SupportedDatabaseDialects.DUCKDB:
+            # duckdb files are not served through a connection pool
+            return get_engine(engine_key, connection_string, connect_args=connect_args)
+        return get_engine(engine_key, connection_string, connect_args=connect_args, **self.pool_options)
+
+    @property
+    def pool_options(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.pool_max_overflow,
+            "pool_recycle": self.pool_recycle,
+            "pool_pre_ping": True
+        }
 
     
     @property
     def inspector(self):
-        return sql.inspect(self.engine)
+        # Within session(), inspect on the session connection so uncommitted DDL is visible
+        return sql.inspect(self._session_connection if self._session_connection is not None else self.engine)
 
     # --- Create methods ---
     def create_schema(self, schema_name: str = None) -> None:
         schema = schema_name if schema_name else self.schema_name
         self.validate_schema_name(schema)
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             connection.execute(CreateSchema(schema))
-            connection.commit()
+            self._commit(connection)
 
     def create_table(self, table_name: str, columns: dict, schema_name: str = None):
         schema = schema_name if schema_name else self.schema_name
         metadata_obj = sql.MetaData(schema=schema)
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             new_table = sql.Table(table_name,
                                   metadata_obj,
                                   *(sql.Column(name, dtype) for name, dtype in columns.items())
                                   )
-            metadata_obj.create_all(self.engine)
-            connection.commit()
+            metadata_obj.create_all(connection)
+            self._commit(connection)
+        self.invalidate_reflection_cache(schema)
 
     
     # --- Read methods ---
@@ -120,125 +246,686 @@ class SqlAlchemyDao(DaoBase):
         column_names = [col.get("name") for col in all_columns]
         return column_names
 
-    def get_table_row_count(self, table: str) -> int:
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table(table, metadata_obj, autoload_with=connection)
+    def get_table_row_count(self, table: str, estimate: bool = False) -> int:
+        if estimate:
+            estimated_row_count = self.get_estimated_row_count(table)
+            if estimated_row_count is not None:
+                return estimated_row_count
+        with self._connection() as connection:
+            table = self.reflect_table(table, connection=connection)
             select_count_stmt = sql.select(sql.func.count()).select_from(table)
             row_count = connection.execute(select_count_stmt).scalar()   
         return row_count
 
-    def get_distinct_count(self, table: str, column_name: str) -> int:
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table(table, metadata_obj,
-                              autoload_with=connection)
+    def get_distinct_count(self, table: str, column_name: str, estimate: bool = False) -> int:
+        # values of a single column primary key are distinct
+        if self.is_primary_key(table, column_name):
+            return self.get_table_row_count(table, estimate)
+        if estimate:
+            estimated_distinct_count = self.get_estimated_distinct_count(table, column_name)
+            if estimated_distinct_count is not None:
+                return estimated_distinct_count
+        with self._connection() as connection:
+            table = self.reflect_table(table, connection=connection)
             distinct_count = connection.execute(sql.func.count(
                 sql.func.distinct(getattr(table.c, column_name)))).scalar()
         return distinct_count
+
+    def is_primary_key(self, table_name: str, column_name: str) -> bool:
+        # Catalog and reflected names are normalized (e.g. lower case for HANA), so are the given names
+        dialect = self.engine.dialect
+        normalize_name = dialect.normalize_name if dialect.requires_name_normalize else str
+        column_name = normalize_name(column_name)
+        catalog_table = self.get_schema_catalog().get_table(normalize_name(table_name))
+        if catalog_table is not None:
+            return list(catalog_table.primary_key) == [column_name]
+        table = self.reflect_table(table_name)
+        primary_key_columns = [column.name for column in table.primary_key.columns]
+        return primary_key_columns == [column_name]
+
+    def get_schema_catalog(self, schema_name: str = None, refresh: bool = False) -> SchemaCatalogType:
+        """
+        Returns a snapshot of the schema read in one catalog query, cached per schema for reflection_cache_ttl seconds.
+        The cache is invalidated by the dao's own DDL methods and liquibase runs, refresh=True re-reads it after other external DDL.
+        """
+        schema = schema_name if schema_name else self.schema_name
+        cache_key = (self.database_code, self.use_cache_db, self.connect_to_duckdb, schema)
+        if not refresh:
+            with _reflection_lock:
+                cached = _catalog_cache.get(cache_key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+        match self.dialect:
+            case SupportedDatabaseDialects.POSTGRES:
+                # information_schema has no indexes, primary key indexes are left out like in get_indexes_for_table
+                select_stmt = sql.text(_information_schema_catalog_query + """
+                    UNION ALL
+                    SELECT 'index', CAST(t.relname AS VARCHAR), NULL, CAST(i.relname AS VARCHAR), CAST(a.attname AS VARCHAR),
+                    NULL, NULL, CAST(k.ordinal AS INTEGER), ix.indisunique
+                    FROM pg_catalog.pg_index ix
+                    JOIN pg_catalog.pg_class t ON t.oid = ix.indrelid
+                    JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+                    JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+                    CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ordinal)
+                    JOIN pg_catalog.pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+                    WHERE n.nspname = :schema_name AND NOT ix.indisprimary""")
+            case SupportedDatabaseDialects.HANA:
+                select_stmt = sql.text("""
+                    SELECT 'column' AS entry_type, TABLE_NAME AS table_name, 'TABLE' AS table_type, COLUMN_NAME AS entry_name,
+                    CAST(NULL AS NVARCHAR(256)) AS column_name, DATA_TYPE_NAME AS data_type,
+                    CASE WHEN IS_NULLABLE = 'TRUE' THEN 1 ELSE 0 END AS is_nullable, POSITION AS ordinal_position, CAST(NULL AS INTEGER) AS is_unique
+                    FROM SYS.TABLE_COLUMNS WHERE SCHEMA_NAME = :schema_name
+                    UNION ALL
+                    SELECT 'column', VIEW_NAME, 'VIEW', COLUMN_NAME, NULL, DATA_TYPE_NAME,
+                    CASE WHEN IS_NULLABLE = 'TRUE' THEN 1 ELSE 0 END, POSITION, NULL
+                    FROM SYS.VIEW_COLUMNS WHERE SCHEMA_NAME = :schema_name
+                    UNION ALL
+                    SELECT 'primary_key', TABLE_NAME, NULL, CONSTRAINT_NAME, COLUMN_NAME, NULL, NULL, POSITION, NULL
+                    FROM SYS.CONSTRAINTS WHERE SCHEMA_NAME = :schema_name AND IS_PRIMARY_KEY = 'TRUE'
+                    UNION ALL
+                    SELECT 'index', TABLE_NAME, NULL, INDEX_NAME, COLUMN_NAME, NULL, NULL, POSITION,
+                    CASE WHEN CONSTRAINT IN ('UNIQUE', 'NOT NULL UNIQUE') THEN 1 ELSE 0 END
+                    FROM SYS.INDEX_COLUMNS
+                    WHERE SCHEMA_NAME = :schema_name AND (CONSTRAINT IS NULL OR CONSTRAINT <> 'PRIMARY KEY')""")
+            case SupportedDatabaseDialects.DUCKDB:
+                # duckdb_indexes() only exposes index expressions, so index columns are left empty
+                select_stmt = sql.text(_information_schema_catalog_query + """
+                    UNION ALL
+                    SELECT 'index', table_name, NULL, index_name, NULL, NULL, NULL, NULL, is_unique
+                    FROM duckdb_indexes() WHERE schema_name = :schema_name""")
+            case _:
+                raise ValueError(f"Schema catalog is not supported for dialect '{self.dialect}'")
+
+        with self._connection() as connection, timed("reflection"):
+            rows = connection.execute(select_stmt, {"schema_name": schema}).mappings().all()
+            # match the casing of names returned by the inspector, e.g. lower case for upper case hana names
+            normalize_name = connection.dialect.normalize_name if connection.dialect.requires_name_normalize else str
+        schema_catalog = self.__build_schema_catalog(schema, rows, normalize_name)
+
+        with _reflection_lock:
+            _catalog_cache[cache_key] = (time.monotonic() + self.reflection_cache_ttl, schema_catalog)
+        return schema_catalog
+
+    @staticmethod
+    def __build_schema_catalog(schema: str, rows: list, normalize_name: Callable[[str], str]) -> SchemaCatalogType:
+        tables: dict[str, dict] = {}
+        for row in sorted(rows, key=lambda row: row["ordinal_position"] or 0):
+            table = tables.setdefault(normalize_name(row["table_name"]),
+                                      {"is_view": False, "columns": [], "primary_key": [], "indexes": {}})
+            match row["entry_type"]:
+                case "column":
+                    table["is_view"] = row["table_type"] == "VIEW"
+                    table["columns"].append(CatalogColumnType(name=normalize_name(row["entry_name"]),
+                                                              data_type=row["data_type"],
+                                                              is_nullable=bool(row["is_nullable"])))
+                case "primary_key":
+                    table["primary_key"].append(normalize_name(row["column_name"]))
+                case "index":
+                    index = table["indexes"].setdefault(normalize_name(row["entry_name"]),
+                                                        {"columns": [], "is_unique": bool(row["is_unique"])})
+                    if row["column_name"] is not None:
+                        index["columns"].append(normalize_name(row["column_name"]))
+
+        return SchemaCatalogType(
+            schema_name=schema,
+            tables=tuple(
+                CatalogTableType(name=table_name,
+                                 is_view=table["is_view"],
+                                 columns=tuple(table["columns"]),
+                                 primary_key=tuple(table["primary_key"]),
+                                 indexes=tuple(CatalogIndexType(name=index_name,
+                                                                columns=tuple(index["columns"]),
+                                                                is_unique=index["is_unique"])
+                                               for index_name, index in table["indexes"].items()))
+                for table_name, table in sorted(tables.items())
+            )
+        )
+
+    def get_estimated_row_count(self, table_name: str) -> int | None:
+        """
+        Row count from the statistics catalog, None if no statistics are available
+        """
+        match self.dialect:
+            case SupportedDatabaseDialects.POSTGRES:
+                # reltuples is -1 if the table was never analyzed, and 0 before postgres 14
+                select_stmt = sql.text("""
+                    SELECT c.reltuples FROM pg_catalog.pg_class c
+                    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = :schema_name AND c.relname = :table_name AND c.reltuples > 0""")
+            case SupportedDatabaseDialects.HANA:
+                select_stmt = sql.text("""
+                    SELECT RECORD_COUNT FROM SYS.M_TABLES
+                    WHERE SCHEMA_NAME = :schema_name AND TABLE_NAME IN (:table_name, UPPER(:table_name))""")
+            case SupportedDatabaseDialects.DUCKDB:
+                select_stmt = sql.text("""
+                    SELECT estimated_size FROM duckdb_tables()
+                    WHERE schema_name = :schema_name AND table_name = :table_name""")
+            case _:
+                return None
+        with self._connection() as connection:
+            estimated_row_count = connection.execute(
+                select_stmt, {"schema_name": self.schema_name, "table_name": table_name}).scalar()
+        if estimated_row_count is None or estimated_row_count < 0:
+            return None
+        return int(estimated_row_count)
+
+    def get_estimated_distinct_count(self, table_name: str, column_name: str) -> int | None:
+        """
+        Distinct count from the statistics catalog, None if no statistics are available
+        """
+        bind_params = {"schema_name": self.schema_name, "table_name": table_name, "column_name": column_name}
+        match self.dialect:
+            case SupportedDatabaseDialects.POSTGRES:
+                # negative n_distinct is the negated ratio of distinct values to rows
+                select_stmt = sql.text("""
+                    SELECT CASE WHEN s.n_distinct < 0 THEN -s.n_distinct * c.reltuples ELSE s.n_distinct END
+                    FROM pg_catalog.pg_stats s
+                    JOIN pg_catalog.pg_namespace n ON n.nspname = s.schemaname
+                    JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+                    WHERE s.schemaname = :schema_name AND s.tablename = :table_name AND s.attname = :column_name
+                    AND c.reltuples > 0""")
+            case SupportedDatabaseDialects.HANA:
+                # one row per partition
+                select_stmt = sql.text("""
+                    SELECT MAX(DISTINCT_COUNT) FROM SYS.M_CS_COLUMNS
+                    WHERE SCHEMA_NAME = :schema_name AND TABLE_NAME IN (:table_name, UPPER(:table_name))
+                    AND COLUMN_NAME IN (:column_name, UPPER(:column_name))""")
+            case SupportedDatabaseDialects.DUCKDB:
+                # duckdb keeps no distinct statistics, use its HyperLogLog aggregate instead
+                table = self.reflect_table(table_name)
+                select_stmt = sql.select(sql.func.approx_count_distinct(table.c[column_name]))
+                bind_params = {}
+            case _:
+                return None
+        with self._connection() as connection:
+            estimated_distinct_count = connection.execute(select_stmt, bind_params).scalar()
+        if estimated_distinct_count is None:
+            return None
+        return int(estimated_distinct_count)
     
     def get_last_executed_changeset(self) -> str:
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table("databasechangelog".casefold(), metadata_obj,
-                              autoload_with=connection)
-            filename_col = getattr(table.c, "filename".casefold())
-            dateexecuted_col = getattr(table.c, "dateexecuted".casefold())
-            select_stmt = sql.select(filename_col).order_by(
-                sql.desc(dateexecuted_col)).limit(1)
-            latest_changeset = connection.execute(select_stmt).scalar()
-            return latest_changeset
+        return self.get_changelog_summary().last_executed_changeset
 
     def get_datamodel_created_date(self) -> datetime:
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table("databasechangelog".casefold(), metadata_obj,
-                              autoload_with=connection)
-            dateexecuted_col = getattr(table.c, "dateexecuted".casefold())
-            select_stmt = sql.select(dateexecuted_col).order_by(
-                sql.asc(dateexecuted_col)).limit(1)
-            created_date = connection.execute(select_stmt).scalar()
-            return created_date
+        return self.get_changelog_summary().created_date
 
     def get_datamodel_updated_date(self) -> datetime:
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table("databasechangelog".casefold(), metadata_obj,
-                              autoload_with=connection)
-            dateexecuted_col = getattr(table.c, "dateexecuted".casefold())
-            select_stmt = sql.select(dateexecuted_col).order_by(
-                sql.desc(dateexecuted_col)).limit(1)
-            updated_date = connection.execute(select_stmt).scalar()
-            return updated_date
+        return self.get_changelog_summary().updated_date
+
+    def get_changelog_summary(self) -> ChangelogSummaryType:
+        with self._connection() as connection:
+            row = connection.execute(self.__create_changelog_summary_statement(self.schema_name)).one()
+        return ChangelogSummaryType(**row._mapping)
+
+    def get_changelog_summaries(self, schema_names: list[str]) -> dict[str, ChangelogSummaryType]:
+        """
+        Reads the changelog summaries of all schemas in one UNION ALL query.
+        If that fails, e.g. as a schema has no databasechangelog, they are read per schema
+        and schemas that fail on their own are left out.
+        """
+        if not schema_names:
+            return {}
+        try:
+            union_statement = sql.union_all(*[self.__create_changelog_summary_statement(schema_name)
+                                              for schema_name in schema_names])
+            with self._connection() as connection:
+                rows = connection.execute(union_statement).all()
+        except Exception as e:
+            print(f"Failed to read changelog summaries in one query, reading them per schema: {e}")
+        else:
+            return {row.schema_name: ChangelogSummaryType(**row._mapping) for row in rows}
+
+        changelog_summaries = {}
+        for schema_name in schema_names:
+            try:
+                with self._connection() as connection:
+                    row = connection.execute(self.__create_changelog_summary_statement(schema_name)).one()
+            except Exception as e:
+                print(f"Failed to read changelog summary of schema '{schema_name}': {e}")
+            else:
+                changelog_summaries[schema_name] = ChangelogSummaryType(**row._mapping)
+        return changelog_summaries
+
+    @staticmethod
+    def __create_changelog_summary_statement(schema_name: str) -> Select:
+        # lightweight table, databasechangelog does not need to be reflected for these columns
+        changelog = sql.table("databasechangelog", sql.column("filename"), sql.column("dateexecuted"), schema=schema_name)
+        # aliased so the subquery is not correlated with the aggregate over the same table
+        latest_changelog = changelog.alias("latest_changelog")
+        last_executed_changeset = sql.select(latest_changelog.c.filename) \
+                                     .order_by(sql.desc(latest_changelog.c.dateexecuted)).limit(1).scalar_subquery()
+        return sql.select(sql.literal(schema_name).label("schema_name"),
+                          last_executed_changeset.label("last_executed_changeset"),
+                          sql.func.min(changelog.c.dateexecuted).label("created_date"),
+                          sql.func.max(changelog.c.dateexecuted).label("updated_date")).select_from(changelog)
     
     def get_value(self, table_name: str, column_name: str) -> str:
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table(table_name, metadata_obj,
-                              autoload_with=connection)
+        with self._connection() as connection:
+            table = self.reflect_table(table_name, connection=connection)
             stmt = sql.select(table.c[column_name]).select_from(table)
             value = connection.execute(stmt).scalar()
             return value
 
-    def get_next_record_id(self, table_name: str, id_column_name: int) -> int:
-        metadata_obj = sql.MetaData(schema=self.schema_name)
-        table = sql.Table(table_name, metadata_obj,
-                          autoload_with=self.engine)
+    def get_cdm_version_concept_id(self, cdm_concept_code: str) -> int:
+        with self._connection() as connection:
+            table = self.reflect_table("concept", connection=connection, schema_name=self.vocab_schema_name)
+            stmt = sql.select(table.c.concept_id).where(table.c.vocabulary_id == "CDM",
+                                                        table.c.concept_class_id == "CDM",
+                                                        table.c.concept_code == cdm_concept_code)
+            return int(connection.execute(stmt).scalars().first())
+
+    def get_vocabulary_version(self) -> str:
+        with self._connection() as connection:
+            table = self.reflect_table("vocabulary", connection=connection, schema_name=self.vocab_schema_name)
+            stmt = sql.select(table.c.vocabulary_version).where(table.c.vocabulary_id == "None") \
+                      .order_by(sql.desc(table.c.vocabulary_version)).limit(1)
+            return connection.execute(stmt).scalar()
+
+    def get_table_stats(self, stat_requests: list[TableStatRequestType]) -> dict[str, TableStatResultType]:
+        results = {}
+        stat_keys = []
+        stat_subqueries = []
+        for stat_request in stat_requests:
+            if stat_request.estimate:
+                try:
+                    estimated_value = self.__get_estimated_stat(stat_request)
+                except Exception as e:
+                    print(f"Failed to estimate '{stat_request.key}', falling back to exact count: {e}")
+                    estimated_value = None
+                if estimated_value is not None:
+                    results[stat_request.key] = TableStatResultType(value=estimated_value)
+                    continue
+            try:
+                # missing tables or columns fail here for this entry only
+                stat_subqueries.append(self.__create_stat_subquery(stat_request).label(f"stat_{len(stat_subqueries)}"))
+            except Exception as e:
+                results[stat_request.key] = TableStatResultType(error=str(e))
+            else:
+                stat_keys.append(stat_request.key)
+
+        if not stat_subqueries:
+            return results
+
+        # Each query runs in a savepoint within session(), so a failing one does not abort the session transaction
+        with self._connection() as connection:
+            try:
+                # single row of scalar subqueries, FROM DUMMY is added by the hana dialect
+                with self._transaction(connection):
+                    stat_values = connection.execute(sql.select(*stat_subqueries)).one()
+                for key, value in zip(stat_keys, stat_values):
+                    results[key] = TableStatResultType(value=value)
+            except Exception as e:
+                print(f"Failed to get table stats in a single query, retrying per entry: {e}")
+                for key, stat_subquery in zip(stat_keys, stat_subqueries):
+                    try:
+                        with self._transaction(connection):
+                            value = connection.execute(sql.select(stat_subquery)).scalar()
+                    except Exception as entry_error:
+                        results[key] = TableStatResultType(error=str(entry_error))
+                    else:
+                        results[key] = TableStatResultType(value=value)
+        return results
+
+    def __get_estimated_stat(self, stat_request: TableStatRequestType) -> int | None:
+        match stat_request.stat_type:
+            case TableStatType.ROW_COUNT:
+                return self.get_estimated_row_count(stat_request.table_name)
+            case TableStatType.DISTINCT_COUNT:
+                if self.is_primary_key(stat_request.table_name, stat_request.column_name):
+                    return self.get_estimated_row_count(stat_request.table_name)
+                return self.get_estimated_distinct_count(stat_request.table_name, stat_request.column_name)
+        return None
+
+    def __create_stat_subquery(self, stat_request: TableStatRequestType):
+        table = self.reflect_table(stat_request.table_name)
+        match stat_request.stat_type:
+            case TableStatType.ROW_COUNT:
+                stmt = sql.select(sql.func.count()).select_from(table)
+            case TableStatType.DISTINCT_COUNT if self.is_primary_key(stat_request.table_name, stat_request.column_name):
+                stmt = sql.select(sql.func.count()).select_from(table)
+            case TableStatType.DISTINCT_COUNT:
+                stmt = sql.select(sql.func.count(sql.distinct(table.c[stat_request.column_name])))
+            case TableStatType.VALUE:
+                stmt = sql.select(table.c[stat_request.column_name]).limit(1)
+        return stmt.scalar_subquery()
+
+    def get_next_record_id(self, table_name: str, id_column_name: str) -> int:
+        return self.get_id_allocator(table_name, id_column_name).next_id()
+
+    def get_id_allocator(self, table_name: str, id_column_name: str) -> IdAllocator:
+        return get_id_allocator(self.__get_id_allocator_key(table_name, id_column_name),
+                                partial(self.reserve_id_block, table_name, id_column_name), self.id_block_size)
+
+    def reserve_id_block(self, table_name: str, id_column_name: str, block_size: int) -> tuple[int, int]:
+        """
+        Reserves block_size ids with a single nextval on a sequence incrementing by block_size,
+        returned as (first_id, last_id + 1). The sequence is created on first use, starting after the current max id.
+        Every block is checked against the current max id, and the sequence restarted after it if ids were
+        written past it by other writers, e.g. bulk_insert or upsert_many with explicit ids.
+        Falls back to a single max()+1 id per reservation if the sequence cannot be created, read on the session
+        connection so uncommitted rows of the session are seen.
+        """
+        allocator_key = self.__get_id_allocator_key(table_name, id_column_name)
+        sequence = sql.Sequence(self.__get_id_block_sequence_name(table_name, id_column_name), schema=self.schema_name)
+        if not has_sequence_failure(allocator_key):
+            try:
+                with self._checkout_connection() as connection:
+                    try:
+                        first_id = connection.scalar(sql.select(sequence.next_value()))
+                    except Exception:
+                        connection.rollback()
+                        try:
+                            self.__create_id_block_sequence(connection, table_name, id_column_name, sequence.name, block_size)
+                            first_id = connection.scalar(sql.select(sequence.next_value()))
+                        except Exception:
+                            # e.g. no CREATE privilege, not retried for every block
+                            mark_sequence_failure(allocator_key)
+                            raise
+                    next_max_id = self.__get_next_max_id(connection, table_name, id_column_name)
+                    if first_id < next_max_id:
+                        self.__restart_id_block_sequence(connection, sequence, next_max_id, block_size)
+                        first_id = connection.scalar(sql.select(sequence.next_value()))
+                    connection.commit()
+            except Exception as e:
+                print(f"Failed to reserve ids from sequence '{self.schema_name}.{sequence.name}': {e}. Falling back to max()+1")
+            else:
+                return int(first_id), int(first_id) + block_size
+
+        # A whole block from max()+1 would repeat ids of rows inserted before the next reservation
+        with self._connection() as connection:
+            first_id = self.__get_next_max_id(connection, table_name, id_column_name)
+        return first_id, first_id + 1
+
+    def reset_id_allocators(self, table_name: str) -> None:
+        """
+        Drops the id allocators of a table and the id block sequences they used, e.g. after the table was truncated,
+        so its ids start again after the table's max id
+        """
+        for allocator_key in clear_id_allocators(self.database_code, self.schema_name, table_name):
+            sequence = sql.Sequence(self.__get_id_block_sequence_name(table_name, allocator_key[5]), schema=self.schema_name)
+            try:
+                with self._checkout_connection() as connection:
+                    sequence.drop(connection, checkfirst=True)
+                    connection.commit()
+            except Exception as e:
+                print(f"Failed to drop sequence '{self.schema_name}.{sequence.name}': {e}")
+
+    def __get_id_allocator_key(self, table_name: str, id_column_name: str) -> tuple:
+        return (self.database_code, self.use_cache_db, self.connect_to_duckdb, self.schema_name,
+                table_name.casefold(), id_column_name.casefold())
+
+    @staticmethod
+    def __get_id_block_sequence_name(table_name: str, id_column_name: str) -> str:
+        return f"{table_name}_{id_column_name}_id_block_seq".casefold()
+
+    def __create_id_block_sequence(self, connection: Connection, table_name: str, id_column_name: str,
+                                   sequence_name: str, block_size: int) -> None:
+        start_id = self.__get_next_max_id(connection, table_name, id_column_name)
+        sequence = sql.Sequence(sequence_name, start=start_id, increment=block_size, schema=self.schema_name)
+        try:
+            sequence.create(connection, checkfirst=True)
+            connection.commit()
+        except Exception as e:
+            # Sequence was created concurrently by another writer
+            connection.rollback()
+            print(f"Did not create sequence '{self.schema_name}.{sequence_name}': {e}")
+
+    def __restart_id_block_sequence(self, connection: Connection, sequence: sql.Sequence, start_id: int,
+                                    block_size: int) -> None:
+        # The next nextval returns start_id
+        formatted_sequence = connection.dialect.identifier_preparer.format_sequence(sequence)
+        match self.dialect:
+            case SupportedDatabaseDialects.POSTGRES:
+                connection.execute(sql.select(sql.func.setval(formatted_sequence, start_id, False)))
+            case SupportedDatabaseDialects.HANA:
+                connection.exec_driver_sql(f"ALTER SEQUENCE {formatted_sequence} RESTART WITH {int(start_id)}")
+            case _:
+                # duckdb sequences cannot be restarted
+                sequence.drop(connection)
+                sql.Sequence(sequence.name, start=start_id, increment=block_size, schema=self.schema_name).create(connection)
+
+    def __get_next_max_id(self, connection: Connection, table_name: str, id_column_name: str) -> int:
+        table = self.reflect_table(table_name, connection=connection)
         id_column = getattr(table.c, id_column_name.casefold())
-        last_record_id_stmt = sql.select(sql.func.max(id_column))
-        last_record_id = self.execute_sqlalchemy_statement(
-            last_record_id_stmt, self.get_single_value)
+        last_record_id = connection.scalar(sql.select(sql.func.max(id_column)))
         if last_record_id is None:
             return 1
-        else:
-            return int(last_record_id) + 1
+        return int(last_record_id) + 1
     
     
     
     # --- Update methods ---  
     def update_cdm_version(self, cdm_version: str):
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table("cdm_source".casefold(), metadata_obj,
-                              autoload_with=connection)
+        with self._connection() as connection:
+            table = self.reflect_table("cdm_source".casefold(), connection=connection)
             cdm_source_col = getattr(table.c, "cdm_source_name".casefold())
             update_stmt = sql.update(table).where(
                 cdm_source_col == self.schema_name).values(cdm_version=cdm_version)
             res = connection.execute(update_stmt)
-            connection.commit()
+            self._commit(connection)
 
     def insert_values_into_table(self, table_name: str, column_value_mapping: list[dict]):
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table(table_name, metadata_obj,
-                              autoload_with=connection)
+        with self._connection() as connection:
+            table = self.reflect_table(table_name, connection=connection)
             res = connection.execute(table.insert(), column_value_mapping)
-            connection.commit()
+            self._commit(connection)
+        invalidate_table_results(self.schema_name, table_name, self.database_code)
+
+    def bulk_insert(self, table_name: str, data: pd.DataFrame | pa.Table, mode: str = "append", schema_name: str = None) -> int:
+        """
+        Writes a DataFrame or Arrow table into table_name in a single transaction and returns the number of rows written.
+        mode follows DataFrame.to_sql if_exists semantics: "append" creates the table if missing,
+        "replace" drops and recreates it from the data's dtypes.
+        """
+        if mode not in ("append", "replace"):
+            raise ValueError(f"Unsupported bulk insert mode '{mode}', expected 'append' or 'replace'")
+        schema = schema_name if schema_name else self.schema_name
+
+        with self._connection() as connection:
+            with self._transaction(connection):
+                # Table creation is left to pandas so dtypes map the same way as with to_sql
+                empty_df = data.slice(0, 0).to_pandas() if isinstance(data, pa.Table) else data.head(0)
+                empty_df.to_sql(table_name, connection, schema=schema, if_exists=mode, index=False)
+                if mode == "replace":
+                    # The table is reflected again for the insert, not taken from before it was replaced
+                    self.invalidate_reflection_cache(schema)
+
+                if self.connect_to_duckdb:
+                    # cachedb proxy does not support COPY
+                    row_count = self.__executemany_insert(connection, table_name, schema, data)
+                else:
+                    match self.dialect:
+                        case SupportedDatabaseDialects.POSTGRES:
+                            row_count = self.__copy_insert(connection, table_name, schema, data)
+                        case SupportedDatabaseDialects.DUCKDB:
+                            row_count = self.__register_insert(connection, table_name, schema, data)
+                        case _:
+                            row_count = self.__executemany_insert(connection, table_name, schema, data)
+            self._commit(connection)
+
+        if mode == "replace":
+            self.invalidate_reflection_cache(schema)
+        invalidate_table_results(schema, table_name, self.database_code)
+        return row_count
+
+    def upsert_many(self, table_name: str, rows: list[dict], key_columns: list[str],
+                    update_columns: list[str] = None, returning: list[str] = None) -> list[dict] | int:
+        """
+        Inserts rows, resolving rows whose key_columns already exist in the table in one statement per batch.
+        Existing rows get update_columns updated (all non-key columns of the rows by default),
+        or are left as they are if update_columns is empty (get-or-insert).
+
+        Returns the returning columns of every given key if returning is set, otherwise the number of rows written.
+        Returned rows are not in input order, include the key columns in returning to match them.
+        key_columns need a unique constraint on postgres and duckdb.
+        """
+        if not rows:
+            return [] if returning else 0
+        # A key may only be written once per statement
+        unique_rows = list({tuple(row[key] for key in key_columns): row for row in rows}.values())
+        if update_columns is None:
+            update_columns = [column for column in unique_rows[0] if column not in key_columns]
+
+        with self._connection() as connection:
+            table = self.reflect_table(table_name, connection=connection)
+            if self.dialect == SupportedDatabaseDialects.HANA:
+                row_count = self.__merge_rows(connection, table, unique_rows, key_columns, update_columns)
+                returned_rows = None
+            else:
+                returned_rows, row_count = self.__insert_on_conflict(connection, table, unique_rows, key_columns,
+                                                                     update_columns, returning)
+            if returning and returned_rows is None:
+                returned_rows = self.__select_by_keys(connection, table, unique_rows, key_columns, returning)
+            self._commit(connection)
+        invalidate_table_results(self.schema_name, table_name, self.database_code)
+        return returned_rows if returning else row_count
+
+    def __insert_on_conflict(self, connection: Connection, table: Table, rows: list[dict], key_columns: list[str],
+                             update_columns: list[str], returning: list[str] = None) -> tuple[list[dict] | None, int]:
+        # INSERT .. ON CONFLICT, compiled for postgres and duckdb
+        returned_rows, row_count = [], 0
+        for start in range(0, len(rows), self.upsert_batch_size):
+            insert_statement = postgresql.insert(table).values(rows[start:start + self.upsert_batch_size])
+            if update_columns:
+                upsert_statement = insert_statement.on_conflict_do_update(
+                    index_elements=key_columns,
+                    set_={column: insert_statement.excluded[column] for column in update_columns})
+            else:
+                upsert_statement = insert_statement.on_conflict_do_nothing(index_elements=key_columns)
+
+            if returning and update_columns:
+                result = connection.execute(upsert_statement.returning(*(table.c[column] for column in returning)))
+                batch_rows = [dict(row._mapping) for row in result]
+                returned_rows.extend(batch_rows)
+                row_count += len(batch_rows)
+            else:
+                row_count += connection.execute(upsert_statement).rowcount
+        # Rows left untouched by DO NOTHING are not returned, so they are selected afterwards
+        return (returned_rows if update_columns else None), row_count
+
+    def __merge_rows(self, connection: Connection, table: Table, rows: list[dict], key_columns: list[str],
+                     update_columns: list[str]) -> int:
+        # MERGE INTO as UPSERT .. WITH PRIMARY KEY needs a primary key and always updates every given column
+        # HANA rejects the target alias on the UPDATE SET columns
+        preparer = connection.dialect.identifier_preparer
+        target = preparer.format_table(table)
+        columns = list(rows[0].keys())
+        source_columns = ", ".join(f":{column} AS {preparer.quote(column)}" for column in columns)
+        on_condition = " AND ".join(f"t.{preparer.quote(key)} = s.{preparer.quote(key)}" for key in key_columns)
+        insert_columns = ", ".join(preparer.quote(column) for column in columns)
+        insert_values = ", ".join(f"s.{preparer.quote(column)}" for column in columns)
+
+        merge_sql = f"MERGE INTO {target} AS t USING (SELECT {source_columns} FROM DUMMY) AS s ON ({on_condition})"
+        if update_columns:
+            update_set = ", ".join(f"{preparer.quote(column)} = s.{preparer.quote(column)}" for column in update_columns)
+            merge_sql += f" WHEN MATCHED THEN UPDATE SET {update_set}"
+        merge_sql += f" WHEN NOT MATCHED THEN INSERT ({insert_columns}) VALUES ({insert_values})"
+
+        row_count = 0
+        for start in range(0, len(rows), self.upsert_batch_size):
+            result = connection.execute(sql.text(merge_sql), rows[start:start + self.upsert_batch_size])
+            row_count += max(result.rowcount, 0)
+        return row_count
+
+    def __select_by_keys(self, connection: Connection, table: Table, rows: list[dict], key_columns: list[str],
+                         returning: list[str]) -> list[dict]:
+        key_cols = [table.c[key] for key in key_columns]
+        key_values = [tuple(row[key] for key in key_columns) for row in rows]
+        selected_rows = []
+        for start in range(0, len(key_values), self.upsert_batch_size):
+            batch_keys = key_values[start:start + self.upsert_batch_size]
+            if len(key_cols) == 1:
+                key_condition = key_cols[0].in_([key[0] for key in batch_keys])
+            else:
+                key_condition = sql.tuple_(*key_cols).in_(batch_keys)
+            select_statement = sql.select(*(table.c[column] for column in returning)).where(key_condition)
+            selected_rows.extend(dict(row._mapping) for row in connection.execute(select_statement))
+        return selected_rows
+
+    def __copy_insert(self, connection: Connection, table_name: str, schema: str, data: pd.DataFrame | pa.Table) -> int:
+        # psycopg2 only supports text COPY, so batches are streamed as CSV
+        df = data.to_pandas() if isinstance(data, pa.Table) else data
+        df = self.__cast_integer_columns(connection, table_name, schema, df)
+        target, columns = self.__format_insert_target(connection, table_name, schema, list(df.columns))
+        copy_sql = f"COPY {target} ({columns}) FROM STDIN WITH CSV"
+        with connection.connection.cursor() as cursor:
+            for start in range(0, len(df), self.bulk_insert_batch_size):
+                buffer = StringIO()
+                df.iloc[start:start + self.bulk_insert_batch_size].to_csv(buffer, header=False, index=False)
+                buffer.seek(0)
+                cursor.copy_expert(sql=copy_sql, file=buffer)
+        return len(df)
+
+    def __cast_integer_columns(self, connection: Connection, table_name: str, schema: str, df: pd.DataFrame) -> pd.DataFrame:
+        # pandas stores integer columns with missing values as floats, written as e.g. 1.0 which COPY rejects for integer columns
+        table = self.reflect_table(table_name, connection=connection, schema_name=schema)
+        integer_columns = [column for column in df.columns
+                           if column in table.c and isinstance(table.c[column].type, sql.Integer)
+                           and pd.api.types.is_float_dtype(df[column])]
+        for column in integer_columns:
+            values = df[column].dropna()
+            if not (values == values.round()).all():
+                raise ValueError(f"Column '{column}' of '{schema}.{table_name}' is an integer column, but has fractional values")
+        if not integer_columns:
+            return df
+        return df.astype({column: "Int64" for column in integer_columns})
+
+    def __register_insert(self, connection: Connection, table_name: str, schema: str, data: pd.DataFrame | pa.Table) -> int:
+        # duckdb scans the registered DataFrame / Arrow table in place
+        column_names = data.column_names if isinstance(data, pa.Table) else list(data.columns)
+        target, columns = self.__format_insert_target(connection, table_name, schema, column_names)
+        view_name = f"bulk_insert_{uuid4().hex}"
+        duckdb_connection = connection.connection.driver_connection
+        duckdb_connection.register(view_name, data)
+        try:
+            connection.exec_driver_sql(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {view_name}")
+        finally:
+            duckdb_connection.unregister(view_name)
+        return data.num_rows if isinstance(data, pa.Table) else len(data)
+
+    def __executemany_insert(self, connection: Connection, table_name: str, schema: str, data: pd.DataFrame | pa.Table) -> int:
+        df = data.to_pandas() if isinstance(data, pa.Table) else data
+        # handle NULLs for SQL
+        df = df.astype(object).where(pd.notnull(df), None)
+        table = sql.table(table_name, *(sql.column(column_name) for column_name in df.columns), schema=schema)
+        records = df.to_dict("records")
+        for start in range(0, len(records), self.bulk_insert_batch_size):
+            connection.execute(table.insert(), records[start:start + self.bulk_insert_batch_size])
+        return len(records)
+
+    @staticmethod
+    def __format_insert_target(connection: Connection, table_name: str, schema: str, column_names: list[str]) -> tuple[str, str]:
+        preparer = connection.dialect.identifier_preparer
+        target = preparer.quote(table_name)
+        if schema:
+            target = f"{preparer.quote_schema(schema)}.{target}"
+        columns = ", ".join(preparer.quote(str(column_name)) for column_name in column_names)
+        return target, columns
         
     def update_data_ingestion_date(self):
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            table = sql.Table("dataset_metadata".casefold(), metadata_obj,
-                              autoload_with=connection)
+        with self._connection() as connection:
+            table = self.reflect_table("dataset_metadata".casefold(), connection=connection)
             condition_col = getattr(table.c, "schema_name".casefold())
             update_stmt = sql.update(table).where(
                 condition_col == self.schema_name).values(data_ingestion_date=datetime.now())
             print(
                 f"Updating data ingestion date for schema {self.schema_name}")
             res = connection.execute(update_stmt)
-            connection.commit()
+            self._commit(connection)
             print(f"Updated data ingestion date for {self.schema_name}")
 
 
     # --- Delete methods ---
     def drop_schema(self, cascade: bool=True):
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             connection.execute(DropSchema(self.schema_name, cascade=cascade))
-            connection.commit()
+            self._commit(connection)
+        self.invalidate_reflection_cache()
+        clear_id_allocators(self.database_code, self.schema_name)
 
     def delete_records(self, table_name: str, conditions: list):
-        metadata_obj = sql.MetaData(schema=self.schema_name)
-        table = sql.Table(table_name, metadata_obj, autoload_with=self.engine)
+        table = self.reflect_table(table_name)
         delete_from_conditions = sql.and_(*conditions)
         delete_from_statement = table.delete().where(delete_from_conditions)
         result = self.execute_sqlalchemy_statement(
@@ -248,27 +935,132 @@ class SqlAlchemyDao(DaoBase):
     
 
     def truncate_table(self, table_name):
-        with self.engine.connect() as connection:
-            trans = connection.being()
+        with self._connection() as connection:
             try:
                 truncate_sql = sql.text(f"delete from {self.schema_name}.{table_name}")
-                connection.execute(truncate_sql)
-                trans.commit()
+                with self._transaction(connection):
+                    connection.execute(truncate_sql)
             except Exception as e:
-                trans.rollback()
                 print(f"Failed to truncate table '{self.schema_name}.{table_name}': {e}")
                 raise e
             else:
                 print(f"Table '{self.schema_name}.{table_name}' truncated successfully!")
-                self.engine.dispose()
+            finally:
+                self.invalidate_reflection_cache()
+        self.reset_id_allocators(table_name)
             
 
 
 
+    # --- Session methods ---
+    @contextmanager
+    def session(self, commit_every: int = None):
+        """
+        Runs the dao calls inside the block on one connection and transaction,
+        committed once at the end or after every commit_every write operations.
+        Rolled back on error. Nested sessions join the outer one.
+
+        ```
+        with dbdao.session():
+            dbdao.insert_values_into_table("procedure_occurrence", record)
+            dbdao.insert_values_into_table("image_occurrence", record)
+        ```
+        """
+        if self._session_connection is not None:
+            yield self
+            return
+
+        with self._checkout_connection() as connection:
+            self._session_connection = connection
+            self._session_commit_every = commit_every
+            self._session_operations = 0
+            try:
+                yield self
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                self._session_connection = None
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Rolls back only the dao calls inside the block on error, must be used within session()
+        """
+        if self._session_connection is None:
+            raise ValueError("savepoint() can only be used within session()")
+        with self._session_connection.begin_nested():
+            yield self
+
+    @contextmanager
+    def _connection(self):
+        # Session connection if within session(), otherwise a pooled connection per call
+        if self._session_connection is not None:
+            yield self._session_connection
+        else:
+            with self._checkout_connection() as connection:
+                yield connection
+
+    def _checkout_connection(self) -> Connection:
+        # Pooled connection checkout, timed for the query stats
+        with timed("connection_acquisition"):
+            return self.engine.connect()
+
+    def _commit(self, connection: Connection) -> None:
+        if connection is not self._session_connection:
+            connection.commit()
+            return
+        self._session_operations += 1
+        if self._session_commit_every and self._session_operations % self._session_commit_every == 0:
+            connection.commit()
+
+    def _transaction(self, connection: Connection):
+        # Savepoint within session(), otherwise a transaction of its own
+        if connection is self._session_connection:
+            return connection.begin_nested()
+        return connection.begin()
+
+
+    # --- Reflection methods ---
+    def reflect_table(self, table_name: str, connection: Connection = None, schema_name: str = None) -> Table:
+        """
+        Returns the reflected table, reflecting it on the first request and again after reflection_cache_ttl seconds.
+        The cache is invalidated by the dao's own DDL methods and liquibase runs.
+        """
+        schema = schema_name if schema_name else self.schema_name
+        cache_key = (self.database_code, self.use_cache_db, self.connect_to_duckdb, schema)
+        with _reflection_lock:
+            cached = _reflection_cache.get(cache_key, {}).get(table_name)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        # Reflected outside the lock, so threads reflecting other tables or databases do not wait on each other
+        if connection is None:
+            connection = self._session_connection if self._session_connection is not None else self.engine
+        with timed("reflection"):
+            table = sql.Table(table_name, sql.MetaData(schema=schema), autoload_with=connection)
+        with _reflection_lock:
+            schema_tables = _reflection_cache.setdefault(cache_key, {})
+            cached = schema_tables.get(table_name)
+            if cached is None or cached[0] <= time.monotonic():
+                cached = (time.monotonic() + self.reflection_cache_ttl, table)
+                schema_tables[table_name] = cached
+            return cached[1]
+
+    def invalidate_reflection_cache(self, schema_name: str = None) -> None:
+        invalidate_schema_caches(schema_name if schema_name else self.schema_name, self.database_code)
+
+
     # --- Static methods ---
     @staticmethod
     def return_affected_rowcounts(result) -> int:
         return result.rowcount
+
+    @staticmethod
+    def get_single_value(result):
+        # Raises if no row matched, callers fall back on the exception
+        return result.scalar_one()
  
  
     def dispose_engine_after_use(func):
@@ -301,30 +1093,46 @@ class SqlAlchemyDao(DaoBase):
         '''
         Returns a dictionary mapping column names to sqlalchemy Column objects
         '''
-        with self.engine.connect() as connection:
-            metadata_obj = self.metadata
-            table = Table(table_name, metadata_obj, autoload_with=connection)            
+        with self._connection() as connection:
+            table = self.reflect_table(table_name, connection=connection)
             return {column_name: getattr(table.c, column_name.casefold()) for column_name in column_names}
         
 
     def execute_sqlalchemy_statement(self, sqlalchemy_statement, callback: Callable) -> Any | None:
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             res = connection.execute(sqlalchemy_statement)
-            connection.commit()
+            self._commit(connection)
+            return callback(res)
+
+    def execute_cached_statement(self, statement_key: Hashable, build_statement: Callable[[], Any],
+                                 params: dict, callback: Callable) -> Any | None:
+        '''
+        Executes the statement cached under statement_key with params, building it on first use.
+        Values must be passed as sql.bindparam placeholders so the same statement object is reused,
+        which lets the engine's compiled cache skip compilation on every further execution.
+        '''
+        cache_key = (self.database_code, self.use_cache_db, self.connect_to_duckdb, self.schema_name, statement_key)
+        with _reflection_lock:
+            statement = _statement_cache.get(cache_key)
+        if statement is None:
+            statement = build_statement()
+            with _reflection_lock:
+                statement = _statement_cache.setdefault(cache_key, statement)
+        with self._connection() as connection:
+            res = connection.execute(statement, params)
+            self._commit(connection)
             return callback(res)
 
 
     def check_user_exists(self, user: str) -> bool:
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             if self.dialect == SupportedDatabaseDialects.POSTGRES:
                 select_stmt = sql.text("select * from pg_user where usename = :x")
                 print(f"Executing check user exists statement..")
                 res = connection.execute(select_stmt, {"x": user}).fetchall()
             elif SupportedDatabaseDialects.HANA:
                 schema_name = "SYS"
-                metadata_obj = sql.MetaData(schema=schema_name)
-                table = Table("USERS".casefold(), metadata_obj,
-                              autoload_with=connection)
+                table = self.reflect_table("USERS".casefold(), connection=connection, schema_name=schema_name)
                 user_col = getattr(table.c, "USER_NAME".casefold())
                 select_stmt = sql.select(table).where(user_col == user)
                 print(f"Executing check user exists statement..")
@@ -336,7 +1144,7 @@ class SqlAlchemyDao(DaoBase):
 
 
     def check_role_exists(self, role_name: str) -> bool:
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             if self.dialect == SupportedDatabaseDialects.POSTGRES:
                 select_stmt = sql.text("select * from pg_roles where rolname = :x")
                 print(f"Executing check role exists statement..")
@@ -344,9 +1152,7 @@ class SqlAlchemyDao(DaoBase):
                     select_stmt, {"x": role_name}).fetchall()
             elif SupportedDatabaseDialects.HANA:
                 schema_name = "SYS"
-                metadata_obj = sql.MetaData(schema=schema_name)
-                table = Table("ROLES".casefold(), metadata_obj,
-                              autoload_with=connection)
+                table = self.reflect_table("ROLES".casefold(), connection=connection, schema_name=schema_name)
                 role_col = getattr(table.c, "ROLE_NAME".casefold())
                 select_stmt = sql.select(table).where(role_col == role_name)
                 print(f"Executing check role exists statement..")
@@ -364,11 +1170,13 @@ class SqlAlchemyDao(DaoBase):
             case SupportedDatabaseDialects.HANA:
                 create_role_stmt = sql.text(
                     f'CREATE ROLE {role_name} NO GRANT TO CREATOR')
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             print("Executing create read role statement..")
-            create_role_res = connection.execute(
-                create_role_stmt)
-            connection.commit()
+            # savepoint within session(), so a failing statement does not abort the session transaction
+            with self._transaction(connection):
+                create_role_res = connection.execute(
+                    create_role_stmt)
+            self._commit(connection)
             print(f"{role_name} role Created Successfully")
 
 
@@ -385,26 +1193,28 @@ class SqlAlchemyDao(DaoBase):
             case SupportedDatabaseDialects.HANA:
                 create_user_stmt = sql.text(
                     f'CREATE USER {user} PASSWORD "{password}" NO FORCE_FIRST_PASSWORD_CHANGE')
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             print("Executing create user statement..")
-            create_user_res = connection.execute(
-                create_user_stmt)
-            connection.commit()
+            with self._transaction(connection):
+                create_user_res = connection.execute(
+                    create_user_stmt)
+            self._commit(connection)
             print(f"{user} User Created Successfully")
 
     def create_and_assign_role(self, user: str, role_name: str):
-        with self.engine.connect() as connection:
-            create_role_stmt = sql.text(f"CREATE ROLE {role_name}")
-            print("Executing create role statement..")
-            create_role_res = connection.execute(
-                create_role_stmt)
-            print(f"{role_name} role Created Successfully")
+        with self._connection() as connection:
+            with self._transaction(connection):
+                create_role_stmt = sql.text(f"CREATE ROLE {role_name}")
+                print("Executing create role statement..")
+                create_role_res = connection.execute(
+                    create_role_stmt)
+                print(f"{role_name} role Created Successfully")
 
-            grant_role_stmt = sql.text(f"GRANT {role_name} TO {user}")
-            print("Executing grant role to user statement..")
-            grant_role_res = connection.execute(
-                grant_role_stmt, {"x": role_name, "y": user})
-            connection.commit()
+                grant_role_stmt = sql.text(f"GRANT {role_name} TO {user}")
+                print("Executing grant role to user statement..")
+                grant_role_res = connection.execute(
+                    grant_role_stmt, {"x": role_name, "y": user})
+            self._commit(connection)
             print(f" {role_name} Role Granted to {user} User Successfully")
 
     def grant_read_privileges(self, role_name: str):
@@ -422,27 +1232,29 @@ class SqlAlchemyDao(DaoBase):
             case SupportedDatabaseDialects.HANA:
                 grant_read_stmt = sql.text(
                     f"GRANT SELECT, EXECUTE, CREATE TEMPORARY TABLE ON SCHEMA {self.schema_name} to {role_name}")
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
 
             print("Executing grant read privilege statement..")
-            grant_read_res = connection.execute(
-                grant_read_stmt)
-            connection.commit()
+            with self._transaction(connection):
+                grant_read_res = connection.execute(
+                    grant_read_stmt)
+            self._commit(connection)
             print(f"Granted Read privileges Successfully")
 
     def grant_cohort_write_privileges(self, role_name: str):
-        with self.engine.connect() as connection:
+        with self._connection() as connection:
             grant_cohort_write_stmt = sql.text(
                 f"GRANT DELETE, INSERT, UPDATE ON {self.schema_name}.cohort TO {role_name}")
             grant_cohort_def_write_stmt = sql.text(
                 f"GRANT DELETE, INSERT, UPDATE ON {self.schema_name}.cohort_definition TO {role_name}")
             print("Executing grant cohort write privilege statement..")
             try:
-                grant_cohort_write_res = connection.execute(
-                    grant_cohort_write_stmt)
-                grant_cohort_def_write_res = connection.execute(
-                    grant_cohort_def_write_stmt)
-                connection.commit()
+                with self._transaction(connection):
+                    grant_cohort_write_res = connection.execute(
+                        grant_cohort_write_stmt)
+                    grant_cohort_def_write_res = connection.execute(
+                        grant_cohort_def_write_stmt)
+                self._commit(connection)
             except Exception as e:
                 raise e
             else:
@@ -457,47 +1269,153 @@ class SqlAlchemyDao(DaoBase):
         sanitized_target_table = self.__sanitize_inputs(target_table)
         sanitized_target_schema = self.__sanitize_inputs(target_schema)
 
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            source_table = sql.Table(sanitized_source_table, metadata_obj,
-                                        autoload_with=connection)
-            
-            select_statement = self.create_select_statement(source_table, columns_to_copy, filter_conditions)
+        with self._connection() as connection:
+            with self.staged_filter_conditions(connection, filter_conditions) as staged_conditions:
+                select_statement = self.create_select_statement(sanitized_source_table, columns_to_copy, staged_conditions)
 
-            compiled_sql_query = str(select_statement.compile(compile_kwargs={"literal_binds": True}))
-            
-            create_from_select_statement = sql.text(f'''CREATE TABLE {sanitized_target_schema}.{sanitized_target_table} AS ({compiled_sql_query});''')
-            row_count = connection.execute(create_from_select_statement).rowcount
+                compiled_sql_query = str(select_statement.compile(compile_kwargs={"literal_binds": True}))
+                
+                create_from_select_statement = sql.text(f'''CREATE TABLE {sanitized_target_schema}.{sanitized_target_table} AS ({compiled_sql_query});''')
+                row_count = connection.execute(create_from_select_statement).rowcount
+            self._commit(connection)
 
+        self.invalidate_reflection_cache(sanitized_target_schema)
         return row_count
 
     def copy_table_as_dataframe(self, source_table_name: str, columns_to_copy: list[str], filter_conditions: str) -> pd.DataFrame:
-        # Construct select statements with filter conditions
-        select_statement = self.create_select_statement(source_table_name, columns_to_copy, filter_conditions)
-        df = pd.read_sql_query(select_statement, self.engine)
+        with self._connection() as connection:
+            with self.staged_filter_conditions(connection, filter_conditions) as staged_conditions:
+                # Construct select statements with filter conditions
+                select_statement = self.create_select_statement(source_table_name, columns_to_copy, staged_conditions)
+                df = pd.read_sql_query(select_statement, connection)
         return df
 
+    def iter_record_batches(self, table_name: str, columns: list[str], filter_conditions: list = None, batch_rows: int = None) -> Iterator[pa.RecordBatch]:
+        with self._connection() as connection:
+            with self.staged_filter_conditions(connection, filter_conditions if filter_conditions else []) as staged_conditions:
+                select_statement = self.create_select_statement(table_name, columns, staged_conditions)
+                arrow_types = [self.__to_arrow_type(column.type) for column in select_statement.selected_columns]
+                arrow_schema = None
+                if None not in arrow_types:
+                    arrow_schema = pa.schema(list(zip(columns, arrow_types)))
+                yield from self.iter_statement_batches(select_statement, arrow_schema, batch_rows, connection=connection)
+
+    def iter_statement_batches(self, statement, arrow_schema: pa.Schema = None, batch_rows: int = None,
+                               connection: Connection = None) -> Iterator[pa.RecordBatch]:
+        """
+        Executes statement on a server-side cursor and yields its rows as arrow record batches.
+        Without an arrow_schema, the schema is inferred from the first batch.
+        Dialects without server-side cursors (hana, duckdb) fall back to fetching batch_rows rows per fetchmany.
+        """
+        if connection is None:
+            with self._connection() as connection:
+                yield from self.iter_statement_batches(statement, arrow_schema, batch_rows, connection=connection)
+            return
+
+        batch_rows = batch_rows if batch_rows else self.record_batch_rows
+        result = connection.execute(statement, execution_options={"stream_results": True, "max_row_buffer": batch_rows})
+        column_names = list(result.keys())
+        for rows in result.partitions(batch_rows):
+            column_values = list(zip(*rows))
+            if arrow_schema is None:
+                batch = pa.RecordBatch.from_arrays([pa.array(values) for values in column_values], names=column_names)
+                arrow_schema = batch.schema
+            else:
+                batch = pa.RecordBatch.from_arrays([self.__to_arrow_array(values, field.type) for values, field in zip(column_values, arrow_schema)],
+                                                   schema=arrow_schema)
+            yield batch
+
+    @contextmanager
+    def staged_filter_conditions(self, connection: Connection, filter_conditions: list):
+        """
+        Yields filter_conditions with IN conditions of more than key_table_threshold values
+        replaced by a subquery on a temporary key table, which is dropped on exit
+        """
+        key_tables, staged_conditions = [], []
+        try:
+            for condition in filter_conditions:
+                in_values = self.__get_in_values(condition)
+                if in_values is not None and len(in_values) > self.key_table_threshold:
+                    key_table = self.create_key_table(connection, in_values, condition.left.type)
+                    key_tables.append(key_table)
+                    condition = condition.left.in_(sql.select(key_table.c.filter_key))
+                staged_conditions.append(condition)
+            yield staged_conditions
+        finally:
+            for key_table in key_tables:
+                self.drop_key_table(connection, key_table)
+
+    def create_key_table(self, connection: Connection, values: list, key_type=None) -> Table:
+        """
+        Stages values in a temporary table only visible to connection
+        """
+        match self.dialect:
+            case SupportedDatabaseDialects.HANA:
+                # Local temporary tables need a '#' prefix on hana
+                key_table_name, prefixes = f"#key_table_{uuid4().hex}", ["LOCAL TEMPORARY"]
+            case _:
+                key_table_name, prefixes = f"key_table_{uuid4().hex}", ["TEMPORARY"]
+        key_table = sql.Table(key_table_name, sql.MetaData(),
+                              sql.Column("filter_key", key_type if key_type is not None else sql.BigInteger),
+                              prefixes=prefixes)
+        key_table.create(connection)
+        connection.execute(key_table.insert(), [{"filter_key": value} for value in values])
+        return key_table
+
+    @staticmethod
+    def drop_key_table(connection: Connection, key_table: Table) -> None:
+        try:
+            key_table.drop(connection)
+        except Exception as e:
+            # Temporary tables are dropped at the latest when the database session ends
+            print(f"Failed to drop key table '{key_table.name}': {e}")
+
+    @staticmethod
+    def __get_in_values(condition) -> list | None:
+        if (isinstance(condition, BinaryExpression) and condition.operator is operators.in_op
+                and isinstance(condition.right, BindParameter) and condition.right.expanding):
+            return list(condition.right.value)
+        return None
+
+    @staticmethod
+    def __to_arrow_type(sqlalchemy_type) -> pa.DataType | None:
+        try:
+            python_type = sqlalchemy_type.python_type
+        except NotImplementedError:
+            return None
+        if python_type is Decimal:
+            precision, scale = getattr(sqlalchemy_type, "precision", None), getattr(sqlalchemy_type, "scale", None)
+            if precision is None or precision > 76:
+                # unconstrained numeric, no arrow decimal holds every value, kept as text
+                return pa.string()
+            scale = scale if scale is not None else 0
+            return pa.decimal128(precision, scale) if precision <= 38 else pa.decimal256(precision, scale)
+        return _arrow_types.get(python_type)
+
+    @staticmethod
+    def __to_arrow_array(values, arrow_type: pa.DataType) -> pa.Array:
+        if pa.types.is_string(arrow_type):
+            # e.g. decimals of unconstrained numeric columns
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        return pa.array(values, type=arrow_type)
+
     def create_select_statement(self, table_name: str, columns_to_select: list[str], filter_conditions: list) -> Select:
         select_from_conditions = sql.and_(*filter_conditions)
-        with self.engine.connect() as connection:
-            metadata_obj = self.metadata
-            source_table = sql.Table(table_name, metadata_obj,
-                                        autoload_with=connection)
-            
-            match self.dialect:
-                case SupportedDatabaseDialects.HANA:
-                    # cast text columns to nclob
-                    select_statement = sql.select(*map(lambda x: sql.cast(getattr(source_table.c, x), UnicodeText) if isinstance(source_table.c[x].type, Text) else getattr(source_table.c, x), columns_to_select)).where(select_from_conditions)
+        source_table = self.reflect_table(table_name)
 
-                case SupportedDatabaseDialects.POSTGRES:
-                    select_statement = sql.select(*map(lambda x: getattr(source_table.c, x), columns_to_select)).where(select_from_conditions)
+        match self.dialect:
+            case SupportedDatabaseDialects.HANA:
+                # cast text columns to nclob
+                select_statement = sql.select(*map(lambda x: sql.cast(getattr(source_table.c, x), UnicodeText) if isinstance(source_table.c[x].type, Text) else getattr(source_table.c, x), columns_to_select)).where(select_from_conditions)
+
+            case SupportedDatabaseDialects.POSTGRES:
+                select_statement = sql.select(*map(lambda x: getattr(source_table.c, x), columns_to_select)).where(select_from_conditions)
         
         return select_statement
 
     def copy_table(self, source_table_name: str, target_table_name: str, target_schema_name: str, columns_to_copy: list[str], filter_conditions: str) -> int:
-        with self.engine.connect() as connection:
-            metadata_obj = sql.MetaData(schema=self.schema_name)
-            source_table = sql.Table(source_table_name, metadata_obj, autoload_with=connection)
+        with self._connection() as connection:
+            source_table = self.reflect_table(source_table_name, connection=connection)
 
             # Copy column from source_table including data type
             target_columns = [source_table.c[col].copy() for col in columns_to_copy]
@@ -506,7 +1424,7 @@ class SqlAlchemyDao(DaoBase):
             target_table = sql.Table(target_table_name, target_metadata, *target_columns,*target_constraints, schema=target_schema_name)
             
             # Create the new table in the database
-            target_metadata.create_all(self.engine, tables=[target_table])
+            target_metadata.create_all(connection, tables=[target_table])
 
             # Create indexes manually
             for index in source_table.indexes:
@@ -518,14 +1436,15 @@ class SqlAlchemyDao(DaoBase):
                     index = sql.Index(index_name, *column_objects)
                     index.create(connection)
             
-            # Construct select statements with filter conditions
-            select_statement = self.create_select_statement(source_table_name, columns_to_copy, filter_conditions)
+            with self.staged_filter_conditions(connection, filter_conditions) as staged_conditions:
+                # Construct select statements with filter conditions
+                select_statement = self.create_select_statement(source_table_name, columns_to_copy, staged_conditions)
 
-            # Insert into target table from source table
-            insert_statement = sql.insert(target_table).from_select(columns_to_copy, select_statement)
-            
-            result = connection.execute(insert_statement)
-            connection.commit()
+                # Insert into target table from source table
+                insert_statement = sql.insert(target_table).from_select(columns_to_copy, select_statement)
+                
+                result = connection.execute(insert_statement)
+            self._commit(connection)
             
             if self.dialect == SupportedDatabaseDialects.POSTGRES:
                 row_count = result.rowcount
@@ -534,4 +1453,5 @@ class SqlAlchemyDao(DaoBase):
                     sql.func.count()).select_from(target_table)
                 row_count = connection.execute(
                     select_count_stmt).scalar()   
+        self.invalidate_reflection_cache(target_schema_name)
         return row_count
\ No newline at end of file
@@ -1,15 +1,15 @@
 import os
 from re import sub
 from typing import List
+from tempfile import NamedTemporaryFile
 from subprocess import PIPE, STDOUT, run, CalledProcessError
 
-from prefect.variables import Variable
-
 from flows.data_management_plugin.const import *
 from flows.data_characterization_plugin.types import CHARACTERIZATION_DATA_MODEL
 
 from shared_utils.dao.daobase import DaoBase
-from shared_utils.api.PrefectAPI import get_auth_token_from_input, get_token_value
+from shared_utils.dao.sqlalchemydao import invalidate_schema_caches
+from shared_utils.api.PrefectAPI import get_auth_token_from_input, get_token_value, get_variable
 from shared_utils.types import (AuthMode, AuthToken, LiquibaseAction,
                                 DBCredentialsType, SupportedDatabaseDialects)
 
@@ -39,6 +39,7 @@ class Liquibase:
         self.plugin_classpath = plugin_classpath
         self.rollback_count = rollback_count
         self.rollback_tag = rollback_tag
+        self.properties_file = None
 
     def create_params(self) -> List:
         changeLogFile = f"db/migrations/{self.dialect}/{self.changelog_file}"
@@ -59,12 +60,11 @@ class Liquibase:
             admin_password = self.tenant_configs.adminPassword.get_secret_value()
 
         # path to liquibase executable
-        liquibase_path = Variable.get("liquibase_path") if Variable.get("liquibase_path") else "/app/liquibase/liquibase"
+        liquibase_path = get_variable("liquibase_path") or "/app/liquibase/liquibase"
         liquibase_dir = os.path.dirname(liquibase_path)
-        liquibase_properties = os.path.join(liquibase_dir, 'liquibase.properties')
         
-        hana_driver_class_path = Variable.get("hana_driver_class_path") if Variable.get("hana_driver_class_path") else "/app/liquibase/lib/ngdbc-latest.jar"
-        postgres_driver_class_path = Variable.get("postgres_driver_class_path") if Variable.get("postgres_driver_class_path") else "/app/inst/drivers/postgresql-42.3.1.jar"
+        hana_driver_class_path = get_variable("hana_driver_class_path") or "/app/liquibase/lib/ngdbc-latest.jar"
+        postgres_driver_class_path = get_variable("postgres_driver_class_path") or "/app/inst/drivers/postgresql-42.3.1.jar"
         match self.dialect:
             case SupportedDatabaseDialects.HANA:
                 classpath = f"{hana_driver_class_path}:{self.plugin_classpath}"
@@ -83,22 +83,24 @@ class Liquibase:
             f"--changeLogFile={changeLogFile}",
             f"--classpath={classpath}",
             f"--driver={driver}",
-            f"--logLevel={Variable.get('lb_log_level') if Variable.get('lb_log_level') else 'INFO'}",
+            f"--logLevel={get_variable('lb_log_level') or 'INFO'}",
             f"--defaultSchemaName={self.schema_name}",
-            f"--liquibaseSchemaName={self.schema_name}",
-            f"--defaults-file={liquibase_properties}"
+            f"--liquibaseSchemaName={self.schema_name}"
         ]
 
         if self.tenant_configs.authMode != AuthMode.JWT:
             params.append(f"--username={admin_user}")
 
-        # Temporarily create liquibase.properties for sensitive values
+        # Temporarily create a properties file for sensitive values
         # Won't be logged in traceback
-        with open(liquibase_properties, 'w') as file:
+        # Unique per run, as liquibase may run for several schemas at the same time
+        with NamedTemporaryFile('w', dir=liquibase_dir, prefix='liquibase.', suffix='.properties', delete=False) as file:
             file.write(f'''
                 url: {connection_base_url}{connection_properties}
                 password: {admin_password}
                 ''')
+        self.properties_file = file.name
+        params.append(f"--defaults-file={self.properties_file}")
             
         match self.action:
             case LiquibaseAction.STATUS:
@@ -137,6 +139,11 @@ class Liquibase:
                 f"Liquibase failed to run with return code '{cpe.returncode}': {liquibase_error_message}")  # from cpe
         else:
             print(f"Successfully ran liquibase command '{params[1]}'")
+            if self.action != LiquibaseAction.STATUS:
+                # Tables, changelog entries, dates and cdm version may have changed
+                invalidate_schema_caches(self.schema_name)
+        finally:
+            self._remove_properties_file()
 
     def get_latest_available_version(self) -> str:
         try:
@@ -162,6 +169,16 @@ class Liquibase:
             print(
                 f"latest_available_version_msg is {latest_available_version_msg}")
             return latest_available_version_msg
+        finally:
+            self._remove_properties_file()
+
+    def _remove_properties_file(self):
+        if self.properties_file is not None:
+            try:
+                os.remove(self.properties_file)
+            except FileNotFoundError:
+                pass
+            self.properties_file = None
 
     def _find_latest_available_changeset(self, liquibase_stdout: List) -> str:
         for output in reversed(liquibase_stdout):
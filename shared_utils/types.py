@@ -1,6 +1,7 @@
 from enum import Enum
-from typing import Optional, Literal
-from pydantic import BaseModel, SecretStr
+from datetime import datetime
+from typing import Any, Optional, Literal
+from pydantic import BaseModel, ConfigDict, SecretStr
 
 from prefect.input import RunInput
 
@@ -103,5 +104,87 @@ class EntityCountDistributionType(BaseModel):
     EPISODE_COUNT: str
     SPECIMEN_COUNT: str
 
+class TableStatType(str, Enum):
+    ROW_COUNT = "row_count"
+    DISTINCT_COUNT = "distinct_count"
+    VALUE = "value" # first value of a column
+
+
+class TableStatRequestType(BaseModel):
+    key: str
+    table_name: str
+    stat_type: TableStatType
+    column_name: Optional[str] = None
+    estimate: bool = False # read counts from the statistics catalog where available
+
+
+class TableStatResultType(BaseModel):
+    value: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class CatalogColumnType(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    data_type: str
+    is_nullable: bool = True
+
+
+class CatalogIndexType(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    columns: tuple[str, ...] = ()
+    is_unique: bool = False
+
+
+class CatalogTableType(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    is_view: bool = False
+    columns: tuple[CatalogColumnType, ...] = ()
+    primary_key: tuple[str, ...] = ()
+    indexes: tuple[CatalogIndexType, ...] = () # excludes the primary key index
+
+    @property
+    def column_names(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+
+class SchemaCatalogType(BaseModel):
+    """
+    Immutable snapshot of the tables, columns, primary keys and indexes of a schema
+    """
+    model_config = ConfigDict(frozen=True)
+
+    schema_name: str
+    tables: tuple[CatalogTableType, ...] = ()
+
+    def get_table(self, table: str) -> CatalogTableType | None:
+        return next((catalog_table for catalog_table in self.tables if catalog_table.name == table), None)
+
+    def check_table_exists(self, table: str) -> bool:
+        return self.get_table(table) is not None
+
+    def get_table_names(self, include_views: bool = False) -> list[str]:
+        return [table.name for table in self.tables if include_views or not table.is_view]
+
+    def get_columns(self, table: str) -> list[str]:
+        catalog_table = self.get_table(table)
+        if catalog_table is None:
+            raise ValueError(f"Table '{table}' not found in schema '{self.schema_name}'")
+        return catalog_table.column_names
+
+
+
+class ChangelogSummaryType(BaseModel):
+    schema_name: str
+    last_executed_changeset: Optional[str] = None # filename of the latest executed changeset
+    created_date: Optional[datetime] = None
+    updated_date: Optional[datetime] = None
+
+
 class AuthToken(RunInput):
     token: SecretStr
\ No newline at end of file
@@ -2,7 +2,7 @@ import json
 from datetime import datetime
 
 from shared_utils.dao.DBDao import DBDao
-from shared_utils.types import EntityCountDistributionType
+from shared_utils.types import EntityCountDistributionType, TableStatRequestType, TableStatType
 
 
 # List of tables linked to person table
@@ -132,9 +132,10 @@ def get_total_entity_count(entity_count_distribution: dict, logger) -> str:
 def update_entity_count_distribution(portal_server_api,
                                      dataset_id: str, 
                                      dbdao: DBDao, 
-                                     logger) -> EntityCountDistributionType:
+                                     logger,
+                                     estimate_entity_counts: list[str] = None) -> EntityCountDistributionType:
     try:
-        entity_count_distribution = get_entity_count_distribution(dbdao, logger)
+        entity_count_distribution = get_entity_count_distribution(dbdao, logger, estimate_entity_counts=estimate_entity_counts)
         portal_server_api.update_dataset_attributes_table(dataset_id, 'entity_count_distribution', json.dumps(entity_count_distribution))
     except Exception as e:
         logger.error(f"Failed to update attribute 'entity_count_distribution' for dataset '{dataset_id}' with value '{json.dumps(entity_count_distribution)}': {e}")
@@ -143,18 +144,31 @@ def update_entity_count_distribution(portal_server_api,
     return entity_count_distribution
 
 
-def get_entity_count_distribution(dbdao, logger) -> EntityCountDistributionType:
+def get_entity_count_distribution(dbdao, logger, is_lower_case: bool = True,
+                                  estimate_entity_counts: list[str] = None) -> EntityCountDistributionType:
+    '''
+    estimate_entity_counts:
+        entity tables whose counts are read from the database statistics instead of counted exactly
+    '''
     entity_count_distribution = {}
-    # retrieve count for each entity table
-    for table, unique_id_column in OMOP_NON_PERSON_ENTITIES.items():
-        try:
-            entity_count = dbdao.get_distinct_count(table, unique_id_column)
-        except Exception as e:
-            logger.error(f"Error retrieving entity count for {table}: {e}")
-            entity_count = "error"
+    estimate_entity_counts = estimate_entity_counts or []
+    # retrieve count for each entity table in a single query
+    stat_requests = [
+        TableStatRequestType(key=table,
+                             table_name=table if is_lower_case else table.upper(),
+                             column_name=unique_id_column if is_lower_case else unique_id_column.upper(),
+                             stat_type=TableStatType.DISTINCT_COUNT,
+                             estimate=table in estimate_entity_counts)
+        for table, unique_id_column in OMOP_NON_PERSON_ENTITIES.items()
+    ]
+    entity_counts = dbdao.get_table_stats(stat_requests)
+    for table in OMOP_NON_PERSON_ENTITIES:
+        entity_count = entity_counts.get(table)
+        if entity_count.error:
+            logger.error(f"Error retrieving entity count for {table}: {entity_count.error}")
+            continue
         entity_count_key = table.replace("_", " ").title() + " Count"
-        if entity_count != "error":
-            entity_count_distribution[entity_count_key] = str(entity_count)
+        entity_count_distribution[entity_count_key] = str(entity_count.value)
     return entity_count_distribution
 
 